@@ -2,7 +2,10 @@ from abc import ABCMeta, abstractmethod
 import time
 import os
 import datetime
-import subprocess
+import shutil
+import tarfile
+import io
+import posixpath
 
 class BaseJobSubmission(metaclass=ABCMeta):
     """
@@ -10,7 +13,7 @@ class BaseJobSubmission(metaclass=ABCMeta):
 
     This class assumes that the cluster connection takes the form of the base_connection class.
     """
-    def __init__(self, experiment_name, experiment_description, submission_name, cluster_connection, simulation_output_path, errorfile_path, outfile_path, runfiles_path, number_of_unique_tasks, repeitions_of_unique_task, master_dir, temp_storage_path, createAllFilesFunctionName, createDataDictForSpecialistFunctionsFunctionName, createDictOfFileSourceToFileDestinationsFunctionName, createSubmissionScriptFunctionName):
+    def __init__(self, experiment_name, experiment_description, submission_name, cluster_connection, simulation_output_path, errorfile_path, outfile_path, runfiles_path, number_of_unique_tasks, repeitions_of_unique_task, master_dir, temp_storage_path, createAllFilesFunctionName, createDataDictForSpecialistFunctionsFunctionName, createDictOfFileSourceToFileDestinationsFunctionName, createSubmissionScriptFunctionName, in_memory_staging = False):
         """
         The general idea of the structure is that all job submissions will require atleast a computer cluster, a job submission script (and all the details needed to make that script) and a command to submit the job to the cluster queuing system. This is meant to be as abstract/general as possible so things that are specific to a specific cluster should be included in a child class.
 
@@ -24,6 +27,7 @@ class BaseJobSubmission(metaclass=ABCMeta):
             repeitions_of_unique_task (int): The number of times you want your program executed. Note: this is exact repetitions.
             master_dir (str): The absolute path on the cluster that you want the submission script to cd into.
             temp_storage_path (str): The absolute path on the local computer that you want temporary files to be stored on.
+            in_memory_staging = False (bool): If True then files created with createFileForCluster are kept in memory and streamed straight to the cluster as one tar stream (see streamInMemoryFilesToCluster) and so nothing is written to temp_storage_path.
         """
         
         self.experiment_name = experiment_name
@@ -34,8 +38,14 @@ class BaseJobSubmission(metaclass=ABCMeta):
         self.repetitions_of_unique_task = repeitions_of_unique_task
         self.master_dir = master_dir
         self.temp_storage_path = temp_storage_path
+        self.in_memory_staging = in_memory_staging
+        # files that are staged in memory rather than on the local disk. Keys are the absolute path on the cluster and values are dicts with the keys 'contents' (bytes) and 'permissions' (int).
+        self.in_memory_file_tree = {}
+        # local files that prepareForSubmission transfers to the cluster. Keys are the local files and values are the directories on the cluster that they need to be put in (see createFileForCluster).
+        self.file_source_to_file_dest_dict = {}
         self.unique_job_name = self.createUniqueJobName(self.submission_name + '_')
-        os.makedirs(self.temp_storage_path + '/' + self.unique_job_name)
+        if not self.in_memory_staging:
+            os.makedirs(self.temp_storage_path + '/' + self.unique_job_name)
         self.temp_storage_path = self.temp_storage_path + '/' + self.unique_job_name
         self.cluster_connection = cluster_connection
         self.simulation_output_path = simulation_output_path + '/' + self.submission_name
@@ -43,6 +53,21 @@ class BaseJobSubmission(metaclass=ABCMeta):
         self.outfile_path = outfile_path + '/' + self.submission_name
         self.runfiles_path = runfiles_path + '/' + self.submission_name
         self.cluster_job_number = None
+        # Jobs that should run after the main submission (e.g. reduce and cleanup jobs). This is empty unless the createAllFiles function adds stages to it - see submitJobDagToCluster for the format.
+        self.dependent_stages_dict = {}
+        self.stage_name_to_job_number_dict = {}
+        self.sink_job_numbers = []
+        # If this is a dict then prepareForSubmission will wait until there is enough disk space on the cluster before preparing the submission - see waitForDiskSpace for the format. None (the default) means that disk space is not checked.
+        self.disk_space_admission_params_dict = None
+        # If True then files are staged through the content addressed object store of the cluster connection so that files that are the same every generation are only sent once.
+        self.deduplicate_staged_files = False
+        # Keys are array numbers and values are the name of the child (or task) that the array number simulates. If this is None then the MGA assumes that each child has one consecutive array number per repetition in the order of the dictionary of children it passed, i.e. with one repetition array number 1 is the first child, array number 2 is the second etc (see MGA.getArrayIndexToChildNameDict).
+        self.array_index_to_child_name_dict = None
+        # children that were moved to another cluster before they ran (see MGA.cancelPendingChildren) and the genomes whose results from this submission should therefore be ignored. The genomes are stored as keys (see MGA.getGenomeKey) and a genome that a child left in this submission also has isn't in stolen_genomes.
+        self.stolen_child_name_to_genome_dict = {}
+        self.stolen_genomes = set()
+        # the token attached to the main job so that it can be found in the queue (see base_connection.BaseCluster.submitJob)
+        self.submission_token = None
         self.time_of_submission = None
         self.createAllFilesFunctionName = createAllFilesFunctionName # done
         self.createDataDictForSpecialistFunctionsFunctionName = createDataDictForSpecialistFunctionsFunctionName # done
@@ -67,6 +92,7 @@ class BaseJobSubmission(metaclass=ABCMeta):
     def prepareForSubmission(self):
         """
         Makes sure that:
+            0. There is enough disk space on the cluster for the output of this submission (only if self.disk_space_admission_params_dict is not None, see waitForDiskSpace).
             1. All files needed are created.
             2. Any directories that will be needed by the job are present on the cluster.
             3. Transfers all neccessary files to the cluster.
@@ -80,6 +106,10 @@ class BaseJobSubmission(metaclass=ABCMeta):
 
         """
 
+        # 0. Don't submit anything that would fill up the disk on the cluster
+        if self.disk_space_admission_params_dict is not None:
+            self.waitForDiskSpace(self.disk_space_admission_params_dict)
+
         # 1. All files needed are created.
         self.createAllFiles()
 
@@ -90,38 +120,307 @@ class BaseJobSubmission(metaclass=ABCMeta):
 
         # 3. transfer all neccessary files to the cluster using the appropriate functions from the cluster_connection instance.
         list_of_transferFiles_output_dicts = []
-        for file_source in self.file_source_to_file_dest_dict.keys():
-            list_of_transferFiles_output_dicts.append(self.cluster_connection.checkSuccess(self.cluster_connection.transferFile, file_source, self.file_source_to_file_dest_dict[file_source]))
+        if self.deduplicate_staged_files:
+            # only content that the cluster has never seen is sent (see base_connection.BaseCluster.stageFilesByContent)
+            list_of_transferFiles_output_dicts = self.cluster_connection.stageFilesByContent(self.file_source_to_file_dest_dict)
+        else:
+            for file_source in self.file_source_to_file_dest_dict.keys():
+                list_of_transferFiles_output_dicts.append(self.cluster_connection.checkSuccess(self.cluster_connection.transferFile, file_source, self.file_source_to_file_dest_dict[file_source]))
+
+        # files that were created in memory are all sent in one go
+        if len(self.in_memory_file_tree) > 0:
+            list_of_transferFiles_output_dicts.append(self.streamInMemoryFilesToCluster())
 
         return [makedir_output_dict] + list_of_transferFiles_output_dicts
 
+    def waitForDiskSpace(self, disk_space_params_dict):
+        """
+        Defers the submission until the cluster has enough disk space for its expected output. This stops a generation from filling the quota half way through and crashing half of its tasks. The disk usage is checked using the cached functions of the cluster connection (see base_connection.Connection.getCachedDiskUsage) so this is normally quick.
+
+        Args:
+            disk_space_params_dict (dict): Has the keys:
+                                            - 'path' (str): The path on the cluster to check (normally the base output path).
+                                            - 'expected_KB_per_task' (number): The expected size of the output of one task in KB.
+                                            - 'max_fraction_of_limit' (float): The fraction of the limit that the usage plus the expected output must stay below e.g. 0.9.
+                                            - 'wait_time' (int): The number of seconds to wait before checking again when there isn't enough space.
+                                            - 'max_wait_time' (int): The maximum amount of seconds to wait in total before giving up.
+                                            - 'getDiskUsageFuncName' (str, optional): The name of the cluster connection method used to get the disk usage. The default is 'getDiskUsageFromQuota'.
+                                            - 'KB_budget' (number, optional): If given, the usage of 'path' itself is measured with the incremental disk usage index (updateDiskUsageIndex) and compared to this budget instead of the quota. This is useful when there are no quota tools and df reports the whole shared file system.
+
+        Returns:
+            disk_usage_dict (dict): The disk usage that allowed the submission to go ahead.
+
+        Raises:
+            ValueError if there still isn't enough space after max_wait_time seconds.
+        """
+        neccessary_keys = set(('path', 'expected_KB_per_task', 'max_fraction_of_limit', 'wait_time', 'max_wait_time'))
+        if not neccessary_keys.issubset(disk_space_params_dict.keys()):
+            raise ValueError('disk_space_params_dict must contain the keys: ', neccessary_keys, ' but disk_space_params_dict is: ', disk_space_params_dict)
+
+        expected_usage = self.number_of_unique_tasks * self.repetitions_of_unique_task * disk_space_params_dict['expected_KB_per_task']
+        getDiskUsageFuncName = disk_space_params_dict.get('getDiskUsageFuncName', 'getDiskUsageFromQuota')
+        total_wait = 0
+        force_refresh = False
+        while True:
+            if 'KB_budget' in disk_space_params_dict:
+                # the incremental index doesn't notice deleted files so after waiting (e.g. for the user to tidy up) everything is listed again
+                disk_usage_dict = self.cluster_connection.updateDiskUsageIndex(disk_space_params_dict['path'], full_rescan = force_refresh)
+                limit = disk_space_params_dict['KB_budget']
+            else:
+                disk_usage_dict = self.cluster_connection.getCachedDiskUsage(disk_space_params_dict['path'], getDiskUsageFuncName, force_refresh)
+                # a quota can have only a soft or only a hard limit (the missing one is inf)
+                limit = min(disk_usage_dict['soft_limit'], disk_usage_dict['hard_limit'])
+
+            if disk_usage_dict['usage'] + expected_usage <= disk_space_params_dict['max_fraction_of_limit'] * limit:
+                break
+
+            if total_wait >= disk_space_params_dict['max_wait_time']:
+                raise ValueError('There is not enough disk space on the cluster for this submission. The usage is ', disk_usage_dict['usage'], 'KB, the expected usage of this submission is ', expected_usage, 'KB and the limit is ', limit, 'KB. The submission file name is ', self.submission_file_name)
+
+            print('Not enough disk space on the cluster for submission ', self.submission_name, '. Waiting ' + str(disk_space_params_dict['wait_time']) + ' seconds before checking again.')
+            time.sleep(disk_space_params_dict['wait_time'])
+            total_wait += disk_space_params_dict['wait_time']
+            # the cached value is the one that stopped the submission and so must be refreshed
+            force_refresh = True
+
+        return disk_usage_dict
+
     def submitJobToCluster(self):
         """
-        This function submits a job to the cluster queue, records the time that the connection returns it's output dict, retrieves the corresponding job number, and deletes all the local files created to make his submission happen.
+        This function submits a job to the cluster queue, records the time that the connection returns it's output dict, retrieves the corresponding job number, and deletes all the local files created to make his submission happen. If self.dependent_stages_dict is not empty then the job is submitted as the 'main' stage of a DAG along with the stages that depend on it (see submitJobDagToCluster).
 
         Returns:
             submit_job_ouput_dict (dict): The connection output dict returned once the submission was successfully executed.
         """
 
         print('In submitJobToCluster!')
+        # if there are jobs that depend on this one then submit them all together
+        if len(self.dependent_stages_dict) > 0:
+            stage_name_to_stage_dict = {'main': {'submission_file_name': self.submission_file_name, 'depends_on': [], 'dependency_type': 'afterok'}}
+            stage_name_to_stage_dict.update(self.dependent_stages_dict)
+
+            return self.submitJobDagToCluster(stage_name_to_stage_dict)
+
         # Create the job submission command
-        submit_command = self.cluster_connection.submit_command + ' ' + self.runfiles_path + '/' + self.submission_file_name
+        # the token makes sure that the job is only submitted once even if the connection drops and the command has to be sent again
+        self.submission_token = self.cluster_connection.createSubmissionToken()
+        submit_command = self.cluster_connection.createSubmitCommand(self.runfiles_path + '/' + self.submission_file_name, submission_token = self.submission_token)
         print('submit_command = ', submit_command)
         # Submit the job to the cluster queue
-        submit_job_ouput_dict = self.cluster_connection.checkSuccess(self.cluster_connection.sendCommand, [submit_command])
+        submit_job_ouput_dict = self.sendSubmitCommand(submit_command, len(self.getListOfArrayIndices()), self.submission_token)
         # Record the time that the connection returned it's output dict
         now = datetime.datetime.now()
         self.time_of_submission = {'day': now.day, 'month': now.month, 'year': now.year}
         # Record the job number of the submitted job
         self.cluster_job_number = self.cluster_connection.getJobIdFromSubStdOut(submit_job_ouput_dict['stdout'])
+        self.stage_name_to_job_number_dict = {'main': self.cluster_job_number}
+        self.sink_job_numbers = [self.cluster_job_number]
+        # tidy up the tmp storage area if the submission was successful
+        if submit_job_ouput_dict['return_code'] == 0:
+            self.removeTempStorage()
+
+        return submit_job_ouput_dict
+
+    def submitArrayIndicesToCluster(self, list_of_array_indices):
+        """
+        Submits the submission script of this job again but only for some of its array numbers (e.g. to rerun failed tasks or to launch a speculative copy of a slow task). The script must already be on the cluster (i.e. the job has already been submitted with submitJobToCluster or prepareForSubmission has been run).
+
+        Args:
+            list_of_array_indices (list of ints): The array numbers to submit.
+
+        Returns:
+            job_number (int): The job number of the new job.
+        """
+        submission_token = self.cluster_connection.createSubmissionToken()
+        submit_command = self.cluster_connection.createSubmitCommand(self.runfiles_path + '/' + self.submission_file_name, array_indices = list_of_array_indices, submission_token = submission_token)
+        print('submit_command = ', submit_command)
+        submit_job_ouput_dict = self.sendSubmitCommand(submit_command, len(list_of_array_indices), submission_token)
+        job_number = self.cluster_connection.getJobIdFromSubStdOut(submit_job_ouput_dict['stdout'])
+
+        return job_number
+
+    def sendSubmitCommand(self, submit_command, no_of_tasks, submission_token = None):
+        """
+        Sends a submit command to the cluster. If the cluster connection has its submission governor turned on (use_submission_governor) then this waits until there is space in the queue for the tasks rather than letting the submission fail because the user's queue limit has been reached.
+
+        Args:
+            submit_command (str): The command that submits the job.
+            no_of_tasks (int): The number of tasks that the job adds to the queue.
+            submission_token = None (str): The token that was attached to the job with createSubmitCommand so that it is only submitted once (see base_connection.BaseCluster.submitJob).
+
+        Returns:
+            submit_job_ouput_dict (dict): The connection output dict of the submit command.
+        """
+        if self.cluster_connection.use_submission_governor:
+            submit_job_ouput_dict = self.cluster_connection.submitThroughGovernor(submit_command, no_of_tasks, submission_token = submission_token)
+        else:
+            submit_job_ouput_dict = self.cluster_connection.submitJob(submit_command, submission_token)
+
+        return submit_job_ouput_dict
+
+    def getListOfArrayIndices(self):
+        """
+        Returns the array numbers that the submission script asks for. If self.array_index_to_child_name_dict has been set then its keys are used, otherwise it is assumed that the array numbers go from 1 to the number of unique tasks times the number of repetitions.
+
+        Returns:
+            list_of_array_indices (list of ints): The array numbers in ascending order.
+        """
+        if self.array_index_to_child_name_dict is not None:
+            list_of_array_indices = sorted(self.array_index_to_child_name_dict.keys())
+        else:
+            list_of_array_indices = list(range(1, self.number_of_unique_tasks * self.repetitions_of_unique_task + 1))
+
+        return list_of_array_indices
+
+    def submitJobDagToCluster(self, stage_name_to_stage_dict):
+        """
+        Submits a DAG (directed acyclic graph) of jobs to the cluster in one connection e.g. compute -> reduce -> cleanup. Each job is held by the queuing system until the jobs it depends on have finished and so downstream stages start as soon as the upstream work is done rather than when the local computer next polls the queue. This means that the local computer only needs to wait for the sink jobs (the jobs that nothing else depends on).
+
+        All the submission scripts must already be on the cluster in self.runfiles_path (i.e. they should be in self.file_source_to_file_dest_dict so that prepareForSubmission transfers them).
+
+        Args:
+            stage_name_to_stage_dict (dict): Keys are stage names (these are used as shell variable names so can only contain letters, numbers and underscores) and values are dicts with the keys:
+                                                - 'submission_file_name' (str): The name of the submission script in self.runfiles_path.
+                                                - 'depends_on' (list of str): The names of the stages that must finish first (empty for the first stages).
+                                                - 'dependency_type' (str): The kind of dependency e.g. 'afterok' or 'afteranyarray' (see the getDependencyFlag function of the cluster connection).
+
+        Returns:
+            submit_job_ouput_dict (dict): The connection output dict returned once the submission was successfully executed.
+        """
+        list_of_ordered_stage_names = self.orderStagesOfDag(stage_name_to_stage_dict)
+        # each stage has a token so that if the connection drops and the chain is sent again the stages that were already submitted aren't submitted twice
+        list_of_ordered_stages = [{'stage_name': stage_name, 'submission_script_name_and_path': self.runfiles_path + '/' + stage_name_to_stage_dict[stage_name]['submission_file_name'], 'depends_on': stage_name_to_stage_dict[stage_name]['depends_on'], 'dependency_type': stage_name_to_stage_dict[stage_name]['dependency_type'], 'submission_token': self.cluster_connection.createSubmissionToken()} for stage_name in list_of_ordered_stage_names]
+        list_of_submit_commands = self.cluster_connection.createDependencyChainCommands(list_of_ordered_stages)
+        print('list_of_submit_commands = ', list_of_submit_commands)
+        # Submit all the jobs to the cluster queue
+        submit_job_ouput_dict = self.cluster_connection.checkSuccess(self.cluster_connection.sendCommand, list_of_submit_commands)
+        # Record the time that the connection returned it's output dict
+        now = datetime.datetime.now()
+        self.time_of_submission = {'day': now.day, 'month': now.month, 'year': now.year}
+        # Record the job numbers of the submitted jobs
+        self.stage_name_to_job_number_dict = self.cluster_connection.getStageJobIdsFromChainStdOut(submit_job_ouput_dict['stdout'])
+        if set(self.stage_name_to_job_number_dict.keys()) != set(list_of_ordered_stage_names):
+            raise ValueError('Not all the stages were submitted to the cluster. The stages submitted were: ', self.stage_name_to_job_number_dict, ' but the stages that should have been submitted are: ', list_of_ordered_stage_names)
+
+        # the first stage is the one that is monitored like a normal job and the sink stages are the ones that the local computer needs to wait for
+        self.cluster_job_number = self.stage_name_to_job_number_dict[list_of_ordered_stage_names[0]]
+        set_of_parent_stages = set([parent for stage_name in stage_name_to_stage_dict.keys() for parent in stage_name_to_stage_dict[stage_name]['depends_on']])
+        self.sink_job_numbers = [self.stage_name_to_job_number_dict[stage_name] for stage_name in list_of_ordered_stage_names if stage_name not in set_of_parent_stages]
         # tidy up the tmp storage area if the submission was successful
         if submit_job_ouput_dict['return_code'] == 0:
-            tmp_return_code = subprocess.call("rm -r " + self.temp_storage_path, shell=True)
-            if tmp_return_code != 0:
-                print("WARNING!!!! Could not remove the temporary files from ", self.temp_storage_path, " please fix this problem ASAP since if it carries on repeating it will filll the entire computer up until it breaks!")
+            self.removeTempStorage()
 
         return submit_job_ouput_dict
 
+    @staticmethod
+    def orderStagesOfDag(stage_name_to_stage_dict):
+        """
+        Orders the stages of a DAG of jobs so that every stage comes after all the stages that it depends on (i.e. a topological sort). When there is a choice the stages keep the order that they are in stage_name_to_stage_dict.
+
+        Args:
+            stage_name_to_stage_dict (dict): See submitJobDagToCluster.
+
+        Returns:
+            list_of_ordered_stage_names (list of str): The stage names in the order that they can be submitted.
+        """
+        for stage_name in stage_name_to_stage_dict.keys():
+            missing_parents = [parent for parent in stage_name_to_stage_dict[stage_name]['depends_on'] if parent not in stage_name_to_stage_dict]
+            if len(missing_parents) > 0:
+                raise ValueError('Stage ', stage_name, ' depends on stages that do not exist: ', missing_parents)
+
+        list_of_ordered_stage_names = []
+        set_of_submitted_stages = set()
+        while len(list_of_ordered_stage_names) < len(stage_name_to_stage_dict):
+            ready_stages = [stage_name for stage_name in stage_name_to_stage_dict.keys() if (stage_name not in set_of_submitted_stages) and set(stage_name_to_stage_dict[stage_name]['depends_on']).issubset(set_of_submitted_stages)]
+            if len(ready_stages) == 0:
+                raise ValueError('The stages contain a cycle and so can not be submitted. The stages that could not be ordered are: ', [stage_name for stage_name in stage_name_to_stage_dict.keys() if stage_name not in set_of_submitted_stages])
+
+            list_of_ordered_stage_names += ready_stages
+            set_of_submitted_stages.update(ready_stages)
+
+        return list_of_ordered_stage_names
+
+    def getCompletedTasksFromOutput(self, index_db_path, task_name_to_list_of_output_files_dict, with_checksum = False, full_rescan = False):
+        """
+        Works out which tasks have produced all of their output with one metadata scan of self.simulation_output_path (see base_connection.Connection.scanRemoteFileIndex) rather than checking every file with its own connection. The scan is incremental so calling this repeatedly whilst the jobs are running is cheap.
+
+        Args:
+            index_db_path (str): The path and file name of the local SQLite file index (note that the temporary storage area is deleted after submission so this should be somewhere else).
+            task_name_to_list_of_output_files_dict (dict): Keys are task names (e.g. child names) and values are lists of the files (relative to self.simulation_output_path) that the task creates when it is finished.
+            with_checksum = False (bool): Also calculate the md5 checksum of new files (see scanRemoteFileIndex).
+            full_rescan = False (bool): Rescan everything rather than just the files that have changed.
+
+        Returns:
+            list_of_completed_tasks (list of str): The names of the tasks whose output files all exist and are not empty.
+        """
+        self.cluster_connection.scanRemoteFileIndex(self.simulation_output_path, index_db_path, with_checksum, full_rescan)
+        list_of_all_paths = [self.simulation_output_path + '/' + output_file for task_name in task_name_to_list_of_output_files_dict for output_file in task_name_to_list_of_output_files_dict[task_name]]
+        set_of_existing_paths = self.cluster_connection.getExistingFilesFromIndex(index_db_path, list_of_all_paths)
+        list_of_completed_tasks = [task_name for task_name in task_name_to_list_of_output_files_dict if all([(self.simulation_output_path + '/' + output_file) in set_of_existing_paths for output_file in task_name_to_list_of_output_files_dict[task_name]])]
+
+        return list_of_completed_tasks
+
+    def createFileForCluster(self, file_name, list_of_lines_of_file, destination_dir, file_permissions = None, file_encoding = 'utf-8'):
+        """
+        Creates a file that needs to be sent to the cluster. If self.in_memory_staging is False the file is written to the temporary storage area and added to self.file_source_to_file_dest_dict (so createDictOfFileSourceToFileDestinations functions should add to this dict rather than replace it). If self.in_memory_staging is True then the file is only kept in memory (in self.in_memory_file_tree) and is streamed to the cluster by prepareForSubmission.
+
+        Args:
+            file_name (str): The name of the file (without a path).
+            list_of_lines_of_file (list of strings): Each element is one line of the file.
+            destination_dir (str): The absolute path of the directory on the cluster that the file needs to be in.
+            file_permissions = None (str): The permissions of the file as an octal string e.g. "700". If None then the file is given "600".
+            file_encoding = 'utf-8' (str): The encoding of the file.
+        """
+        if self.in_memory_staging:
+            if file_permissions is None:
+                file_permissions = '600'
+            self.in_memory_file_tree[destination_dir.rstrip('/') + '/' + file_name] = {'contents': ("\n".join(list_of_lines_of_file) + "\n").encode(file_encoding), 'permissions': int(str(file_permissions), 8)}
+        else:
+            local_file_name_and_path = self.temp_storage_path + '/' + file_name
+            self.cluster_connection.createLocalFile(local_file_name_and_path, list_of_lines_of_file, file_permissions, file_encoding = file_encoding)
+            self.file_source_to_file_dest_dict[local_file_name_and_path] = destination_dir
+
+        return
+
+    def streamInMemoryFilesToCluster(self):
+        """
+        Serialises self.in_memory_file_tree into a tar stream (in memory, keeping the file permissions) and unpacks it on the cluster through one SSH connection. This means there is no local disk I/O, no subprocess per file and nothing to clean up afterwards. The paths in the tar are relative to the deepest directory that all the files share (e.g. self.runfiles_path) and it is unpacked there rather than at the root of the file system.
+
+        Returns:
+            output_dict (dict): The output dict of the connection (has keys 'return_code', 'stdout' and 'stderr').
+        """
+        root_dir = posixpath.commonpath([posixpath.dirname(remote_file_name_and_path) for remote_file_name_and_path in self.in_memory_file_tree.keys()])
+        if root_dir == '/':
+            raise ValueError('The files staged in memory don\'t share a directory below the root of the file system and so they won\'t be unpacked there. Here the files are: ', sorted(self.in_memory_file_tree.keys()))
+
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj = tar_buffer, mode = 'w') as tar:
+            for remote_file_name_and_path in sorted(self.in_memory_file_tree.keys()):
+                file_dict = self.in_memory_file_tree[remote_file_name_and_path]
+                tar_info = tarfile.TarInfo(name = posixpath.relpath(remote_file_name_and_path, root_dir))
+                tar_info.size = len(file_dict['contents'])
+                tar_info.mode = file_dict['permissions']
+                tar_info.mtime = time.time()
+                tar.addfile(tar_info, io.BytesIO(file_dict['contents']))
+
+        output_dict = self.cluster_connection.checkSuccess(self.cluster_connection.streamTarToRemote, tar_buffer.getvalue(), root_dir)
+
+        return output_dict
+
+    def removeTempStorage(self):
+        """
+        Deletes the local temporary storage area of this submission. This should only be done once the submission has been successful. Submissions that are staged in memory have nothing to delete.
+        """
+        if self.in_memory_staging:
+            return
+
+        try:
+            shutil.rmtree(self.temp_storage_path)
+        except OSError:
+            print("WARNING!!!! Could not remove the temporary files from ", self.temp_storage_path, " please fix this problem ASAP since if it carries on repeating it will filll the entire computer up until it breaks!")
+
+        return
+
     def createUniqueJobName(self, prefix):
         """
         Temporary files need a place to be stored. This creates a unique name that can be used to name the temporary directory. The name takes the form string + digits where the digits are created based on the current time.
@@ -132,15 +431,12 @@ class BaseJobSubmission(metaclass=ABCMeta):
         Returns:
             return (str): prefix + unique_digits
         """
-        valid_name = False
-        while valid_name == False:
-            unique_name_end = str('{:.9f}'.format(time.time()))
-            unique_name_end = unique_name_end.replace(".","")
-            unique_path = self.temp_storage_path + '/' + prefix + unique_name_end
-            if os.path.isdir(unique_path) == False:
-                valid_name = True
+        unique_number = time.time_ns()
+        # if the directory already exists then just count up rather than waiting for the time to change
+        while (not self.in_memory_staging) and os.path.isdir(self.temp_storage_path + '/' + prefix + str(unique_number)):
+            unique_number += 1
 
-        return prefix + unique_name_end
+        return prefix + str(unique_number)
 
     # The following functions are passed a function to execute so to give full adaptability for commonlly used functions. For example processing simulation data after simulations might be a common need but there are many ways in which it might be done. Also note that if you don't want to process the data you can pass the passFunction that can be seen below. This can be used anytime one of these functions doesn't need to do anything.
     def passFunction(self):
@@ -177,6 +473,20 @@ class BaseManageSubmission(metaclass=ABCMeta):
         self.submission = submission_instance
         self.convertDataFunctionName = convertDataFunctionName 
         self.updateCentralDbFunctionName = updateCentralDbFunctionName
+        # the local time that each array task was first seen running and first seen to have left the queue (see updateTaskRuntimes)
+        self.task_start_times = {}
+        self.task_finish_times = {}
+        self.set_of_tasks_in_queue = set()
+        # speculative copies of slow tasks. Keys are array numbers and values are dicts with keys 'submission' (the job submission instance the copy was submitted with), 'job_number' and 'status' (see resolveSpeculativeCopies).
+        self.speculative_copies = {}
+        self.speculative_core_hours_used = 0
+        # a task that has left the queue is judged by the queuing system's accounting but that can take a while to appear. If there still isn't a record accounting_wait_seconds after the task was first seen to have left the queue then it is assumed to have finished successfully (e.g. TORQUE forgets finished jobs unless keep_completed is set).
+        self.accounting_wait_seconds = 600
+        self.task_left_queue_times = {}
+        # jobs that reran some array tasks of the submission (see resubmitFailedArrayIndices). Each element is a tuple of (job_number, list_of_array_indices) in the order they were submitted.
+        self.resubmissions = []
+        # array tasks that were cancelled because they couldn't beat the admission threshold (see terminateHopelessTasks)
+        self.terminated_array_indices = set()
         if test_mode == True:
                 print("WARNING: This is in TEST mode so no files will be transfered and no job will be submitted.")
                 self.submission.time_of_submission = {}
@@ -202,6 +512,339 @@ class BaseManageSubmission(metaclass=ABCMeta):
 
         return 
 
+    # METHODS FOR RERUNNING FAILED TASKS
+
+    def findFailedArrayIndices(self, array_index_to_list_of_output_files_dict = None, index_db_path = None):
+        """
+        Works out which array tasks of the submission failed so that only those need to be run again. A task has failed if the last time it ran it didn't finish successfully (according to the queuing system's accounting - see getArrayTaskAccounting of the cluster connection) or if it has left the queue without creating all of its output files. Tasks that are still in the queue or that were cancelled by terminateHopelessTasks are never counted as failed. Resubmissions made by resubmitFailedArrayIndices are taken into account so a task that failed and then succeeded when it was rerun is not counted. In the same way a task whose speculative copy won (see monitorWithSpeculativeCopies) is judged by the copy rather than by the cancelled original.
+
+        Args:
+            array_index_to_list_of_output_files_dict = None (dict): Keys are array numbers and values are lists of the files (relative to self.submission.simulation_output_path) that the task creates when it is finished. If None then only the exit codes are used.
+            index_db_path = None (str): The local SQLite file index to use when checking the output files (see BaseJobSubmission.getCompletedTasksFromOutput). Must be given if array_index_to_list_of_output_files_dict is.
+
+        Returns:
+            list_of_failed_array_indices (list of ints): The array numbers of the failed tasks in ascending order.
+        """
+        cluster_connection = self.submission.cluster_connection
+        # each attempt is (cluster connection, job number, the array numbers to take from it or None for all of them). A speculative copy that won replaces its original (which was cancelled) but a copy that lost was cancelled itself and so is ignored.
+        list_of_attempts = [(cluster_connection, self.submission.cluster_job_number, None)]
+        copy_job_to_array_indices_dict = {}
+        for array_index in self.speculative_copies.keys():
+            copy_dict = self.speculative_copies[array_index]
+            if copy_dict['status'] == 'copy_won':
+                copy_job_to_array_indices_dict.setdefault((copy_dict['submission'].cluster_connection, copy_dict['job_number']), set()).add(array_index)
+        list_of_attempts += [(copy_connection, copy_job_number, set_of_array_indices) for (copy_connection, copy_job_number), set_of_array_indices in copy_job_to_array_indices_dict.items()]
+        list_of_attempts += [(cluster_connection, job_number, None) for job_number, list_of_array_indices in self.resubmissions]
+        set_of_tasks_in_queue = set()
+        array_index_to_state_dict = {}
+        # later jobs are the more recent attempts and so their states replace the earlier ones
+        for attempt_connection, job_number, set_of_array_indices in list_of_attempts:
+            set_of_tasks_in_queue |= set([array_index for array_index in attempt_connection.getArrayIndicesFromQueueStdOut(attempt_connection.checkQueue(job_number)['stdout']) if set_of_array_indices is None or array_index in set_of_array_indices])
+            for record in attempt_connection.getArrayTaskAccounting(job_number):
+                if set_of_array_indices is None or record['array_index'] in set_of_array_indices:
+                    array_index_to_state_dict[record['array_index']] = record['state']
+
+        set_of_failed_tasks = set([array_index for array_index in array_index_to_state_dict.keys() if array_index_to_state_dict[array_index] != 'COMPLETED'])
+        if array_index_to_list_of_output_files_dict is not None:
+            if index_db_path is None:
+                raise ValueError('index_db_path must be given to check the output files. Here index_db_path = ', index_db_path)
+
+            list_of_completed_tasks = self.submission.getCompletedTasksFromOutput(index_db_path, {str(array_index): list_of_output_files for array_index, list_of_output_files in array_index_to_list_of_output_files_dict.items()})
+            set_of_failed_tasks |= set(array_index_to_list_of_output_files_dict.keys()) - set([int(array_index) for array_index in list_of_completed_tasks])
+
+        list_of_failed_array_indices = sorted((set_of_failed_tasks & set(self.submission.getListOfArrayIndices())) - set_of_tasks_in_queue - self.terminated_array_indices)
+
+        return list_of_failed_array_indices
+
+    def resubmitFailedArrayIndices(self, array_index_to_list_of_output_files_dict = None, index_db_path = None, max_attempts = 3):
+        """
+        Resubmits the existing submission script for only the array tasks that failed (see findFailedArrayIndices) rather than rerunning the whole job. The array numbers are sent as a compact array spec (e.g. '3-5,17,201-204') by the cluster connection.
+
+        Args:
+            array_index_to_list_of_output_files_dict = None (dict): See findFailedArrayIndices.
+            index_db_path = None (str): See findFailedArrayIndices.
+            max_attempts = 3 (int): A task is not resubmitted once it has been run this many times (including the original submission) so that a task that always fails doesn't keep being rerun.
+
+        Returns:
+            list_of_resubmitted_array_indices (list of ints): The array numbers that were resubmitted (empty if there was nothing to resubmit).
+        """
+        list_of_failed_array_indices = self.findFailedArrayIndices(array_index_to_list_of_output_files_dict, index_db_path)
+        array_index_to_no_of_attempts_dict = {array_index: 1 for array_index in list_of_failed_array_indices}
+        for job_number, list_of_array_indices in self.resubmissions:
+            for array_index in list_of_array_indices:
+                if array_index in array_index_to_no_of_attempts_dict:
+                    array_index_to_no_of_attempts_dict[array_index] += 1
+
+        list_of_resubmitted_array_indices = [array_index for array_index in list_of_failed_array_indices if array_index_to_no_of_attempts_dict[array_index] < max_attempts]
+        if len(list_of_resubmitted_array_indices) > 0:
+            print('Resubmitting failed array tasks ', list_of_resubmitted_array_indices, ' of job ', self.submission.cluster_job_number)
+            job_number = self.submission.submitArrayIndicesToCluster(list_of_resubmitted_array_indices)
+            self.resubmissions.append((job_number, list_of_resubmitted_array_indices))
+
+        return list_of_resubmitted_array_indices
+
+    # METHODS FOR SPECULATIVELY RE-RUNNING SLOW TASKS
+
+    def updateTaskRuntimes(self):
+        """
+        Takes a snapshot of the queue and records the local time that each array task of the submission is first seen running and first seen to have left the queue (tasks that were cancelled because their speculative copy won don't get a finish time). The runtimes are only as accurate as the time between calls but they work the same way for every queuing system.
+
+        Returns:
+            set_of_running_tasks (set of ints): The array numbers that are running now.
+        """
+        cluster_connection = self.submission.cluster_connection
+        job_number = self.submission.cluster_job_number
+        set_of_tasks_in_queue = set(cluster_connection.getArrayIndicesFromQueueStdOut(cluster_connection.checkQueue(job_number)['stdout']))
+        set_of_pending_tasks = set(cluster_connection.getArrayIndicesFromQueueStdOut(cluster_connection.checkPendingArrayTasks(job_number)['stdout']))
+        set_of_running_tasks = set_of_tasks_in_queue - set_of_pending_tasks
+        now = time.time()
+        for array_index in set_of_running_tasks:
+            if array_index not in self.task_start_times:
+                self.task_start_times[array_index] = now
+
+        for array_index in self.task_start_times.keys():
+            # an original that was cancelled because its copy won didn't finish, so its runtime would push up the straggler threshold (see findStragglers)
+            if array_index in self.speculative_copies and self.speculative_copies[array_index]['status'] == 'copy_won':
+                continue
+            if (array_index not in set_of_tasks_in_queue) and (array_index not in self.task_finish_times):
+                self.task_finish_times[array_index] = now
+
+        self.set_of_tasks_in_queue = set_of_tasks_in_queue
+
+        return set_of_running_tasks
+
+    def findStragglers(self, set_of_running_tasks, quantile, min_completed_tasks):
+        """
+        Finds running tasks that have been running for longer than the given quantile of the runtimes of the tasks that have already finished.
+
+        Args:
+            set_of_running_tasks (set of ints): The array numbers that are running (see updateTaskRuntimes).
+            quantile (float): e.g. 0.9 means a task is a straggler if it has run for longer than 90% of the finished tasks took.
+            min_completed_tasks (int): No task is a straggler until at least this many tasks have finished (so that the quantile means something).
+
+        Returns:
+            list_of_stragglers (list of ints): The array numbers of the stragglers that don't already have a speculative copy.
+            threshold (float): The runtime in seconds that the stragglers have gone over (None if not enough tasks have finished).
+        """
+        list_of_runtimes = sorted([self.task_finish_times[array_index] - self.task_start_times[array_index] for array_index in self.task_finish_times.keys()])
+        if len(list_of_runtimes) < max(min_completed_tasks, 1):
+            return [], None
+
+        threshold = list_of_runtimes[min(int(quantile * len(list_of_runtimes)), len(list_of_runtimes) - 1)]
+        now = time.time()
+        list_of_stragglers = sorted([array_index for array_index in set_of_running_tasks if (now - self.task_start_times[array_index] > threshold) and (array_index not in self.speculative_copies)])
+
+        return list_of_stragglers, threshold
+
+    def monitorWithSpeculativeCopies(self, speculation_params_dict):
+        """
+        Waits for the submission to finish whilst launching a duplicate of any task that is much slower than its siblings (often a task on a slow node or suffering from file system contention). Whichever copy finishes successfully first wins and the other one is cancelled, whereas a copy that fails leaves the other one running (see resolveSpeculativeCopies). The number of core hours spent on copies is capped.
+
+        IMPORTANT: Both copies of a task run the same script with the same array number and so write to the same place. The script should write its output to a temporary name and move it into place at the end so that a copy that is cancelled can't leave half written output.
+
+        Args:
+            speculation_params_dict (dict): Has the keys:
+                                            - 'quantile' (float): See findStragglers.
+                                            - 'min_completed_tasks' (int): See findStragglers.
+                                            - 'cores_per_task' (int): The number of cores each task uses (used to count core hours).
+                                            - 'max_speculative_core_hours' (float): No more copies are launched once the expected cost of the copies reaches this.
+                                            - 'poll_interval' (int): The number of seconds between checking the queue.
+                                            - 'speculative_submission' (BaseJobSubmission, optional): A submission instance whose script is already on a different cluster to launch the copies on. By default the copies are launched on the same cluster with this submission.
+
+        Returns:
+            speculative_copies (dict): See self.speculative_copies.
+        """
+        speculative_submission = speculation_params_dict.get('speculative_submission', self.submission)
+        while True:
+            set_of_running_tasks = self.updateTaskRuntimes()
+            self.resolveSpeculativeCopies()
+            list_of_running_copies = [array_index for array_index in self.speculative_copies.keys() if self.speculative_copies[array_index]['status'] in ('running', 'original_failed')]
+            if (len(self.set_of_tasks_in_queue) == 0) and (len(list_of_running_copies) == 0):
+                break
+
+            list_of_stragglers, threshold = self.findStragglers(set_of_running_tasks, speculation_params_dict['quantile'], speculation_params_dict['min_completed_tasks'])
+            # a copy is expected to take about as long as the threshold
+            list_of_stragglers_to_copy = []
+            for array_index in list_of_stragglers:
+                expected_core_hours = speculation_params_dict['cores_per_task'] * threshold / 3600
+                if self.speculative_core_hours_used + expected_core_hours > speculation_params_dict['max_speculative_core_hours']:
+                    break
+                self.speculative_core_hours_used += expected_core_hours
+                list_of_stragglers_to_copy.append(array_index)
+
+            if len(list_of_stragglers_to_copy) > 0:
+                print('Launching speculative copies of slow array tasks ', list_of_stragglers_to_copy, ' of job ', self.submission.cluster_job_number)
+                copy_job_number = speculative_submission.submitArrayIndicesToCluster(list_of_stragglers_to_copy)
+                for array_index in list_of_stragglers_to_copy:
+                    self.speculative_copies[array_index] = {'submission': speculative_submission, 'job_number': copy_job_number, 'status': 'running'}
+
+            time.sleep(speculation_params_dict['poll_interval'])
+
+        return self.speculative_copies
+
+    def resolveSpeculativeCopies(self):
+        """
+        Checks every running speculative copy against its original task. When one of them leaves the queue its exit state is checked (see getFinishedTaskState). If it finished successfully it is the winner and the other one is cancelled, but if it failed (e.g. it crashed or was killed on a bad node) only it has lost and the other one keeps running.
+
+        The status of each copy in self.speculative_copies is one of:
+            - 'running': both the original and the copy are running.
+            - 'original_won' or 'copy_won': that one finished successfully and the other was cancelled (or had already finished).
+            - 'original_failed': the original failed and the copy is still running. This becomes 'copy_won' or 'both_failed' once the copy finishes.
+            - 'copy_failed': the copy failed and the original carries on as if there had been no copy.
+            - 'both_failed': the original and the copy both failed.
+        """
+        list_of_running_copies = [array_index for array_index in self.speculative_copies.keys() if self.speculative_copies[array_index]['status'] in ('running', 'original_failed')]
+        # group the copies by job so that each copy job's queue is only checked once
+        copy_job_to_array_indices_dict = {}
+        for array_index in list_of_running_copies:
+            copy_dict = self.speculative_copies[array_index]
+            copy_job_to_array_indices_dict.setdefault((copy_dict['job_number'], copy_dict['submission']), []).append(array_index)
+
+        # the accounting of each job is only read once per call
+        job_to_state_dict = {}
+        for (copy_job_number, copy_submission), list_of_array_indices in copy_job_to_array_indices_dict.items():
+            copy_connection = copy_submission.cluster_connection
+            set_of_copies_in_queue = set(copy_connection.getArrayIndicesFromQueueStdOut(copy_connection.checkQueue(copy_job_number)['stdout']))
+            list_of_originals_to_cancel = []
+            list_of_copies_to_cancel = []
+            for array_index in list_of_array_indices:
+                copy_dict = self.speculative_copies[array_index]
+                if (copy_dict['status'] == 'running') and (array_index not in self.set_of_tasks_in_queue):
+                    original_state = self.getFinishedTaskState(self.submission.cluster_connection, self.submission.cluster_job_number, array_index, job_to_state_dict)
+                    if original_state == 'COMPLETED':
+                        copy_dict['status'] = 'original_won'
+                        if array_index in set_of_copies_in_queue:
+                            list_of_copies_to_cancel.append(array_index)
+                    elif original_state is not None:
+                        copy_dict['status'] = 'original_failed'
+                elif array_index not in set_of_copies_in_queue:
+                    copy_state = self.getFinishedTaskState(copy_connection, copy_job_number, array_index, job_to_state_dict)
+                    if copy_state == 'COMPLETED':
+                        copy_dict['status'] = 'copy_won'
+                        if array_index in self.set_of_tasks_in_queue:
+                            list_of_originals_to_cancel.append(array_index)
+                    elif copy_state is not None:
+                        copy_dict['status'] = 'copy_failed' if copy_dict['status'] == 'running' else 'both_failed'
+
+            if len(list_of_copies_to_cancel) > 0:
+                copy_connection.cancelArrayTasks(copy_job_number, list_of_copies_to_cancel)
+            if len(list_of_originals_to_cancel) > 0:
+                self.submission.cluster_connection.cancelArrayTasks(self.submission.cluster_job_number, list_of_originals_to_cancel)
+                # the original has been cancelled so it is no longer in the queue
+                self.set_of_tasks_in_queue -= set(list_of_originals_to_cancel)
+
+        return
+
+    def getFinishedTaskState(self, cluster_connection, job_number, array_index, job_to_state_dict):
+        """
+        Returns whether an array task that has left the queue finished successfully according to the accounting of the queuing system (see getArrayTaskAccounting of the cluster connection).
+
+        Args:
+            cluster_connection (BaseCluster): The cluster connection the job was submitted with.
+            job_number (int): The job number of the job array.
+            array_index (int): The array number of the task.
+            job_to_state_dict (dict): A cache of the accounting of each job. Keys are (cluster_connection, job_number) and values are dicts of array numbers to states. Jobs that aren't in it are read and added.
+
+        Returns:
+            state (str or None): 'COMPLETED' if the task finished successfully, the state from the accounting (e.g. 'FAILED') if it didn't and None if there is no record yet. A task that still has no record self.accounting_wait_seconds after it was first seen to have left the queue is taken to be 'COMPLETED'.
+        """
+        if (cluster_connection, job_number) not in job_to_state_dict:
+            job_to_state_dict[(cluster_connection, job_number)] = {record['array_index']: record['state'] for record in cluster_connection.getArrayTaskAccounting(job_number)}
+
+        state = job_to_state_dict[(cluster_connection, job_number)].get(array_index)
+        if state is None:
+            time_left_queue = self.task_left_queue_times.setdefault((job_number, array_index), time.time())
+            if time.time() - time_left_queue > self.accounting_wait_seconds:
+                state = 'COMPLETED'
+
+        return state
+
+    # METHODS FOR CANCELLING HOPELESS TASKS
+
+    def terminateHopelessTasks(self, progress_dir, admission_threshold, max_or_min, min_progress_fraction = 0.0, job_number_to_progress_records_dict = None, array_index_to_child_name_dict = None, overallScoreFuncName = None, overallScore_params_dict = None):
+        """
+        Cancels the running tasks of the submission that can't produce a result good enough to be kept. Each task reports the best final score it could still possibly get (see base_connection.BaseCluster.createProgressReportingLines) and if that optimistic bound can't beat the admission threshold there is no point letting it finish. Only the hopeless array tasks are cancelled (not the whole job) so the cores they free go to the tasks of the job (and any other jobs) that are still waiting in the queue.
+
+        If each child is simulated by several array tasks (repetitions) then array_index_to_child_name_dict and overallScoreFuncName must be given. The tasks are then judged per child rather than per task: the optimistic bounds of all the child's repetitions are combined with the same overall score function that scores the finished child and the child is only hopeless if that combined bound can't beat the threshold. All the repetitions of a hopeless child that are still in the queue are cancelled together. A child is only judged once every one of its repetitions has reported at least min_progress_fraction, so a repetition that hasn't reported (e.g. is still waiting in the queue) keeps the whole child alive. The overall score function must never get worse when one of the scores it combines gets better (e.g. the mean) otherwise the combined bound isn't a bound.
+
+        Tasks that have been cancelled are added to self.terminated_array_indices and are not counted as failed by findFailedArrayIndices. They won't have created all of their output so whatever reads the output must allow for tasks with missing output.
+
+        Args:
+            progress_dir (str): The directory on the cluster that the progress records are written to.
+            admission_threshold (float): The score that a task must beat to be useful.
+            max_or_min (str): Either 'max' or 'min' depending on whether the score is maximised or minimised.
+            min_progress_fraction = 0.0 (float): Tasks that have reported less progress than this are never cancelled (early optimistic bounds can be unreliable).
+            job_number_to_progress_records_dict = None (dict): Records that have already been harvested (see base_connection.BaseCluster.harvestProgressRecords) so that the records of many submissions on the same cluster can be read in one go. If None (the default) then the records of this submission are harvested here.
+            array_index_to_child_name_dict = None (dict): Keys are array numbers and values are the name of the child that the task simulates. If None (the default) then every task is judged on its own.
+            overallScoreFuncName = None (str): The name of the method of this instance that works out overall scores. It is called as it is when the fittest population is updated, i.e. with {child_name: [tuple_of_optimistic_bounds, ()]} and overallScore_params_dict, and must return {child_name: [tuple_of_optimistic_bounds, (combined_bound,)]}. Only needed if array_index_to_child_name_dict is given.
+            overallScore_params_dict = None (dict): The second argument of the overall score method.
+
+        Returns:
+            list_of_terminated_array_indices (list of ints): The array numbers that were cancelled by this call.
+        """
+        if max_or_min not in ('max', 'min'):
+            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', max_or_min)
+
+        if array_index_to_child_name_dict is not None and overallScoreFuncName is None:
+            raise ValueError('The optimistic bounds of the repetitions of a child can only be combined with an overall score function so overallScoreFuncName must be given with array_index_to_child_name_dict. Here overallScoreFuncName = ', overallScoreFuncName)
+
+        cluster_connection = self.submission.cluster_connection
+        # reruns of failed tasks write records under their own job numbers
+        list_of_job_numbers = [self.submission.cluster_job_number] + [job_number for job_number, list_of_array_indices in self.resubmissions]
+        if job_number_to_progress_records_dict is None:
+            job_number_to_progress_records_dict = cluster_connection.harvestProgressRecords(progress_dir, list_of_job_numbers)
+
+        # the latest record of every array task (the reruns come after the original job) and the job it is running in
+        array_index_to_record_dict = {}
+        array_index_to_job_number_dict = {}
+        for job_number in list_of_job_numbers:
+            for array_index, record in job_number_to_progress_records_dict.get(int(job_number), {}).items():
+                array_index_to_record_dict[array_index] = record
+                array_index_to_job_number_dict[array_index] = job_number
+
+        # group the tasks by child (every task is its own group if there are no repetitions)
+        if array_index_to_child_name_dict is None:
+            child_name_to_array_indices_dict = {array_index: [array_index] for array_index in array_index_to_record_dict.keys()}
+        else:
+            child_name_to_array_indices_dict = {}
+            for array_index, child_name in array_index_to_child_name_dict.items():
+                child_name_to_array_indices_dict.setdefault(child_name, []).append(array_index)
+
+        child_name_to_bounds_dict = {}
+        for child_name, list_of_array_indices in child_name_to_array_indices_dict.items():
+            if len(set(list_of_array_indices) & self.terminated_array_indices) > 0:
+                continue
+            if any([array_index not in array_index_to_record_dict or array_index_to_record_dict[array_index]['progress_fraction'] < min_progress_fraction for array_index in list_of_array_indices]):
+                continue
+            child_name_to_bounds_dict[child_name] = tuple([array_index_to_record_dict[array_index]['optimistic_bound'] for array_index in sorted(list_of_array_indices)])
+
+        if array_index_to_child_name_dict is None:
+            child_name_to_combined_bound_dict = {child_name: bounds[0] for child_name, bounds in child_name_to_bounds_dict.items()}
+        elif len(child_name_to_bounds_dict) > 0:
+            all_children = getattr(self, overallScoreFuncName)({child_name: [bounds, ()] for child_name, bounds in child_name_to_bounds_dict.items()}, overallScore_params_dict)
+            child_name_to_combined_bound_dict = {child_name: all_children[child_name][-1][0] for child_name in child_name_to_bounds_dict.keys()}
+        else:
+            child_name_to_combined_bound_dict = {}
+
+        job_number_to_hopeless_array_indices_dict = {}
+        for child_name, combined_bound in child_name_to_combined_bound_dict.items():
+            if (max_or_min == 'max' and combined_bound < admission_threshold) or (max_or_min == 'min' and combined_bound > admission_threshold):
+                for array_index in child_name_to_array_indices_dict[child_name]:
+                    job_number_to_hopeless_array_indices_dict.setdefault(array_index_to_job_number_dict[array_index], []).append(array_index)
+
+        list_of_terminated_array_indices = []
+        for job_number, list_of_hopeless_array_indices in job_number_to_hopeless_array_indices_dict.items():
+            # tasks that have already finished keep their results
+            set_of_tasks_in_queue = set(cluster_connection.getArrayIndicesFromQueueStdOut(cluster_connection.checkQueue(job_number)['stdout']))
+            list_of_hopeless_array_indices = sorted(set(list_of_hopeless_array_indices) & set_of_tasks_in_queue)
+            if len(list_of_hopeless_array_indices) > 0:
+                print('Terminating hopeless array tasks ', list_of_hopeless_array_indices, ' of job ', job_number)
+                cluster_connection.cancelArrayTasks(job_number, list_of_hopeless_array_indices)
+                self.terminated_array_indices |= set(list_of_hopeless_array_indices)
+                list_of_terminated_array_indices += list_of_hopeless_array_indices
+
+        return sorted(list_of_terminated_array_indices)
+
     # ABSTRACT METHODS
     @abstractmethod
     # This method is to monitor the progress of a job and perform other job related to the job like data processing and updating of databases etc
@@ -3,6 +3,17 @@ import subprocess
 import time
 import re
 import datetime
+import sqlite3
+import hashlib
+import os
+import math
+import bisect
+import collections
+import secrets
+import tarfile
+import io
+import shlex
+import posixpath
 class Connection(metaclass=ABCMeta):
     """
     This is an abstract class that all connection classes inherit from. The purpose of this class is to act as a template with which to communicate with other computers in a rigid manner so that other programs can be built on top of it, without knowing what computers it might connect to iin the future.
@@ -39,6 +50,15 @@ class Connection(metaclass=ABCMeta):
         self.surname_of_user = surname_of_user
         self.user_email = user_email
         self.affiliation = affiliation
+        # checking disk usage on large shared file systems can take a long time and so results are cached for disk_usage_time_to_live seconds (see getCachedDiskUsage)
+        self.disk_usage_time_to_live = 600
+        self.disk_usage_cache = {}
+        # per path indexes of file sizes that are kept up to date incrementally (see updateDiskUsageIndex)
+        self.disk_usage_index = {}
+        # the directory on the remote computer that the marker files of the incremental scans are kept in so that they are never written into the directories being scanned (see getMarkerFilePath)
+        self.marker_dir = '${HOME}/.ccf_markers'
+        # incremental scans only see files that are new or have changed and so the disk usage index and file index do a full rescan (which notices deleted files) if the last one was more than full_rescan_interval seconds ago
+        self.full_rescan_interval = 86400
 
     # ABSTRACT METHODS
     @abstractmethod
@@ -65,16 +85,19 @@ class Connection(metaclass=ABCMeta):
             file_encoding = 'utf-8': This is an option to change the encoding of the file. The default is 'utf-8'.
 
         Raises:
-            OSError if the file can't be opened.
-            subprocess.SubprocessError if subprocess.check_call cannot change the permissions of the file.
+            OSError if the file can't be opened or os.chmod cannot change the permissions of the file.
+            subprocess.SubprocessError if subprocess.check_call cannot change the (symbolic) permissions of the file.
         """
         with open(file_name_and_path, mode = file_open_mode, encoding = file_encoding) as myfile:
             for line in list_of_lines_of_file:
                 myfile.write(line + "\n")
 
-        # set file permissions if specified
+        # set file permissions if specified (octal permissions don't need a chmod subprocess)
         if file_permisions != None:
-            subprocess.check_call(["chmod", str(file_permisions), str(file_name_and_path)])
+            if re.fullmatch(r'[0-7]{3,4}', str(file_permisions)) is not None:
+                os.chmod(file_name_and_path, int(str(file_permisions), 8))
+            else:
+                subprocess.check_call(["chmod", str(file_permisions), str(file_name_and_path)])
 
         return
 
@@ -169,6 +192,386 @@ class Connection(metaclass=ABCMeta):
 
         return output_dict
 
+    def streamTarToRemote(self, tar_bytes, remote_dir):
+        """
+        Unpacks a tar archive (given as bytes) into a directory on the remote computer by piping it straight into 'tar' over one SSH connection. Nothing is written to the local disk.
+
+        Args:
+            tar_bytes (bytes): An uncompressed tar archive.
+            remote_dir (str): The directory on the remote computer to unpack the archive in (paths in the archive are relative to this).
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        ssh_process = subprocess.Popen(['ssh', '-T', self.ssh_config_alias, 'tar -xpf - -C ' + remote_dir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = ssh_process.communicate(tar_bytes)
+        output_dict = {'return_code': ssh_process.returncode, 'stdout': out.decode('utf-8', 'replace'), 'stderr': err.decode('utf-8', 'replace')}
+
+        return output_dict
+
+    # DISK USAGE METHODS - these are the building blocks of checkDiskUsage (see BaseCluster.checkDiskUsage) and child classes can combine them differently if their file systems need it. They all return a dict of the form {'usage': number, 'soft_limit': number, 'hard_limit': number, 'units': 'KB'}.
+
+    def getDiskUsageFromDf(self, path):
+        """
+        Gets the disk usage of the file system that path is on using 'df'. This is quick but on shared file systems it is the usage of everyone on the file system rather than just this user.
+
+        Args:
+            path (str): A path on the remote computer.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage', 'soft_limit', 'hard_limit' and 'units' (always 'KB'). The limits are both the size of the file system.
+        """
+        output_dict = self.checkSuccess(self.sendCommand, ['df -Pk ' + path + ' | tail -n 1'])
+        disk_usage_dict = self.parseDfOutput(output_dict['stdout'])
+
+        return disk_usage_dict
+
+    def getDiskUsageFromQuota(self, path):
+        """
+        Gets the disk usage and limits of the user from the quota tools on the remote computer. Lustre's 'lfs quota' is tried first, then the standard 'quota' command and if neither of them exist then it falls back to 'df' (see getDiskUsageFromDf).
+
+        Args:
+            path (str): A path on the remote computer. This is used to work out which file system to check the quota of.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage', 'soft_limit', 'hard_limit' and 'units' (always 'KB'). It also has the key 'source' which is the tool the values came from ('lfs', 'quota' or 'df').
+        """
+        # all three tools are tried in one connection and the tool that was used is echoed first so we know how to read the output
+        quota_cmd = 'if command -v lfs > /dev/null 2>&1 && lfs quota -q -u ' + self.user_name + ' ' + path + ' > /dev/null 2>&1; then echo lfs; lfs quota -q -u ' + self.user_name + ' ' + path + '; elif command -v quota > /dev/null 2>&1 && [ -n "$(quota -w -f $(df -P ' + path + ' | tail -n 1 | awk \'{print $6}\') 2> /dev/null)" ]; then echo quota; quota -w -f $(df -P ' + path + ' | tail -n 1 | awk \'{print $6}\') | tail -n 1; else echo df; df -Pk ' + path + ' | tail -n 1; fi'
+        output_dict = self.checkSuccess(self.sendCommand, [quota_cmd])
+        lines_of_output = output_dict['stdout'].strip().split("\n")
+        source = lines_of_output[0].strip()
+        if source == 'df':
+            disk_usage_dict = self.parseDfOutput(lines_of_output[-1])
+        elif source in ('lfs', 'quota'):
+            disk_usage_dict = self.parseQuotaOutput("\n".join(lines_of_output[1:]))
+        else:
+            raise ValueError('Could not work out which tool was used to get the disk usage. Here the output of the command is: ', output_dict)
+
+        disk_usage_dict['source'] = source
+
+        return disk_usage_dict
+
+    def getCachedDiskUsage(self, path, getDiskUsageFuncName = 'getDiskUsageFromQuota', force_refresh = False):
+        """
+        Returns the disk usage of path using the function called getDiskUsageFuncName but only connects to the remote computer if the last result for that path and function is older than self.disk_usage_time_to_live seconds.
+
+        Args:
+            path (str): A path on the remote computer.
+            getDiskUsageFuncName = 'getDiskUsageFromQuota' (str): The name of the method used to get the disk usage, e.g. 'getDiskUsageFromQuota', 'getDiskUsageFromDf' or 'checkDiskUsage'. The method must take the path as its only arguement.
+            force_refresh = False (bool): If True the cache is ignored and the disk usage is checked again.
+
+        Returns:
+            disk_usage_dict (dict): Whatever getDiskUsageFuncName returns.
+        """
+        cache_key = (getDiskUsageFuncName, path)
+        if (force_refresh == False) and (cache_key in self.disk_usage_cache):
+            time_of_check, disk_usage_dict = self.disk_usage_cache[cache_key]
+            if time.time() - time_of_check < self.disk_usage_time_to_live:
+                return disk_usage_dict
+
+        disk_usage_dict = getattr(self, getDiskUsageFuncName)(path)
+        self.disk_usage_cache[cache_key] = (time.time(), disk_usage_dict)
+
+        return disk_usage_dict
+
+    def getMarkerFilePath(self, path, marker_name):
+        """
+        Returns where the marker file of an incremental scan of path is kept on the remote computer. Files changed since the marker was last touched are found with 'find -cnewer'. The markers are kept in self.marker_dir rather than in path itself so that nothing is written into the user's directories. The file name includes a hash of path so that every scanned directory has its own marker.
+
+        Args:
+            path (str): The directory on the remote computer being scanned.
+            marker_name (str): The kind of scan, e.g. 'disk_usage_index_marker'.
+
+        Returns:
+            marker_file (str): The path of the marker file on the remote computer.
+        """
+        return self.marker_dir + '/' + hashlib.md5(path.encode('utf-8')).hexdigest()[:16] + '.' + marker_name
+
+    def updateDiskUsageIndex(self, path, full_rescan = False):
+        """
+        Keeps a local index of the size of every file under path so that the size of path doesn't need a 'du' over the whole tree every time. The first time (or if full_rescan is True) every file is listed but after that only files that have changed since the last update are listed using 'find -cnewer' and a marker file on the remote computer (see getMarkerFilePath). The status change time is used rather than the modification time because files copied in with their modification times preserved (e.g. 'rsync -a', 'tar x' or 'cp -p') can have modification times older than the marker. Deleted files are only noticed on a full rescan and so one is done if the last one was more than self.full_rescan_interval seconds ago. If path doesn't exist (yet) its usage is zero.
+
+        Args:
+            path (str): A directory on the remote computer.
+            full_rescan = False (bool): If True the index for path is thrown away and rebuilt.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage' (total size in KB of all files under path), 'no_of_files', 'dir_to_usage_dict' (the usage in KB of the files directly inside each directory) and 'units' (always 'KB').
+        """
+        marker_file = self.getMarkerFilePath(path, 'disk_usage_index_marker')
+        if full_rescan or (path not in self.disk_usage_index) or (time.time() - self.disk_usage_index[path]['time_of_full_scan'] > self.full_rescan_interval):
+            self.disk_usage_index[path] = {'file_sizes': {}, 'dir_bytes': {}, 'time_of_full_scan': time.time()}
+            newer_part = ''
+        else:
+            # if the marker has gone then everything is listed again (files already in the index aren't counted twice)
+            newer_part = ' $([ -e ' + marker_file + ' ] && echo "-cnewer ' + marker_file + '")'
+        # files can be deleted whilst find is running so its errors don't stop the marker being moved into place
+        find_cmd = 'if [ -d ' + path + ' ]; then mkdir -p ' + self.marker_dir + ' && touch ' + marker_file + '.new && { find ' + path + ' -type f' + newer_part + ' -printf \'%s\\t%p\\n\' 2> /dev/null; mv ' + marker_file + '.new ' + marker_file + '; }; else echo CCF_MISSING_PATH; fi'
+
+        output_dict = self.checkSuccess(self.sendCommand, [find_cmd])
+        if output_dict['stdout'].strip() == 'CCF_MISSING_PATH':
+            # the next update after path is created has to list everything
+            del self.disk_usage_index[path]
+            return {'usage': 0, 'no_of_files': 0, 'dir_to_usage_dict': {}, 'units': 'KB'}
+
+        index = self.disk_usage_index[path]
+        for line in output_dict['stdout'].split("\n"):
+            if line.count("\t") == 0:
+                continue
+            size, file_name = line.split("\t", 1)
+            size = int(size)
+            dir_name = file_name.rsplit('/', 1)[0]
+            # a file that has changed has its old size removed before the new one is added
+            old_size = index['file_sizes'].get(file_name, 0)
+            index['file_sizes'][file_name] = size
+            index['dir_bytes'][dir_name] = index['dir_bytes'].get(dir_name, 0) + size - old_size
+
+        total_bytes = sum(index['dir_bytes'].values())
+        disk_usage_dict = {'usage': total_bytes / 1024, 'no_of_files': len(index['file_sizes']), 'dir_to_usage_dict': {dir_name: index['dir_bytes'][dir_name] / 1024 for dir_name in index['dir_bytes']}, 'units': 'KB'}
+
+        return disk_usage_dict
+
+    @staticmethod
+    def parseDfOutput(df_line):
+        """
+        Reads the last line of 'df -Pk' (i.e. 'Filesystem 1024-blocks Used Available Capacity Mounted-on').
+
+        Args:
+            df_line (str): The output of 'df -Pk path | tail -n 1'.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage', 'soft_limit', 'hard_limit' and 'units' (always 'KB').
+        """
+        fields = df_line.strip().split("\n")[-1].split()
+        used = int(fields[2])
+        available = int(fields[3])
+        disk_usage_dict = {'usage': used, 'soft_limit': used + available, 'hard_limit': used + available, 'units': 'KB'}
+
+        return disk_usage_dict
+
+    @staticmethod
+    def parseQuotaOutput(quota_output):
+        """
+        Reads the output of 'lfs quota -q' or the last line of 'quota -w'. Both have the form 'filesystem used soft_limit hard_limit ...' (lfs sometimes puts the filesystem on its own line) where the numbers are in KB and the used value can have a '*' on the end if it is over the soft limit. A limit of zero means there is no limit and so is returned as float('inf').
+
+        Args:
+            quota_output (str): The output of the quota tool.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage', 'soft_limit', 'hard_limit' and 'units' (always 'KB').
+        """
+        fields = quota_output.split()
+        # find the first field that is a number (the usage) and the limits are the two after that
+        usage_idx = [idx for idx in range(len(fields)) if re.fullmatch(r'\d+\*?', fields[idx]) is not None][0]
+        usage = int(fields[usage_idx].rstrip('*'))
+        soft_limit = int(fields[usage_idx + 1])
+        hard_limit = int(fields[usage_idx + 2])
+        if soft_limit == 0:
+            soft_limit = float('inf')
+        if hard_limit == 0:
+            hard_limit = float('inf')
+        disk_usage_dict = {'usage': usage, 'soft_limit': soft_limit, 'hard_limit': hard_limit, 'units': 'KB'}
+
+        return disk_usage_dict
+
+    # FILE INDEX METHODS - these keep a local SQLite index of the files in a remote directory so that questions like "which simulations have finished?" can be answered from one cheap metadata scan rather than checking each file with its own connection or downloading everything.
+
+    def scanRemoteFileIndex(self, path, index_db_path, with_checksum = False, full_rescan = False):
+        """
+        Lists every file under path on the remote computer (with one 'find -printf' command) and streams the path, size, modification time and (optionally) md5 checksum of each file into a local SQLite database. After the first scan only files that have changed since the last scan are listed (using 'find -cnewer' and a marker file on the remote computer, see getMarkerFilePath and updateDiskUsageIndex) and so repeated scans of large directories are cheap. Files that are deleted are only removed from the index on a full rescan and so one is done if the last one was more than self.full_rescan_interval seconds ago. If path doesn't exist (yet) the index of path is emptied.
+
+        Args:
+            path (str): A directory on the remote computer.
+            index_db_path (str): The path and file name of the SQLite database on the local computer. It is created if it doesn't exist.
+            with_checksum = False (bool): If True the md5 checksum of each new or changed file is also calculated on the remote computer. This has to read the files and so is much slower.
+            full_rescan = False (bool): If True all the files under path are listed and files that no longer exist are removed from the index.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'no_of_files_scanned' and 'no_of_files_in_index'.
+        """
+        db_conn = self.openFileIndex(index_db_path)
+        previous_scan = db_conn.execute('SELECT scan_id FROM scans WHERE root = ?', (path,)).fetchone()
+        previous_full_scan = db_conn.execute('SELECT time_of_full_scan FROM full_scans WHERE root = ?', (path,)).fetchone()
+        if previous_scan is None:
+            full_rescan = True
+            scan_id = 1
+        else:
+            scan_id = previous_scan[0] + 1
+        if (previous_full_scan is None) or (time.time() - previous_full_scan[0] > self.full_rescan_interval):
+            full_rescan = True
+
+        marker_file = self.getMarkerFilePath(path, 'file_index_marker')
+        if full_rescan:
+            newer_part = ''
+            time_of_full_scan = time.time()
+        else:
+            # if the marker has gone then everything is listed again
+            newer_part = ' $([ -e ' + marker_file + ' ] && echo "-cnewer ' + marker_file + '")'
+        # files can be deleted whilst find is running so its errors don't stop the marker being moved into place
+        find_part = 'find ' + path + ' -type f' + newer_part
+        list_of_cmds = [find_part + ' -printf \'F\\t%s\\t%T@\\t%p\\n\' 2> /dev/null']
+        if with_checksum:
+            list_of_cmds.append(find_part + ' -exec md5sum {} + 2> /dev/null | sed \'s/^\\([0-9a-f]*\\)  /C\\t\\1\\t/\'')
+        list_of_cmds.append('mv ' + marker_file + '.new ' + marker_file)
+        scan_cmd = 'if [ -d ' + path + ' ]; then mkdir -p ' + self.marker_dir + ' && touch ' + marker_file + '.new && { ' + '; '.join(list_of_cmds) + '; }; else echo M; fi'
+
+        scan_output_dict = self.checkSuccess(self.streamFileListIntoIndex, [scan_cmd], db_conn, path, scan_id)
+        if not scan_output_dict['root_exists']:
+            # e.g. the output directory of a generation before any task has run. The next scan after it is created lists everything.
+            db_conn.execute('DELETE FROM files WHERE root = ?', (path,))
+            db_conn.execute('DELETE FROM scans WHERE root = ?', (path,))
+            db_conn.execute('DELETE FROM full_scans WHERE root = ?', (path,))
+            db_conn.commit()
+            db_conn.close()
+            return {'return_code': scan_output_dict['return_code'], 'no_of_files_scanned': 0, 'no_of_files_in_index': 0}
+
+        if full_rescan:
+            # anything that wasn't seen in a full scan no longer exists
+            db_conn.execute('DELETE FROM files WHERE root = ? AND scan_id != ?', (path, scan_id))
+            db_conn.execute('INSERT OR REPLACE INTO full_scans (root, time_of_full_scan) VALUES (?, ?)', (path, time_of_full_scan))
+
+        db_conn.execute('INSERT OR REPLACE INTO scans (root, scan_id, time_of_scan) VALUES (?, ?, ?)', (path, scan_id, time.time()))
+        db_conn.commit()
+        no_of_files_in_index = db_conn.execute('SELECT COUNT(*) FROM files WHERE root = ?', (path,)).fetchone()[0]
+        db_conn.close()
+
+        output_dict = {'return_code': scan_output_dict['return_code'], 'no_of_files_scanned': scan_output_dict['no_of_files_scanned'], 'no_of_files_in_index': no_of_files_in_index}
+
+        return output_dict
+
+    def streamFileListIntoIndex(self, list_of_remote_commands, db_conn, root, scan_id):
+        """
+        Sends commands to the remote computer (like sendCommand) but instead of waiting for all of the stdout, each line is read as it arrives and put into the file index (see insertFileListIntoIndex). This means that listing millions of files doesn't need to hold the whole listing in memory. Rows are inserted with 'INSERT OR REPLACE' and so this is safe to retry through checkSuccess.
+
+        Args:
+            list_of_remote_commands (list of strings): The commands that list the files.
+            db_conn (sqlite3.Connection): An open file index (see openFileIndex).
+            root (str): The directory on the remote computer that was scanned.
+            scan_id (int): The number of this scan of root.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'no_of_files_scanned' and 'root_exists'.
+        """
+        ssh_process = subprocess.Popen(['ssh', '-T', self.ssh_config_alias], stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        ssh_process.stdin.write("\n".join(list_of_remote_commands) + "\n")
+        ssh_process.stdin.close()
+        output_dict = self.insertFileListIntoIndex(ssh_process.stdout, db_conn, root, scan_id)
+        ssh_process.wait()
+        output_dict['return_code'] = ssh_process.returncode
+
+        return output_dict
+
+    def insertFileListIntoIndex(self, lines_of_file_list, db_conn, root, scan_id):
+        """
+        Puts the lines of a file listing into the file index as they are read. Lines have the form 'F<tab>size<tab>mtime<tab>path' or 'C<tab>md5<tab>path', the line 'M' means that root doesn't exist and anything else is ignored.
+
+        Args:
+            lines_of_file_list (iterable of strings): The lines of the listing (e.g. the stdout of a process).
+            db_conn (sqlite3.Connection): An open file index (see openFileIndex).
+            root (str): The directory on the remote computer that was scanned.
+            scan_id (int): The number of this scan of root.
+
+        Returns:
+            output_dict (dict): Has keys 'no_of_files_scanned' and 'root_exists'.
+        """
+        no_of_files_scanned = 0
+        root_exists = True
+        batch_of_rows = []
+        for line in lines_of_file_list:
+            fields = line.rstrip("\n").split("\t", 3)
+            if fields[0] == 'F' and len(fields) == 4:
+                batch_of_rows.append((root, fields[3], int(fields[1]), float(fields[2]), scan_id))
+                no_of_files_scanned += 1
+                if len(batch_of_rows) >= 10000:
+                    self.insertRowsIntoFileIndex(db_conn, batch_of_rows)
+                    batch_of_rows = []
+            elif fields[0] == 'C' and len(fields) == 3:
+                self.insertRowsIntoFileIndex(db_conn, batch_of_rows)
+                batch_of_rows = []
+                db_conn.execute('UPDATE files SET checksum = ? WHERE path = ?', (fields[1], fields[2]))
+            elif fields == ['M']:
+                root_exists = False
+
+        self.insertRowsIntoFileIndex(db_conn, batch_of_rows)
+        db_conn.commit()
+        output_dict = {'no_of_files_scanned': no_of_files_scanned, 'root_exists': root_exists}
+
+        return output_dict
+
+    @staticmethod
+    def openFileIndex(index_db_path):
+        """
+        Opens (and creates if neccessary) a local file index.
+
+        Args:
+            index_db_path (str): The path and file name of the SQLite database on the local computer.
+
+        Returns:
+            db_conn (sqlite3.Connection): The open database.
+        """
+        db_conn = sqlite3.connect(index_db_path)
+        db_conn.execute('CREATE TABLE IF NOT EXISTS files (root TEXT, path TEXT PRIMARY KEY, size INTEGER, mtime REAL, checksum TEXT, scan_id INTEGER)')
+        db_conn.execute('CREATE TABLE IF NOT EXISTS scans (root TEXT PRIMARY KEY, scan_id INTEGER, time_of_scan REAL)')
+        db_conn.execute('CREATE TABLE IF NOT EXISTS full_scans (root TEXT PRIMARY KEY, time_of_full_scan REAL)')
+        db_conn.execute('CREATE INDEX IF NOT EXISTS files_root_idx ON files (root)')
+
+        return db_conn
+
+    @staticmethod
+    def insertRowsIntoFileIndex(db_conn, list_of_rows):
+        """
+        Inserts or updates files in the file index. A file whose size or modification time has changed loses its old checksum.
+
+        Args:
+            db_conn (sqlite3.Connection): An open file index (see openFileIndex).
+            list_of_rows (list of tuples): Each tuple is (root, path, size, mtime, scan_id).
+        """
+        db_conn.executemany('INSERT INTO files (root, path, size, mtime, checksum, scan_id) VALUES (?, ?, ?, ?, NULL, ?) ON CONFLICT(path) DO UPDATE SET root = excluded.root, scan_id = excluded.scan_id, checksum = CASE WHEN files.size = excluded.size AND files.mtime = excluded.mtime THEN files.checksum ELSE NULL END, size = excluded.size, mtime = excluded.mtime', list_of_rows)
+
+        return
+
+    @staticmethod
+    def getFilesFromIndex(index_db_path, path_prefix = '', min_size = 0):
+        """
+        Returns the files in a local file index (see scanRemoteFileIndex) sorted by path.
+
+        Args:
+            index_db_path (str): The path and file name of the SQLite database on the local computer.
+            path_prefix = '' (str): Only files whose path starts with this are returned.
+            min_size = 0 (int): Only files with at least this many bytes are returned.
+
+        Returns:
+            list_of_files (list of tuples): Each tuple is (path, size, mtime, checksum) and checksum is None if it hasn't been calculated.
+        """
+        db_conn = Connection.openFileIndex(index_db_path)
+        # a range on the primary key is used rather than LIKE so that the index can be used and '%' or '_' in paths don't matter
+        list_of_files = db_conn.execute('SELECT path, size, mtime, checksum FROM files WHERE path >= ? AND path < ? AND size >= ? ORDER BY path', (path_prefix, path_prefix + '\U0010ffff', min_size)).fetchall()
+        db_conn.close()
+
+        return list_of_files
+
+    @staticmethod
+    def getExistingFilesFromIndex(index_db_path, list_of_paths, min_size = 1):
+        """
+        Works out which of a list of expected files exist in the local file index (see scanRemoteFileIndex). This can be used to find out which simulations have produced their output without connecting to the remote computer for each one.
+
+        Args:
+            index_db_path (str): The path and file name of the SQLite database on the local computer.
+            list_of_paths (list of str): Absolute paths on the remote computer.
+            min_size = 1 (int): Files that are smaller than this are treated as missing (by default empty files are treated as missing).
+
+        Returns:
+            set_of_existing_paths (set of str): The paths in list_of_paths that exist and are at least min_size bytes.
+        """
+        db_conn = Connection.openFileIndex(index_db_path)
+        db_conn.execute('CREATE TEMP TABLE wanted (path TEXT PRIMARY KEY)')
+        db_conn.executemany('INSERT OR IGNORE INTO wanted (path) VALUES (?)', [(path,) for path in list_of_paths])
+        set_of_existing_paths = set([row[0] for row in db_conn.execute('SELECT files.path FROM files JOIN wanted ON files.path = wanted.path WHERE files.size >= ?', (min_size,))])
+        db_conn.close()
+
+        return set_of_existing_paths
+
     # STATIC METHODS - I made these all static methods because I thought it might be handy to be able to use them without creating an instance.
     @staticmethod
     def checkSuccess(function, *args):
@@ -239,6 +642,176 @@ class Connection(metaclass=ABCMeta):
 
         return raw_output
 
+class ArrayIndexSet():
+    """
+    A set of job array numbers that is stored as sorted, non-overlapping ranges so that specs like '1-500' can be combined and subtracted without writing out every number. It reads and writes the array specs that queuing systems understand, e.g. '1-5,9,12-20%50' (the '%50' means that at most 50 tasks may run at once). Steps (e.g. '1-9:2') can be read but are written out as separate numbers.
+
+    For example, to find the tasks that still need to run:
+
+        all_tasks = ArrayIndexSet.fromArraySpec('1-500')
+        tasks_left = all_tasks - ArrayIndexSet([3, 4, 5, 17])
+        tasks_left.toArraySpec() # '1-2,6-16,18-500'
+    """
+    def __init__(self, array_indices = (), max_concurrent_tasks = None):
+        """
+        Args:
+            array_indices = () (iterable of ints or ArrayIndexSet): The array numbers in the set.
+            max_concurrent_tasks = None (int): The most tasks that may run at once (the '%' part of an array spec). If None then there is no limit. If array_indices is an ArrayIndexSet and this is None then its limit is kept.
+        """
+        if isinstance(array_indices, ArrayIndexSet):
+            self.ranges = list(array_indices.ranges)
+            if max_concurrent_tasks is None:
+                max_concurrent_tasks = array_indices.max_concurrent_tasks
+        else:
+            self.ranges = ArrayIndexSet.normaliseRanges([(int(idx), int(idx)) for idx in array_indices])
+        self.max_concurrent_tasks = max_concurrent_tasks
+
+    @classmethod
+    def fromArraySpec(cls, array_spec):
+        """
+        Reads an array spec like the ones passed to 'qsub -t' or 'sbatch --array', e.g. '1-5,9,12-20:2%50'.
+
+        Args:
+            array_spec (str): The array spec.
+
+        Returns:
+            array_index_set (ArrayIndexSet): The array numbers in the spec.
+        """
+        array_spec = str(array_spec).strip()
+        max_concurrent_tasks = None
+        if '%' in array_spec:
+            array_spec, max_concurrent_tasks = array_spec.split('%', 1)
+            max_concurrent_tasks = int(max_concurrent_tasks)
+
+        list_of_ranges = []
+        for part in array_spec.split(','):
+            match = re.fullmatch(r'\s*(\d+)(?:-(\d+)(?::(\d+))?)?\s*', part)
+            if match is None:
+                raise ValueError('Could not understand the array spec. Here array_spec = ', array_spec)
+
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) is not None else start
+            step = int(match.group(3)) if match.group(3) is not None else 1
+            if end < start or step < 1:
+                raise ValueError('Array ranges must go up in steps of at least one. Here part = ', part)
+
+            if step == 1:
+                list_of_ranges.append((start, end))
+            else:
+                list_of_ranges += [(idx, idx) for idx in range(start, end + 1, step)]
+
+        array_index_set = cls(max_concurrent_tasks = max_concurrent_tasks)
+        array_index_set.ranges = ArrayIndexSet.normaliseRanges(list_of_ranges)
+
+        return array_index_set
+
+    @staticmethod
+    def normaliseRanges(list_of_ranges):
+        """
+        Sorts a list of ranges and merges any that overlap or touch.
+
+        Args:
+            list_of_ranges (list of tuples): Each tuple is (start, end) and both ends are included.
+
+        Returns:
+            list_of_merged_ranges (list of tuples): The same array numbers as sorted, non-overlapping ranges.
+        """
+        list_of_merged_ranges = []
+        for start, end in sorted(list_of_ranges):
+            if len(list_of_merged_ranges) > 0 and start <= list_of_merged_ranges[-1][1] + 1:
+                list_of_merged_ranges[-1] = (list_of_merged_ranges[-1][0], max(list_of_merged_ranges[-1][1], end))
+            else:
+                list_of_merged_ranges.append((start, end))
+
+        return list_of_merged_ranges
+
+    def union(self, other):
+        """
+        Returns the array numbers that are in either set (the limit on concurrent tasks is taken from this set).
+        """
+        array_index_set = ArrayIndexSet(self)
+        array_index_set.ranges = ArrayIndexSet.normaliseRanges(self.ranges + ArrayIndexSet(other).ranges)
+
+        return array_index_set
+
+    def difference(self, other):
+        """
+        Returns the array numbers that are in this set but not in other (the limit on concurrent tasks is taken from this set).
+        """
+        list_of_other_ranges = ArrayIndexSet(other).ranges
+        list_of_ranges = []
+        other_idx = 0
+        for start, end in self.ranges:
+            # skip the ranges of other that finish before this range starts
+            while other_idx < len(list_of_other_ranges) and list_of_other_ranges[other_idx][1] < start:
+                other_idx += 1
+
+            idx = other_idx
+            while idx < len(list_of_other_ranges) and list_of_other_ranges[idx][0] <= end:
+                if list_of_other_ranges[idx][0] > start:
+                    list_of_ranges.append((start, list_of_other_ranges[idx][0] - 1))
+                start = max(start, list_of_other_ranges[idx][1] + 1)
+                idx += 1
+
+            if start <= end:
+                list_of_ranges.append((start, end))
+
+        array_index_set = ArrayIndexSet(self)
+        array_index_set.ranges = list_of_ranges
+
+        return array_index_set
+
+    def intersection(self, other):
+        """
+        Returns the array numbers that are in both sets (the limit on concurrent tasks is taken from this set).
+        """
+        return self.difference(self.difference(other))
+
+    def toArraySpec(self, include_max_concurrent_tasks = True):
+        """
+        Writes the set as an array spec that queuing systems understand, e.g. '1-5,9,12-20%50'.
+
+        Args:
+            include_max_concurrent_tasks = True (bool): If False then the '%' part is left off (e.g. when cancelling tasks).
+
+        Returns:
+            array_spec (str): The array spec.
+        """
+        array_spec = ','.join([str(start) if start == end else str(start) + '-' + str(end) for start, end in self.ranges])
+        if include_max_concurrent_tasks and self.max_concurrent_tasks is not None:
+            array_spec += '%' + str(self.max_concurrent_tasks)
+
+        return array_spec
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __len__(self):
+        return sum([end - start + 1 for start, end in self.ranges])
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            for idx in range(start, end + 1):
+                yield idx
+
+    def __contains__(self, idx):
+        range_idx = bisect.bisect_right(self.ranges, (idx, float('inf'))) - 1
+
+        return range_idx >= 0 and self.ranges[range_idx][0] <= idx <= self.ranges[range_idx][1]
+
+    def __eq__(self, other):
+        # only the array numbers are compared, not the limit on concurrent tasks
+        return isinstance(other, ArrayIndexSet) and self.ranges == other.ranges
+
+    def __repr__(self):
+        return 'ArrayIndexSet.fromArraySpec(\'' + self.toArraySpec() + '\')'
+
 class BaseCluster(Connection):
     """
     The Connection class has all the atomistic atrributes that are general to all computers. If one wishes to manage computer clusters then there are additional atomistic attributes. Computer clusters normally have queuing systems and so one needs to be able to sumit and monitor the queues.
@@ -273,6 +846,27 @@ class BaseCluster(Connection):
         self.base_runfiles_path = base_runfiles_path
         self.submit_command = submit_command
         self.max_array_size = max_array_size
+        # the content addressed object store that staged files are deduplicated into (see stageFilesByContent)
+        self.object_store_path = self.base_runfiles_path + '/.object_store'
+        self.marker_dir = self.base_runfiles_path + '/.ccf_markers'
+        self.known_remote_object_names = set()
+        self.local_file_to_hash_cache = {}
+        # a local SQLite database of how long array tasks actually took and how much memory they used (see collectJobAccounting and recommendResources). If it is None then submission scripts use the resources they are given.
+        self.resource_history_db_path = None
+        # the submission governor (see governSubmission). If use_submission_governor is True then BaseJobSubmission submits through the governor (first in first out, waiting until there is space) so that the queue never goes over max_queued_tasks (if max_queued_tasks is None then it is learnt from the queuing system with getMaxQueuedTasks, and if that can't find a limit there isn't one).
+        self.use_submission_governor = False
+        self.max_queued_tasks = None
+        self.max_queued_tasks_learnt = False
+        self.governed_submissions = collections.deque()
+        self.governed_submission_count = 0
+        self.released_submissions = {}
+        # the number of times each submission token has been sent (see submitJob)
+        self.submission_token_attempts = {}
+        # the commands that set up the software environment of a task (e.g. ['module add python-anaconda-4.2-3.5', 'source activate virtual_environment_name']). If this isn't None then createStandardSubmissionScriptList adds the lines from getEnvironmentActivationLines to every script, which source a snapshot of the environment (see createEnvironmentSnapshot) rather than running the commands in every task.
+        self.activate_venv_list = None
+        self.environment_snapshot_path = None
+        self.environment_pack_path = None
+        self.environment_pack_prefix = None
 
     # ABSTRACT METHODS
 
@@ -295,22 +889,1048 @@ class BaseCluster(Connection):
     def getJobIdFromSubStdOut(self):
         # When jobs are submitted to the queue a job ID is returned to stdout so that the user can monitor the job. This is a function that when given the raw stdout can return the job number
         pass
-    
+
+    # QUEUING SYSTEM SPECIFIC METHODS - these aren't abstract so that cluster classes written before these features existed can still be created.
+
+    def getDependencyFlag(self, dependency_job_ids, dependency_type):
+        # Queuing systems can hold a job until other jobs have finished (e.g. only start the post-processing once all the simulations are done). Each queuing system has its own syntax for this and so this function should return the command line flag that makes a job depend on a list of other job IDs. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support job dependencies (see createSubmitCommand) because it doesn\'t implement getDependencyFlag. Here type(self) = ', type(self))
+
+    def getArrayIndicesFlag(self, array_indices):
+        # Returns the command line flag that overrides the array numbers requested in a submission script so that only some tasks of an array are submitted. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support submitting only some array tasks (see createSubmitCommand) because it doesn\'t implement getArrayIndicesFlag. Here type(self) = ', type(self))
+
+    def checkPendingArrayTasks(self, job_number):
+        # checkQueue returns every array task that is still in the queue but sometimes one needs to know which ones haven't started yet (e.g. to move them to a different cluster). Queuing systems show this differently. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support finding the array tasks that haven\'t started yet because it doesn\'t implement checkPendingArrayTasks. Here type(self) = ', type(self))
+
+    def cancelArrayTasks(self, job_number, list_of_array_indices):
+        # Cancels specific tasks of a job array rather than the whole job. Each queuing system has its own syntax for this. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support cancelling single array tasks because it doesn\'t implement cancelArrayTasks. Here type(self) = ', type(self))
+
+    def getQueueAvailability(self, list_of_queue_names):
+        # Returns how busy each queue (or partition) is right now, i.e. the gaps that a new job could start in straight away and how many jobs are already waiting. Each queuing system (and scheduler) shows this differently. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support checking how busy the queues are because it doesn\'t implement getQueueAvailability. Here type(self) = ', type(self))
+
+    def getArrayJobShellVariables(self):
+        # Returns the shell expressions that give the job ID and array number inside a running task. Each queuing system uses different environment variables. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support job arrays in generated script lines because it doesn\'t implement getArrayJobShellVariables. Here type(self) = ', type(self))
+
+    def getPilotLaunchCommand(self, worker_command):
+        # Returns the line of a pilot job script that starts the pilot worker once on every node of the allocation (e.g. with srun or pbsdsh). See submitPilots. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support pilot jobs because it doesn\'t implement getPilotLaunchCommand. Here type(self) = ', type(self))
+
+    def getSubmissionTokenFlag(self, submission_token):
+        # Returns the command line flag that attaches a submission token to a job (e.g. as its name or comment) so that it can be found in the queue again. See submitJob. If the queuing system can't do this then None is returned and jobs are submitted without a token (see submitJob).
+        return None
+
+    def createFindTokenCommand(self, submission_token):
+        # Returns a shell command that prints the job IDs of the user's jobs that have a given submission token (one per line), including jobs that have already finished so that a short job that has left the queue isn't submitted again. If the queuing system can't do this then None is returned and jobs are submitted without a token (see submitJob).
+        return None
+
+    def countTasksInQueue(self):
+        # Returns how many of the user's tasks (each array task counts as one) are in the queue right now. Used by the submission governor. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support the submission governor because it doesn\'t implement countTasksInQueue. Here type(self) = ', type(self))
+
+    def getMaxQueuedTasks(self):
+        # Returns the most tasks that the queuing system lets the user have in the queue at once (e.g. MaxSubmitJobs on SLURM or max_queued on PBS) or None if there isn't a limit. Each queuing system keeps this setting in a different place. Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support the submission governor because it doesn\'t implement getMaxQueuedTasks. Here type(self) = ', type(self))
+
+    def getArrayTaskAccounting(self, job_number):
+        # Returns how long each finished task of a job array actually ran and how much memory and CPU time it used. Each queuing system keeps this information in a different place (e.g. sacct on SLURM and qstat -f on PBS/TORQUE). Only BasePbs and BaseSlurm implement this so that other cluster classes only fail if they use the feature.
+        raise NotImplementedError('This cluster class doesn\'t support job accounting because it doesn\'t implement getArrayTaskAccounting. Here type(self) = ', type(self))
+
     # INSTANCE METHODS
 
-    def createStandardSubmissionScript(self, file_name_and_path, pbs_script_list, file_permissions = "700"):
+    def checkDiskUsage(self, path = None, force_refresh = False):
+        """
+        Satisfies the checkDiskUsage abstract method of Connection using the disk usage building blocks. The usage and limits of the user come from the quota tools (falling back to 'df', see getDiskUsageFromQuota) and the result is cached for self.disk_usage_time_to_live seconds (see getCachedDiskUsage) so this can be called before every submission without a connection each time. The usage of a single directory tree (rather than the user's whole quota) can be kept up to date cheaply with updateDiskUsageIndex.
+
+        Args:
+            path = None (str): A path on the file system to check. If None then self.base_output_path is used.
+            force_refresh = False (bool): If True the cache is ignored and the disk usage is checked again.
+
+        Returns:
+            disk_usage_dict (dict): Has keys 'usage', 'soft_limit', 'hard_limit', 'units' (always 'KB') and 'source' (the tool the values came from).
+        """
+        if path is None:
+            path = self.base_output_path
+
+        disk_usage_dict = self.getCachedDiskUsage(path, 'getDiskUsageFromQuota', force_refresh)
+
+        return disk_usage_dict
+
+    def createSubmitCommand(self, submission_script_name_and_path, dependency_job_ids = None, dependency_type = 'afterok', array_indices = None, submission_token = None):
+        """
+        Creates the command that submits a submission script to the queue (this does not submit it, it just creates the string). If dependency_job_ids is given then the job will be held in the queue until those jobs have finished (see getDependencyFlag for the exact meaning of dependency_type).
+
+        Args:
+            submission_script_name_and_path (str): The absolute path and file name of the submission script on the cluster.
+            dependency_job_ids = None (list): A list of job IDs (ints or strings - strings can be shell variables like '$stage_compute') that this job must wait for. If None (the default) then the job has no dependencies.
+            dependency_type = 'afterok' (str): The kind of dependency, e.g. 'afterok' means only start once all dependencies finished successfully.
+            array_indices = None (list of ints): If given then only these array numbers are submitted, overriding the job array request inside the submission script. This is used to rerun some tasks of a job array without changing the script.
+            submission_token = None (str): If given then the token is attached to the job (see getSubmissionTokenFlag) so that the job can be found again if the connection drops before the job ID is returned (see submitJob).
+
+        Returns:
+            submit_command (str): The command that submits the job when run on the cluster.
+        """
+        submit_command = self.submit_command
+        if dependency_job_ids is not None and len(dependency_job_ids) > 0:
+            submit_command += ' ' + self.getDependencyFlag(dependency_job_ids, dependency_type)
+
+        if array_indices is not None:
+            submit_command += ' ' + self.getArrayIndicesFlag(array_indices)
+
+        if submission_token is not None and self.getSubmissionTokenFlag(submission_token) is not None:
+            submit_command += ' ' + self.getSubmissionTokenFlag(submission_token)
+
+        submit_command += ' ' + submission_script_name_and_path
+
+        return submit_command
+
+    def createDependencyChainCommands(self, list_of_ordered_stages):
+        """
+        Creates a list of shell commands that submits a whole chain (or DAG) of dependent jobs in one go. Each job ID is captured into a shell variable so that later stages can depend on it without having to come back to the local computer in between submissions. At the end each stage name and job ID is echoed in the form 'stage_name=job_id' so that they can be read with getStageJobIdsFromChainStdOut.
+
+        Args:
+            list_of_ordered_stages (list of dicts): The stages in the order that they should be submitted (i.e. a stage must come after all the stages it depends on). Each dict has the keys 'stage_name' (str), 'submission_script_name_and_path' (str), 'depends_on' (list of stage names) and 'dependency_type' (str). It can also have the key 'submission_token' (str) so that sending the commands again doesn't submit the stage twice (see submitJob).
+
+        Returns:
+            list_of_commands (list of strings): The shell commands to send to the cluster.
+        """
+        list_of_commands = []
+        for stage in list_of_ordered_stages:
+            if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', stage['stage_name']) is None:
+                raise ValueError('stage names are used as shell variables and so must only contain letters, numbers and underscores (and not start with a number). Here stage[\'stage_name\'] = ', stage['stage_name'])
+
+            dependency_job_ids = ['${stage_' + parent + '}' for parent in stage['depends_on']]
+            submission_token = stage.get('submission_token')
+            submit_command = self.createSubmitCommand(stage['submission_script_name_and_path'], dependency_job_ids, stage['dependency_type'], submission_token = submission_token)
+            # the job ID is the first group of digits in the stdout which is the same thing that getJobIdFromSubStdOut looks for
+            submit_command = submit_command + ' | grep -o \'[0-9]\\+\' | head -n 1'
+            # if the chain is being sent again (because the connection dropped) then stages that were already submitted are found by their token rather than submitted twice
+            if submission_token is not None and self.getSubmissionTokenFlag(submission_token) is not None:
+                submit_command = 'existing_job_id=$(' + self.createFindTokenCommand(submission_token) + ' | head -n 1); if [ -n "${existing_job_id}" ]; then echo "${existing_job_id}"; else ' + submit_command + '; fi'
+            list_of_commands.append('stage_' + stage['stage_name'] + '=$(' + submit_command + ')')
+            # stop submitting if a stage failed so that nothing waits on a job that doesn't exist
+            list_of_commands.append('if [ -z "${stage_' + stage['stage_name'] + '}" ]; then echo "Could not submit stage ' + stage['stage_name'] + '" >&2; exit 1; fi')
+
+        for stage in list_of_ordered_stages:
+            list_of_commands.append('echo "' + stage['stage_name'] + '=${stage_' + stage['stage_name'] + '}"')
+
+        return list_of_commands
+
+    def createScratchStagingLines(self, scratch_staging_dict):
+        """
+        Creates the lines of a submission script that stage shared inputs onto node-local scratch and collect the task's output there. When every task of a job array reads the same large inputs from the shared file system at once the metadata server gets overloaded. Instead the first task of the job on each node copies the inputs into the job's node-local scratch directory (see createNodeScratchLines) under a lock, the other tasks on the node wait for it, and all the tasks on that node use the local copy. If the copy fails (e.g. scratch is full) the tasks fall back to links to the shared inputs.
+
+        Tasks write their output into a node-local directory which is copied to the shared output directory in one go when the task exits (even if it fails).
+
+        The lines export two environment variables for the job specific code to use:
+            - CCF_SHARED_INPUTS_DIR: The directory containing the inputs (each input keeps its base name).
+            - CCF_TASK_OUTPUT_DIR: The directory that the task should write its output to.
+
+        The staged inputs stay in scratch while any task of the job is running on the node and the last one to exit removes them, so nothing is left behind even on clusters that don't clear scratch after a job.
+
+        Args:
+            scratch_staging_dict (dict): Has the keys:
+                                            - 'list_of_shared_inputs' (list of str): Absolute paths of the files and directories on the shared file system to stage.
+                                            - 'output_dir' (str): The directory on the shared file system that the task's output is copied to (it can use shell variables, e.g. to include the array number).
+                                            - 'scratch_dir' (str, optional): The node-local directory that the job's scratch directory is made in (see createNodeScratchLines). Defaults to /tmp.
+
+        Returns:
+            list_of_lines (list of strings): The lines of shell code.
+        """
+        shell_variables_dict = self.getArrayJobShellVariables()
+        list_of_shared_inputs = ' '.join([shlex.quote(shared_input) for shared_input in scratch_staging_dict['list_of_shared_inputs']])
+        # the output directory is double quoted rather than shlex quoted so that its shell variables are still expanded
+        output_dir = '"' + scratch_staging_dict['output_dir'] + '"'
+        list_of_lines = self.createNodeScratchLines(scratch_staging_dict.get('scratch_dir'))
+        list_of_lines += ['## Stage the shared inputs onto node-local scratch (once per node)', 'export CCF_SHARED_INPUTS_DIR="${CCF_NODE_SCRATCH_DIR}/inputs"', 'mkdir -p "${CCF_SHARED_INPUTS_DIR}"', '( flock 9; if [ ! -e "${CCF_SHARED_INPUTS_DIR}/.staged" ]; then cp -rp ' + list_of_shared_inputs + ' "${CCF_SHARED_INPUTS_DIR}/" && touch "${CCF_SHARED_INPUTS_DIR}/.staged"; fi ) 9> "${CCF_SHARED_INPUTS_DIR}/.lock"']
+        # if the inputs couldn't be copied then use links to the shared file system instead
+        list_of_lines += ['if [ ! -e "${CCF_SHARED_INPUTS_DIR}/.staged" ]; then', '    export CCF_SHARED_INPUTS_DIR="${CCF_NODE_SCRATCH_DIR}/links_' + shell_variables_dict['array_index'] + '"', '    mkdir -p "${CCF_SHARED_INPUTS_DIR}" && ln -sf ' + list_of_shared_inputs + ' "${CCF_SHARED_INPUTS_DIR}/"', 'fi']
+        # this replaces the EXIT trap of createNodeScratchLines so it has to release the node scratch itself
+        list_of_lines += ['## Write the output locally and copy it to the shared file system in one go when the task exits', 'export CCF_TASK_OUTPUT_DIR="${CCF_NODE_SCRATCH_DIR}/output_' + shell_variables_dict['array_index'] + '"', 'mkdir -p "${CCF_TASK_OUTPUT_DIR}"', 'flushTaskOutput() {', '    exit_code=$?', '    mkdir -p ' + output_dir + ' && cp -rp "${CCF_TASK_OUTPUT_DIR}/." ' + output_dir + '/ && rm -rf "${CCF_TASK_OUTPUT_DIR}"', '    releaseNodeScratch', '    exit ${exit_code}', '}', 'trap flushTaskOutput EXIT' + "\n"]
+
+        return list_of_lines
+
+    # PROGRESS REPORTING - long running tasks can report how far they have got and how well they are doing so that the tasks that can't produce a useful result can be cancelled early (see BaseManageSubmission.terminateHopelessTasks).
+
+    def createProgressReportingLines(self, progress_dir):
+        """
+        Creates the lines of a submission script that let the job specific code report its progress. They define (and export so that child shells can use it) the shell function:
+
+            reportProgress <progress_fraction> <partial_score> <optimistic_bound>
+
+        where progress_fraction is between 0 and 1, partial_score is the score so far and optimistic_bound is the best final score the task could still possibly get. Each call replaces the task's record so calling it often only costs one small file per task. The record is written to a temporary file and moved into place so that harvestProgressRecords never reads half a record.
+
+        Programs that aren't shell scripts can write the record themselves. It is a single line of the form 'job_id array_index progress_fraction partial_score optimistic_bound' in the file given by the exported CCF_PROGRESS_FILE environment variable (which should also be written to a temporary name and moved into place).
+
+        Args:
+            progress_dir (str): The directory on the shared file system that the records are written to.
+
+        Returns:
+            list_of_lines (list of strings): The lines of shell code.
+        """
+        shell_variables_dict = self.getArrayJobShellVariables()
+        list_of_lines = ['## Let the task report its progress so that hopeless tasks can be cancelled early', 'mkdir -p ' + progress_dir, 'export CCF_PROGRESS_FILE=' + progress_dir + '/' + shell_variables_dict['job_id'] + '_' + shell_variables_dict['array_index'] + '.progress', 'reportProgress() {', '    echo "' + shell_variables_dict['job_id'] + ' ' + shell_variables_dict['array_index'] + ' $1 $2 $3" > ${CCF_PROGRESS_FILE}.tmp && mv -f ${CCF_PROGRESS_FILE}.tmp ${CCF_PROGRESS_FILE}', '}', 'export -f reportProgress' + "\n"]
+
+        return list_of_lines
+
+    def harvestProgressRecords(self, progress_dir, list_of_job_numbers = None):
+        """
+        Reads the latest progress record of every task (see createProgressReportingLines) in one connection rather than one connection per task.
+
+        Args:
+            progress_dir (str): The directory on the cluster that the records are written to.
+            list_of_job_numbers = None (list of ints): If given then only the records of these jobs are read. If None (the default) then every record in progress_dir is read.
+
+        Returns:
+            job_number_to_progress_records_dict (dict of dicts): See parseProgressRecords.
+        """
+        # find (rather than a cat of a glob) so that many records can't take the command over the argument length limit. The directory won't exist until the first record has been written.
+        if list_of_job_numbers is None:
+            harvest_cmd = "find " + progress_dir + " -maxdepth 1 -name '*.progress' -exec cat {} + 2>/dev/null || true"
+        elif len(list_of_job_numbers) == 0:
+            return {}
+        else:
+            harvest_cmd = "find " + progress_dir + " -maxdepth 1 \\( " + " -o ".join(["-name '" + str(job_number) + "_*.progress'" for job_number in list_of_job_numbers]) + " \\) -exec cat {} + 2>/dev/null || true"
+
+        output_dict = self.checkSuccess(self.sendCommand, [harvest_cmd])
+        job_number_to_progress_records_dict = self.parseProgressRecords(output_dict['stdout'])
+
+        return job_number_to_progress_records_dict
+
+    @staticmethod
+    def parseProgressRecords(stdout):
+        """
+        Reads the progress records printed by harvestProgressRecords. Lines that aren't complete records are ignored.
+
+        Args:
+            stdout (str): The records, one per line.
+
+        Returns:
+            job_number_to_progress_records_dict (dict of dicts): Keys are job numbers (ints) and values are dicts whose keys are array numbers (ints) and values are dicts with the keys 'progress_fraction', 'partial_score' and 'optimistic_bound' (floats).
+        """
+        job_number_to_progress_records_dict = {}
+        for line in stdout.split("\n"):
+            fields = line.split()
+            if len(fields) != 5:
+                continue
+
+            try:
+                job_number, array_index = int(fields[0]), int(fields[1])
+                record = {'progress_fraction': float(fields[2]), 'partial_score': float(fields[3]), 'optimistic_bound': float(fields[4])}
+            except ValueError:
+                continue
+
+            job_number_to_progress_records_dict.setdefault(job_number, {})[array_index] = record
+
+        return job_number_to_progress_records_dict
+
+    # ENVIRONMENT SNAPSHOTS - running 'module add ...' and 'source activate ...' in every array task can take tens of seconds of file system work per task. Instead the environment is activated once per cluster and the resulting environment variables are saved into a file that every task sources.
+
+    def createEnvironmentSnapshot(self, force_rebuild = False):
+        """
+        Runs the commands in self.activate_venv_list once on the cluster and saves every environment variable that they add or change (and unsets any they remove) into a file that can be sourced. The file is named after a hash of the commands so it is only rebuilt when the commands change (or force_rebuild is True) and so calling this before every submission is cheap.
+
+        IMPORTANT: The snapshot is made on the node that the SSH connection goes to (normally a login node). If the compute nodes need a different environment (e.g. a different software stack) then the snapshot shouldn't be used.
+
+        Args:
+            force_rebuild = False (bool): Rebuild the snapshot even if one already exists for these commands.
+
+        Returns:
+            environment_snapshot_path (str): The absolute path of the snapshot file on the cluster.
+        """
+        if self.activate_venv_list is None:
+            raise ValueError('There are no environment activation commands to make a snapshot of. Set self.activate_venv_list first. Here self.activate_venv_list = ', self.activate_venv_list)
+
+        environment_snapshot_path = self.base_runfiles_path + '/.environment_snapshots/' + hashlib.sha256("\n".join(self.activate_venv_list).encode('utf-8')).hexdigest()[:16] + '.sh'
+        list_of_commands = ['mkdir -p ' + os.path.dirname(environment_snapshot_path)]
+        snapshot_script = "\n".join(['bash <<\'CCF_SNAPSHOT_EOF\''] + self.createEnvironmentSnapshotScriptLines(self.activate_venv_list, environment_snapshot_path) + ['CCF_SNAPSHOT_EOF'])
+        if force_rebuild:
+            list_of_commands.append(snapshot_script)
+        else:
+            list_of_commands.append('if [ ! -s ' + environment_snapshot_path + ' ]; then\n' + snapshot_script + '\nfi')
+
+        self.checkSuccess(self.sendCommand, list_of_commands)
+        self.environment_snapshot_path = environment_snapshot_path
+
+        return environment_snapshot_path
+
+    def packEnvironment(self, environment_prefix, force_rebuild = False):
+        """
+        Packs a software environment directory (e.g. a conda environment or a virtual environment) into one tar file next to the environment snapshot so that tasks can unpack it onto node-local scratch (see getEnvironmentActivationLines) rather than loading thousands of small files from the shared file system. The first task on each node unpacks it and later tasks on the same node reuse it. createEnvironmentSnapshot must be called first.
+
+        IMPORTANT: The environment must be relocatable (e.g. made with conda-pack or 'python -m venv --copies') because it is used from a different path to the one it was created at. Paths to the environment in the snapshot are rewritten to the scratch copy.
+
+        Args:
+            environment_prefix (str): The absolute path of the environment directory on the cluster.
+            force_rebuild = False (bool): Pack the environment again even if it has already been packed.
+
+        Returns:
+            environment_pack_path (str): The absolute path of the tar file on the cluster.
+        """
+        if self.environment_snapshot_path is None:
+            raise ValueError('The environment can only be packed once there is an environment snapshot (see createEnvironmentSnapshot). Here self.environment_snapshot_path = ', self.environment_snapshot_path)
+
+        environment_prefix = environment_prefix.rstrip('/')
+        environment_pack_path = self.environment_snapshot_path[:-len('.sh')] + '_' + hashlib.sha256(environment_prefix.encode('utf-8')).hexdigest()[:8] + '.tar'
+        # write to a temporary name first so that a half written pack is never used
+        pack_cmd = 'tar -cf ' + environment_pack_path + '.partial -C ' + os.path.dirname(environment_prefix) + ' ' + os.path.basename(environment_prefix) + ' && mv ' + environment_pack_path + '.partial ' + environment_pack_path
+        if not force_rebuild:
+            pack_cmd = '[ -s ' + environment_pack_path + ' ] || { ' + pack_cmd + '; }'
+
+        self.checkSuccess(self.sendCommand, [pack_cmd])
+        self.environment_pack_path = environment_pack_path
+        self.environment_pack_prefix = environment_prefix
+
+        return environment_pack_path
+
+    def getEnvironmentActivationLines(self, scratch_dir = None):
+        """
+        Returns the lines of a submission script that set up the software environment. If there is a snapshot (see createEnvironmentSnapshot) then it is sourced, and if the environment has been packed (see packEnvironment) then it is first unpacked into the job's node-local scratch directory (once per node, the other tasks on the node wait for it, and the last task of the job on the node removes it - see createNodeScratchLines). If there is no snapshot then the commands in self.activate_venv_list are used as they are.
+
+        Args:
+            scratch_dir = None (str): The node-local directory that the job's scratch directory is made in (see createNodeScratchLines). It can use shell variables. If None then /tmp is used.
+
+        Returns:
+            list_of_lines (list of strings): The lines of shell code.
+        """
+        if self.environment_snapshot_path is None:
+            return list(self.activate_venv_list) if self.activate_venv_list is not None else []
+
+        list_of_lines = ['## Activate the software environment from its snapshot']
+        if self.environment_pack_path is None:
+            list_of_lines.append('source ' + shlex.quote(self.environment_snapshot_path))
+        else:
+            list_of_lines += self.createNodeScratchLines(scratch_dir)
+            list_of_lines += ['env_scratch_dir="${CCF_NODE_SCRATCH_DIR}"/' + shlex.quote('env_' + os.path.basename(self.environment_pack_path)[:-len('.tar')]), 'mkdir -p "${env_scratch_dir}"', '# only one task per node unpacks the environment and the others wait for it to finish', '( flock 9; if [ ! -e "${env_scratch_dir}/.unpacked" ]; then tar -xf ' + shlex.quote(self.environment_pack_path) + ' -C "${env_scratch_dir}" && touch "${env_scratch_dir}/.unpacked"; fi ) 9> "${env_scratch_dir}/.lock"', '# use the environment on the shared file system if it could not be unpacked', 'if [ -e "${env_scratch_dir}/.unpacked" ]; then', '    # the paths are replaced by bash rather than sed so that nothing in them is treated as a pattern', '    ccf_env_prefix=' + shlex.quote(self.environment_pack_prefix), '    ccf_env_copy="${env_scratch_dir}"/' + shlex.quote(os.path.basename(self.environment_pack_prefix)), '    ccf_snapshot="$(< ' + shlex.quote(self.environment_snapshot_path) + ')"', '    source <(printf \'%s\\n\' "${ccf_snapshot//"${ccf_env_prefix}"/"${ccf_env_copy}"}")', 'else', '    source ' + shlex.quote(self.environment_snapshot_path), 'fi']
+
+        return list_of_lines
+
+    def createNodeScratchLines(self, scratch_dir = None):
+        """
+        Creates the lines of a submission script that set up a node-local scratch directory that is shared by all the tasks of the job that run on the same node and is removed when the last of them exits. The directory is called ccf_<job ID> and is exported as CCF_NODE_SCRATCH_DIR. $TMPDIR isn't used by default because many queuing systems give every array task its own $TMPDIR, so the tasks on a node could never share anything in it.
+
+        Every task registers itself in the directory when it starts and the EXIT trap (the releaseNodeScratch shell function) unregisters it and removes the directory if no other task of the job on the node is still registered. Both are done under a lock on scratch_dir so that a task that starts just as the last one exits gets a new directory rather than losing its files. Scripts that set their own EXIT trap afterwards must call releaseNodeScratch from it. The lines only do anything the first time they are run in a script so it is fine for several features to add them.
+
+        Args:
+            scratch_dir = None (str): The node-local directory to make the job's directory in. It can use shell variables. If None then /tmp is used.
+
+        Returns:
+            list_of_lines (list of strings): The lines of shell code.
+        """
+        if scratch_dir is None:
+            scratch_dir = '/tmp'
+
+        shell_variables_dict = self.getArrayJobShellVariables()
+        list_of_lines = ['## Node-local scratch shared by the tasks of this job on this node (the last of them removes it)', 'if ! declare -F releaseNodeScratch > /dev/null; then', '    ccf_scratch_parent_dir="' + scratch_dir + '"', '    export CCF_NODE_SCRATCH_DIR="${ccf_scratch_parent_dir}/ccf_' + shell_variables_dict['job_id'] + '"', '    ccf_task_marker="${CCF_NODE_SCRATCH_DIR}/.tasks/' + shell_variables_dict['array_index'] + '.$$"', '    mkdir -p "${ccf_scratch_parent_dir}"', '    ( flock 9; mkdir -p "${CCF_NODE_SCRATCH_DIR}/.tasks" && touch "${ccf_task_marker}" ) 9< "${ccf_scratch_parent_dir}"', '    releaseNodeScratch() {', '        # the last task renames the directory while it holds the lock (so a task starting now makes a new one) and deletes it afterwards', '        ( flock 9; rm -f "${ccf_task_marker}"; if [ -z "$(ls -A "${CCF_NODE_SCRATCH_DIR}/.tasks" 2>/dev/null)" ]; then mv "${CCF_NODE_SCRATCH_DIR}" "${CCF_NODE_SCRATCH_DIR}.removing.$$" 2>/dev/null; fi ) 9< "${ccf_scratch_parent_dir}"', '        rm -rf "${CCF_NODE_SCRATCH_DIR}.removing.$$"', '    }', '    trap releaseNodeScratch EXIT', 'fi']
+
+        return list_of_lines
+
+    @staticmethod
+    def createEnvironmentSnapshotScriptLines(activate_venv_list, environment_snapshot_path):
+        """
+        Creates a bash script that records the environment variables, runs the activation commands and then writes every environment variable that was added or changed (as 'export NAME=value' with the value quoted for bash) and every one that was removed (as 'unset NAME') to environment_snapshot_path. Variables that are specific to one shell (e.g. PWD and SHLVL) are left out. Shell functions that were added or changed (e.g. 'module' or 'conda', which many activation commands rely on) are saved as their definitions (and exported again if they were exported). Aliases and shell options aren't saved.
+
+        Args:
+            activate_venv_list (list of strings): The commands that activate the environment.
+            environment_snapshot_path (str): Where to save the snapshot.
+
+        Returns:
+            list_of_lines (list of strings): The lines of the bash script.
+        """
+        list_of_lines = ['declare -A environment_before', 'for variable_name in $(compgen -e); do environment_before[${variable_name}]="${!variable_name}"; done', 'declare -A functions_before', 'while read -r _ function_flags function_name; do functions_before[${function_name}]="$(declare -f "${function_name}")"; done < <(declare -F)']
+        list_of_lines += activate_venv_list
+        list_of_lines += ['{', '    echo "# environment snapshot created on $(date) from:"'] + ['    echo ' + shlex.quote('#   ' + command) for command in activate_venv_list]
+        list_of_lines += ['    for variable_name in $(compgen -e); do', '        case ${variable_name} in PWD|OLDPWD|SHLVL|_|SSH_*|TERM|HOSTNAME) continue ;; esac', '        if [ "${environment_before[${variable_name}]+set}" != "set" ] || [ "${environment_before[${variable_name}]}" != "${!variable_name}" ]; then printf \'export %s=%q\\n\' "${variable_name}" "${!variable_name}"; fi', '    done', '    for variable_name in "${!environment_before[@]}"; do', '        if [ -z "${!variable_name+set}" ]; then echo "unset ${variable_name}"; fi', '    done', '    while read -r _ function_flags function_name; do', '        function_definition="$(declare -f "${function_name}")"', '        if [ "${functions_before[${function_name}]+set}" != "set" ] || [ "${functions_before[${function_name}]}" != "${function_definition}" ]; then', '            echo "${function_definition}"', '            if [ "${function_flags}" = "-fx" ]; then echo "export -f ${function_name}"; fi', '        fi', '    done < <(declare -F)', '} > ' + environment_snapshot_path + '.partial && mv ' + environment_snapshot_path + '.partial ' + environment_snapshot_path]
+
+        return list_of_lines
+
+    # PILOT JOBS - rather than every child paying the full queuing overhead as an element of a job array, a few long lived pilot jobs pull the children from a work queue on the shared file system until it is empty or they are about to run out of walltime.
+
+    def enqueuePilotTasks(self, queue_dir, task_id_to_list_of_commands_dict):
+        """
+        Adds tasks to a pilot work queue on the cluster (creating the queue if it doesn't exist). The work queue is a directory with the sub-directories 'pending', 'running', 'done', 'failed' and 'logs'. Each task is a small shell script in 'pending' and a worker claims a task by renaming it into 'running' (a rename is atomic so two workers can never claim the same task and no locks are needed). All the tasks are sent as one tar stream so adding tens of thousands of tasks only needs one connection.
+
+        Args:
+            queue_dir (str): The absolute path of the work queue on the cluster (this must be on a file system that all the compute nodes can see).
+            task_id_to_list_of_commands_dict (dict): Keys are task IDs (can only contain letters, numbers, '_' and '-') and values are lists of the shell commands (one per line) that the task runs.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        # the tar is unpacked in the directory above the queue so that the queue itself can be created by it
+        queue_parent_dir, queue_name = posixpath.split(queue_dir.rstrip('/'))
+        # pilots that are already running read pilot_worker.sh as they go so it mustn't be written over. The new copy is unpacked under a temporary name and renamed over the old one (a rename is atomic and running pilots keep reading the old file).
+        temp_worker_name = 'pilot_worker.sh.' + secrets.token_hex(6)
+        tar_buffer = io.BytesIO()
+        now = time.time()
+        with tarfile.open(fileobj = tar_buffer, mode = 'w') as tar:
+            for sub_dir in ('', '/pending', '/running', '/done', '/failed', '/logs'):
+                tar_info = tarfile.TarInfo(name = queue_name + sub_dir)
+                tar_info.type = tarfile.DIRTYPE
+                tar_info.mode = 0o700
+                tar_info.mtime = now
+                tar.addfile(tar_info)
+
+            list_of_files = [(temp_worker_name, BaseCluster.createPilotWorkerScriptLines(), 0o700)]
+            for task_id, list_of_commands in task_id_to_list_of_commands_dict.items():
+                if re.fullmatch(r'[A-Za-z0-9_-]+', str(task_id)) is None:
+                    raise ValueError('Task IDs are used as file names by the pilot work queue and so can only contain letters, numbers, \'_\' and \'-\'. Here task_id = ', task_id)
+                list_of_files.append(('pending/' + str(task_id), ['#!/bin/bash'] + list_of_commands, 0o600))
+
+            for file_name, list_of_lines, permissions in list_of_files:
+                contents = ("\n".join(list_of_lines) + "\n").encode('utf-8')
+                tar_info = tarfile.TarInfo(name = queue_name + '/' + file_name)
+                tar_info.size = len(contents)
+                tar_info.mode = permissions
+                tar_info.mtime = now
+                tar.addfile(tar_info, io.BytesIO(contents))
+
+        self.checkSuccess(self.streamTarToRemote, tar_buffer.getvalue(), queue_parent_dir)
+        output_dict = self.checkSuccess(self.sendCommand, ['mv -f ' + queue_dir.rstrip('/') + '/' + temp_worker_name + ' ' + queue_dir.rstrip('/') + '/pilot_worker.sh'])
+
+        return output_dict
+
+    def submitPilots(self, queue_dir, no_of_pilots, no_of_nodes, no_of_cores, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, pilot_name = 'pilot', margin_seconds = 300, max_timeouts = 3):
+        """
+        Submits pilot jobs (as one job array) that run the tasks in a work queue (see enqueuePilotTasks). Each pilot starts a worker on every node it is given and each worker runs one task per core. The workers keep pulling tasks until the queue is empty or there are only margin_seconds of walltime left. A task that is still running when the walltime is about to run out is stopped and put back in the queue so that another pilot can run it, unless it has already been stopped max_timeouts times (then it is moved to failed as it probably never fits in a pilot).
+
+        Args:
+            queue_dir (str): The absolute path of the work queue on the cluster.
+            no_of_pilots (int): The number of pilot jobs to submit.
+            no_of_nodes (int): The number of nodes each pilot requests.
+            no_of_cores (int): The number of cores (per node) each pilot requests. This is also the number of tasks run at once on each node.
+            walltime (str): The walltime of each pilot. Has the form 'HH:MM:SS'.
+            queue_name (str): The queue (or partition) to submit the pilots to.
+            outfile_name_and_path (str): Absolute path and file name of where the pilots' outfiles are stored.
+            errorfile_name_and_path (str): Absolute path and file name of where the pilots' errorfiles are stored.
+            pilot_name = 'pilot' (str): The job name of the pilots.
+            margin_seconds = 300 (int): No new tasks are started once there is less than this much walltime left.
+            max_timeouts = 3 (int): The number of times a task can be stopped by the end of the walltime before it is moved to failed rather than being put back in the queue.
+
+        Returns:
+            job_number (int): The job number of the pilot job array.
+        """
+        pilot_script_list = self.createSubmissionScriptTemplate(pilot_name, no_of_nodes, no_of_cores, '1-' + str(no_of_pilots), walltime, queue_name, outfile_name_and_path, errorfile_name_and_path)
+        pilot_script_list += ['queue_dir=' + queue_dir, '# stop starting new tasks ' + str(margin_seconds) + ' seconds before the walltime runs out', 'end_time=$(( $(date +%s) + ' + str(int(BaseCluster.walltimeToSeconds(walltime)) - margin_seconds) + ' ))', self.getPilotLaunchCommand('/bin/bash ${queue_dir}/pilot_worker.sh ${queue_dir} ${end_time} ' + str(no_of_cores) + ' ' + str(max_timeouts))]
+        contents = ("\n".join(pilot_script_list) + "\n").encode('utf-8')
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj = tar_buffer, mode = 'w') as tar:
+            tar_info = tarfile.TarInfo(name = pilot_name + '.sh')
+            tar_info.size = len(contents)
+            tar_info.mode = 0o700
+            tar_info.mtime = time.time()
+            tar.addfile(tar_info, io.BytesIO(contents))
+
+        self.checkSuccess(self.streamTarToRemote, tar_buffer.getvalue(), queue_dir)
+        submission_token = self.createSubmissionToken()
+        submit_job_ouput_dict = self.submitJob(self.createSubmitCommand(queue_dir.rstrip('/') + '/' + pilot_name + '.sh', submission_token = submission_token), submission_token)
+        job_number = self.getJobIdFromSubStdOut(submit_job_ouput_dict['stdout'])
+
+        return job_number
+
+    def getPilotTaskStates(self, queue_dir):
+        """
+        Returns the state of every task in a pilot work queue (see enqueuePilotTasks) with one connection.
+
+        Args:
+            queue_dir (str): The absolute path of the work queue on the cluster.
+
+        Returns:
+            task_id_to_state_dict (dict): Keys are task IDs and values are 'pending', 'running', 'done' or 'failed'.
+        """
+        list_of_commands = ['for state in pending running done failed; do find ' + queue_dir + '/${state} -maxdepth 1 -type f -printf "${state} %f\\n"; done']
+        output_dict = self.checkSuccess(self.sendCommand, list_of_commands)
+        task_id_to_state_dict = {}
+        for line in output_dict['stdout'].strip().split("\n"):
+            if ' ' in line:
+                state, file_name = line.strip().split(' ', 1)
+                # running tasks have the host, process and worker that claimed them after the task ID
+                task_id_to_state_dict[file_name.split('.')[0]] = state
+
+        return task_id_to_state_dict
+
+    def requeueRunningPilotTasks(self, queue_dir):
+        """
+        Moves every task that is marked as running back into the pending queue. This is for when pilots have died without finishing their tasks (e.g. a node crashed) and so must only be used when no pilots are running.
+
+        Args:
+            queue_dir (str): The absolute path of the work queue on the cluster.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        requeue_cmd = 'for claimed_task in ' + queue_dir + '/running/*; do [ -e "${claimed_task}" ] || continue; task_file=$(basename "${claimed_task}"); mv "${claimed_task}" ' + queue_dir + '/pending/${task_file%%.*}; done'
+        output_dict = self.checkSuccess(self.sendCommand, [requeue_cmd])
+
+        return output_dict
+
+    @staticmethod
+    def createPilotWorkerScriptLines():
+        """
+        Creates the script that a pilot runs on each of its nodes. It is called as 'pilot_worker.sh queue_dir end_time no_of_workers' and starts no_of_workers workers, each of which repeatedly claims a task from queue_dir/pending (by renaming it into queue_dir/running), runs it and moves it to queue_dir/done or queue_dir/failed (the exit code is saved in queue_dir/logs/task_id.exit_code). Workers pick randomly from the first few pending tasks so that they don't all try to claim the same one. No task is started after end_time (seconds since the epoch) and tasks still running at end_time are stopped and put back in the queue.
+
+        Returns:
+            list_of_lines (list of strings): The lines of the worker script.
+        """
+        list_of_lines = ['#!/bin/bash', '# pilot worker - usage: pilot_worker.sh queue_dir end_time no_of_workers [max_timeouts]', 'queue_dir=$1', 'end_time=$2', 'no_of_workers=$3', 'max_timeouts=${4:-3}', '', 'run_worker() {', '    while true; do', '        time_left=$(( end_time - $(date +%s) ))', '        if [ "${time_left}" -le 0 ]; then break; fi', '        task_id=$(find "${queue_dir}/pending" -maxdepth 1 -type f -printf \'%f\\n\' 2>/dev/null | head -n 64 | shuf -n 1)', '        if [ -z "${task_id}" ]; then break; fi', '        claimed_task="${queue_dir}/running/${task_id}.$(hostname).$$.$1"', '        # mv is atomic so if another worker got there first this fails and we try again', '        mv "${queue_dir}/pending/${task_id}" "${claimed_task}" 2>/dev/null || continue', '        timeout "${time_left}" /bin/bash "${claimed_task}" > "${queue_dir}/logs/${task_id}.log" 2>&1', '        exit_code=$?', '        if [ "${exit_code}" -eq 0 ]; then', '            mv "${claimed_task}" "${queue_dir}/done/${task_id}"', '        elif [ "${exit_code}" -eq 124 ]; then', '            # ran out of walltime so give it back for another pilot to run unless that has already happened max_timeouts times', '            no_of_timeouts=$(( $(cat "${queue_dir}/logs/${task_id}.timeouts" 2>/dev/null || echo 0) + 1 ))', '            echo "${no_of_timeouts}" > "${queue_dir}/logs/${task_id}.timeouts"', '            if [ "${no_of_timeouts}" -ge "${max_timeouts}" ]; then', '                echo "${exit_code}" > "${queue_dir}/logs/${task_id}.exit_code"', '                mv "${claimed_task}" "${queue_dir}/failed/${task_id}"', '            else', '                mv "${claimed_task}" "${queue_dir}/pending/${task_id}"', '            fi', '        else', '            echo "${exit_code}" > "${queue_dir}/logs/${task_id}.exit_code"', '            mv "${claimed_task}" "${queue_dir}/failed/${task_id}"', '        fi', '    done', '}', '', 'for worker_no in $(seq 1 "${no_of_workers}"); do', '    run_worker "${worker_no}" &', 'done', 'wait']
+
+        return list_of_lines
+
+    def submitJob(self, submit_command, submission_token = None):
+        """
+        Sends a submit command to the cluster and makes sure that it is only submitted once. If the connection drops after the queuing system accepted the job but before the job ID came back then simply sending the command again would submit a second copy of the job. Instead, if submission_token is given (and is part of submit_command - see createSubmitCommand), then before every retry the queue and the recently finished jobs are searched for a job with that token (see createFindTokenCommand) and if there is one its job ID is returned rather than submitting again.
+
+        Args:
+            submit_command (str): The command that submits the job.
+            submission_token = None (str): The token attached to the job (see createSubmissionToken). If None then the command is retried like any other command (see checkSuccess).
+
+        Returns:
+            submit_job_ouput_dict (dict): The connection output dict of the submit command. If an earlier attempt turned out to have worked then the stdout is the job ID that was found in the queue.
+        """
+        # without a way of finding the token in the queue the command is retried like any other command
+        if submission_token is None or self.getSubmissionTokenFlag(submission_token) is None:
+            return self.checkSuccess(self.sendCommand, [submit_command])
+
+        self.submission_token_attempts[submission_token] = 0
+        submit_job_ouput_dict = self.checkSuccess(self.attemptTokenSubmission, submit_command, submission_token)
+        del self.submission_token_attempts[submission_token]
+
+        return submit_job_ouput_dict
+
+    def attemptTokenSubmission(self, submit_command, submission_token):
+        """
+        One attempt at submitting a job with a submission token (see submitJob). This is passed to checkSuccess which calls it again if it fails. Every attempt after the first one starts by looking for a job with the token (see createFindTokenCommand).
+
+        Args:
+            submit_command (str): The command that submits the job.
+            submission_token (str): The token attached to the job.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        if self.submission_token_attempts[submission_token] > 0:
+            find_output_dict = self.sendCommand([self.createFindTokenCommand(submission_token)])
+            if find_output_dict['return_code'] != 0:
+                # the queue couldn't be checked so it isn't safe to submit again yet
+                return find_output_dict
+
+            list_of_job_ids = [line.strip() for line in find_output_dict['stdout'].split("\n") if line.strip().isdigit()]
+            if len(list_of_job_ids) > 0:
+                print('A job with submission token ' + submission_token + ' has already been submitted so it was not submitted again.')
+                return {'return_code': 0, 'stdout': list_of_job_ids[0], 'stderr': ''}
+
+        self.submission_token_attempts[submission_token] += 1
+        output_dict = self.sendCommand([submit_command])
+
+        return output_dict
+
+    @staticmethod
+    def createSubmissionToken():
+        """
+        Creates a random token to attach to a submission (see submitJob). It is short enough to be a PBS job name (which can be cut to 15 characters) and starts with a letter as PBS job names must.
+
+        Returns:
+            submission_token (str): e.g. 'ccf1a2b3c4d5e6'.
+        """
+        return 'ccf' + secrets.token_hex(6)
+
+    def governSubmission(self, submit_command, no_of_tasks, submission_token = None):
+        """
+        Adds a submission to the local queue of the submission governor rather than sending it straight to the cluster. Queuing systems limit how many tasks a user can have in the queue and when that limit is hit the submit command fails (which checkSuccess mistakes for a connection problem). The governor holds submissions locally and releaseGovernedSubmissions sends them as space becomes free, so the queue is kept full without ever going over the limit.
+
+        The governor is first in first out. BaseJobSubmission submits one job at a time and waits until it has been released (see submitThroughGovernor) so there is normally only one submission held at once and there is nothing to reorder.
+
+        Args:
+            submit_command (str): The command that submits the job (see createSubmitCommand).
+            no_of_tasks (int): The number of tasks the job adds to the queue (e.g. the number of array tasks).
+            submission_token = None (str): The token attached to the job so that it is only submitted once (see submitJob).
+
+        Returns:
+            ticket (int): Identifies the submission in self.released_submissions once it has been released.
+        """
+        self.learnMaxQueuedTasks()
+        if self.max_queued_tasks is not None and no_of_tasks > self.max_queued_tasks:
+            raise ValueError('This submission has more tasks than are allowed in the queue at once and so could never be submitted. Split it into smaller submissions. Here no_of_tasks = ', no_of_tasks, ' and self.max_queued_tasks = ', self.max_queued_tasks)
+
+        ticket = self.governed_submission_count
+        self.governed_submission_count += 1
+        self.governed_submissions.append((ticket, submit_command, no_of_tasks, submission_token))
+
+        return ticket
+
+    def releaseGovernedSubmissions(self):
+        """
+        Sends as many of the submissions held by the governor (see governSubmission) as will fit in the queue right now. Submissions are released strictly in the order they were added so a large submission at the front is not overtaken by smaller ones behind it (otherwise it might never get in).
+
+        Returns:
+            list_of_released_tickets (list of ints): The tickets of the submissions that were sent. The output dict of each submit command is in self.released_submissions.
+        """
+        list_of_released_tickets = []
+        if len(self.governed_submissions) == 0:
+            return list_of_released_tickets
+
+        self.learnMaxQueuedTasks()
+        free_space_in_queue = float('inf') if self.max_queued_tasks is None else self.max_queued_tasks - self.countTasksInQueue()
+        while len(self.governed_submissions) > 0 and self.governed_submissions[0][2] <= free_space_in_queue:
+            ticket, submit_command, no_of_tasks, submission_token = self.governed_submissions.popleft()
+            self.released_submissions[ticket] = self.submitJob(submit_command, submission_token)
+            free_space_in_queue -= no_of_tasks
+            list_of_released_tickets.append(ticket)
+
+        return list_of_released_tickets
+
+    def submitThroughGovernor(self, submit_command, no_of_tasks, poll_interval = 60, submission_token = None):
+        """
+        Adds a submission to the governor (see governSubmission) and blocks until it has been released.
+
+        Args:
+            submit_command (str): The command that submits the job (see createSubmitCommand).
+            no_of_tasks (int): The number of tasks the job adds to the queue.
+            poll_interval = 60 (int): The number of seconds between checking the queue for space.
+            submission_token = None (str): See governSubmission.
+
+        Returns:
+            submit_job_ouput_dict (dict): The connection output dict of the submit command.
+        """
+        ticket = self.governSubmission(submit_command, no_of_tasks, submission_token)
+        while True:
+            self.releaseGovernedSubmissions()
+            if ticket in self.released_submissions:
+                return self.released_submissions.pop(ticket)
+
+            print('The queue is full so waiting ' + str(poll_interval) + ' seconds before trying to submit again.')
+            time.sleep(poll_interval)
+
+    def learnMaxQueuedTasks(self):
+        """
+        Sets self.max_queued_tasks from the queuing system (see getMaxQueuedTasks) if it hasn't been set already. The queuing system is only asked once.
+        """
+        if self.max_queued_tasks is None and not self.max_queued_tasks_learnt:
+            self.max_queued_tasks = self.getMaxQueuedTasks()
+            self.max_queued_tasks_learnt = True
+
+        return
+
+    def chooseQueue(self, no_of_tasks, list_of_resource_shapes, queue_limits_dict):
+        """
+        Works out which queue (or partition) and resource shape is expected to finish a job array soonest. The queues are only those in queue_limits_dict and a resource shape is only used on a queue if it is within that queue's limits. The live availability of the queues is found with getQueueAvailability and the time to completion of each combination is estimated with estimateTimeToCompletion.
+
+        A resource shape is a number of cores per task and a walltime, e.g. a model might take 4 hours on 1 core or 1 hour on 4 cores and depending on what is free either might finish first.
+
+        Args:
+            no_of_tasks (int): The number of tasks in the job array.
+            list_of_resource_shapes (list of dicts): Each dict has the keys 'no_of_cores' (int - the cores per task) and 'walltime' (str of the form 'HH:MM:SS').
+            queue_limits_dict (dict of dicts): The keys are the names of the queues to choose from and the values are dicts that can have the keys 'max_cores_per_task' (int), 'max_walltime' (str of the form 'HH:MM:SS'), 'max_running_tasks' (int - the most tasks of ours the queue lets run at once), 'seconds_per_pending_job' (number - a guess of how long each job already waiting in the queue delays ours, default 60) and 'slurm_account_name' (str - the account to use with this partition). All keys are optional.
+
+        Returns:
+            choice_dict (dict or None): Has the keys 'queue_name', 'slurm_account_name' (None if not given for that queue), 'no_of_cores', 'walltime', 'max_concurrent_tasks' (can be used as the array throttle, e.g. '1-100%max_concurrent_tasks'), 'start_delay_seconds' and 'time_to_completion_seconds'. Is None if no combination is within the limits.
+        """
+        if no_of_tasks < 1:
+            raise ValueError('no_of_tasks must be at least 1. Here no_of_tasks = ', no_of_tasks)
+
+        queue_name_to_availability_dict = self.getQueueAvailability(list(queue_limits_dict.keys()))
+        choice_dict = None
+        for queue_name, limits_dict in queue_limits_dict.items():
+            if queue_name not in queue_name_to_availability_dict:
+                continue
+
+            availability_dict = queue_name_to_availability_dict[queue_name]
+            max_walltime_seconds = min(BaseCluster.walltimeToSeconds(limits_dict['max_walltime']) if 'max_walltime' in limits_dict else float('inf'), availability_dict['max_walltime_seconds'])
+            for shape in list_of_resource_shapes:
+                walltime_seconds = BaseCluster.walltimeToSeconds(shape['walltime'])
+                if walltime_seconds > max_walltime_seconds or shape['no_of_cores'] > limits_dict.get('max_cores_per_task', float('inf')):
+                    continue
+
+                start_delay_seconds, max_concurrent_tasks, time_to_completion_seconds = BaseCluster.estimateTimeToCompletion(availability_dict, no_of_tasks, shape['no_of_cores'], walltime_seconds, limits_dict.get('max_running_tasks', no_of_tasks), limits_dict.get('seconds_per_pending_job', 60))
+                if choice_dict is None or time_to_completion_seconds < choice_dict['time_to_completion_seconds']:
+                    choice_dict = {'queue_name': queue_name, 'slurm_account_name': limits_dict.get('slurm_account_name'), 'no_of_cores': shape['no_of_cores'], 'walltime': shape['walltime'], 'max_concurrent_tasks': max_concurrent_tasks, 'start_delay_seconds': start_delay_seconds, 'time_to_completion_seconds': time_to_completion_seconds}
+
+        return choice_dict
+
+    @staticmethod
+    def estimateTimeToCompletion(availability_dict, no_of_tasks, no_of_cores_per_task, walltime_seconds, max_running_tasks, seconds_per_pending_job = 60):
+        """
+        Makes a rough estimate of how long a job array will take to finish on a queue. Tasks that fit into a gap that is free right now (see getQueueAvailability) start straight away and the rest run in waves as our own tasks finish. If nothing fits then the job has to wait for the jobs already queued, each of which is guessed to delay it by seconds_per_pending_job. The estimate uses the walltime and so it is pessimistic when tasks finish early, but it is equally pessimistic for every queue so it is still useful for comparing them.
+
+        Args:
+            availability_dict (dict): The availability of one queue (see getQueueAvailability).
+            no_of_tasks (int): The number of tasks in the job array.
+            no_of_cores_per_task (int): The cores requested by each task.
+            walltime_seconds (number): The walltime requested by each task.
+            max_running_tasks (int): The most tasks that the queue lets run at once.
+            seconds_per_pending_job = 60 (number): How long each job already waiting in the queue is guessed to delay ours.
+
+        Returns:
+            start_delay_seconds (float): How long before the first task is expected to start.
+            max_concurrent_tasks (int): How many tasks are expected to run at once.
+            time_to_completion_seconds (float): How long before the last task is expected to finish.
+        """
+        # only gaps that last at least as long as the walltime are any use
+        free_cores = max([no_of_cores for no_of_cores, duration_seconds in availability_dict['backfill_windows'] if duration_seconds >= walltime_seconds] + [0])
+        max_concurrent_tasks = min(no_of_tasks, max_running_tasks, free_cores // no_of_cores_per_task)
+        if max_concurrent_tasks > 0:
+            start_delay_seconds = 0.0
+        else:
+            start_delay_seconds = float(availability_dict['pending_jobs'] * seconds_per_pending_job)
+            max_concurrent_tasks = max(1, min(no_of_tasks, max_running_tasks))
+
+        time_to_completion_seconds = start_delay_seconds + math.ceil(no_of_tasks / max_concurrent_tasks) * walltime_seconds
+
+        return start_delay_seconds, max_concurrent_tasks, time_to_completion_seconds
+
+    def collectJobAccounting(self, job_number, job_class, history_db_path = None):
+        """
+        Pulls the actual resources used by every finished task of a job array from the queuing system (see getArrayTaskAccounting) and saves them into a local history database so that recommendResources can base future resource requests on them. Tasks that are already in the database are updated rather than duplicated so it is safe to call this more than once for the same job.
+
+        Args:
+            job_number (int): The job number of the job array.
+            job_class (str): A name for the kind of job (e.g. 'whole_cell_model_knockout'). Recommendations are made per job class so jobs that do very different things should have different job classes.
+            history_db_path = None (str): The path and file name of the SQLite database on the local computer. If None (the default) then self.resource_history_db_path is used.
+
+        Returns:
+            list_of_records (list of dicts): The records that were saved (see getArrayTaskAccounting).
+        """
+        if history_db_path is None:
+            history_db_path = self.resource_history_db_path
+        if history_db_path is None:
+            raise ValueError('There is nowhere to save the accounting information. Either pass history_db_path or set self.resource_history_db_path. Here history_db_path = ', history_db_path)
+
+        list_of_records = self.getArrayTaskAccounting(job_number)
+        db_conn = BaseCluster.openResourceHistory(history_db_path)
+        db_conn.executemany('INSERT OR REPLACE INTO accounting (cluster, job_class, job_number, array_index, runtime_seconds, cpu_time_seconds, peak_memory_KB, state, time_recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [(self.ssh_config_alias, job_class, int(job_number), record['array_index'], record['runtime_seconds'], record['cpu_time_seconds'], record['peak_memory_KB'], record['state'], time.time()) for record in list_of_records])
+        db_conn.commit()
+        db_conn.close()
+
+        return list_of_records
+
+    def recommendResources(self, job_class, quantile = 0.95, safety_factor = 1.5, min_samples = 10, history_db_path = None):
+        """
+        Proposes a walltime, number of cores and amount of memory for a job class based on how previous tasks of that class actually ran on this cluster. Oversized walltimes stop jobs fitting into backfill windows and so can add hours of queue time. Instead the walltime is set to the given quantile of the previous runtimes multiplied by a safety factor (and rounded up to the next minute). The number of cores is the quantile of the CPU time divided by the runtime (i.e. how many cores the tasks really kept busy) rounded up, and the memory is the quantile of the peak memory multiplied by the safety factor.
+
+        Only tasks that completed successfully are used because a task that was killed for running out of walltime or memory doesn't say how much it needed.
+
+        Args:
+            job_class (str): The job class given to collectJobAccounting.
+            quantile = 0.95 (float): The quantile (between 0 and 1) of the previous tasks to base the recommendation on.
+            safety_factor = 1.5 (float): The quantile is multiplied by this to allow for tasks that take longer than any seen so far.
+            min_samples = 10 (int): If fewer than this many tasks have been recorded then there isn't enough information and None is returned.
+            history_db_path = None (str): The path and file name of the SQLite database on the local computer. If None (the default) then self.resource_history_db_path is used.
+
+        Returns:
+            recommendation_dict (dict or None): Has keys 'walltime' (str of the form 'HH:MM:SS'), 'walltime_seconds' (int), 'no_of_cores' (int), 'memory_KB' (int) and 'no_of_samples' (int). Is None if there are fewer than min_samples completed tasks.
+        """
+        if not 0 < quantile <= 1:
+            raise ValueError('quantile must be greater than 0 and less than or equal to 1. Here quantile = ', quantile)
+
+        if history_db_path is None:
+            history_db_path = self.resource_history_db_path
+        if history_db_path is None or not os.path.isfile(history_db_path):
+            return None
+
+        db_conn = BaseCluster.openResourceHistory(history_db_path)
+        list_of_rows = db_conn.execute('SELECT runtime_seconds, cpu_time_seconds, peak_memory_KB FROM accounting WHERE cluster = ? AND job_class = ? AND state = \'COMPLETED\'', (self.ssh_config_alias, job_class)).fetchall()
+        db_conn.close()
+        if len(list_of_rows) < min_samples or len(list_of_rows) == 0:
+            return None
+
+        runtime_seconds = BaseCluster.getQuantile([row[0] for row in list_of_rows], quantile)
+        # round up to the next whole minute and never ask for less than a minute
+        walltime_seconds = max(60, 60 * math.ceil(runtime_seconds * safety_factor / 60))
+        list_of_busy_cores = [row[1] / row[0] for row in list_of_rows if row[0] > 0]
+        no_of_cores = max(1, math.ceil(BaseCluster.getQuantile(list_of_busy_cores, quantile))) if len(list_of_busy_cores) > 0 else 1
+        memory_KB = math.ceil(BaseCluster.getQuantile([row[2] for row in list_of_rows], quantile) * safety_factor)
+
+        recommendation_dict = {'walltime': BaseCluster.secondsToWalltime(walltime_seconds), 'walltime_seconds': walltime_seconds, 'no_of_cores': no_of_cores, 'memory_KB': memory_KB, 'no_of_samples': len(list_of_rows)}
+
+        return recommendation_dict
+
+    def applyResourceRecommendation(self, job_class, no_of_cores, walltime):
+        """
+        Used by createStandardSubmissionScriptList to swap the requested walltime and number of cores for the ones suggested by recommendResources. The walltime is replaced whether it is bigger or smaller (asking for too little is as bad as asking for too much) but the number of cores is never increased because tasks can't use more cores than they were given and so the history can't show that they needed more. If there is no history database or not enough history for the job class then the resources are returned unchanged.
+
+        Args:
+            job_class (str or None): The job class given to collectJobAccounting. If None then the resources are returned unchanged.
+            no_of_cores (int): The number of cores the user asked for.
+            walltime (str): The walltime the user asked for. Has the form 'HH:MM:SS'.
+
+        Returns:
+            no_of_cores (int): The number of cores to request.
+            walltime (str): The walltime to request. Has the form 'HH:MM:SS'.
+        """
+        if job_class is None or self.resource_history_db_path is None:
+            return no_of_cores, walltime
+
+        recommendation_dict = self.recommendResources(job_class)
+        if recommendation_dict is None:
+            return no_of_cores, walltime
+
+        return min(int(no_of_cores), recommendation_dict['no_of_cores']), recommendation_dict['walltime']
+
+    @staticmethod
+    def openResourceHistory(history_db_path):
+        """
+        Opens (and creates if neccessary) a local database of the resources used by array tasks.
+
+        Args:
+            history_db_path (str): The path and file name of the SQLite database on the local computer.
+
+        Returns:
+            db_conn (sqlite3.Connection): The open database.
+        """
+        db_conn = sqlite3.connect(history_db_path)
+        db_conn.execute('CREATE TABLE IF NOT EXISTS accounting (cluster TEXT, job_class TEXT, job_number INTEGER, array_index INTEGER, runtime_seconds REAL, cpu_time_seconds REAL, peak_memory_KB REAL, state TEXT, time_recorded REAL, PRIMARY KEY (cluster, job_number, array_index))')
+        db_conn.execute('CREATE INDEX IF NOT EXISTS accounting_job_class_idx ON accounting (cluster, job_class)')
+
+        return db_conn
+
+    @staticmethod
+    def getQuantile(list_of_values, quantile):
+        """
+        Returns the quantile of a list of numbers using the nearest rank method (i.e. the smallest value that at least that fraction of the values are less than or equal to).
+
+        Args:
+            list_of_values (list of numbers): Must not be empty.
+            quantile (float): Between 0 and 1.
+
+        Returns:
+            value (number): One of the values in list_of_values.
+        """
+        sorted_values = sorted(list_of_values)
+        idx = min(len(sorted_values) - 1, max(0, math.ceil(quantile * len(sorted_values)) - 1))
+
+        return sorted_values[idx]
+
+    @staticmethod
+    def walltimeToSeconds(walltime):
+        """
+        Converts a walltime of the form 'HH:MM:SS', 'MM:SS' or 'D-HH:MM:SS' (SLURM) into seconds. Fractions of a second (e.g. '01:02.345') are allowed.
+
+        Args:
+            walltime (str): The walltime.
+
+        Returns:
+            seconds (float): The walltime in seconds.
+        """
+        walltime = walltime.strip()
+        days = 0
+        if '-' in walltime:
+            days, walltime = walltime.split('-', 1)
+            days = int(days)
+
+        seconds = 0.0
+        for part in walltime.split(':'):
+            seconds = 60 * seconds + float(part)
+
+        return seconds + 86400 * days
+
+    @staticmethod
+    def secondsToWalltime(seconds):
+        """
+        Converts a number of seconds into a walltime of the form 'HH:MM:SS' (fractions of a second are rounded up). Hours can be more than 24.
+
+        Args:
+            seconds (number): The number of seconds.
+
+        Returns:
+            walltime (str): The walltime.
+        """
+        seconds = int(math.ceil(seconds))
+        walltime = '%02d:%02d:%02d' % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+        return walltime
+
+    @staticmethod
+    def memoryToKB(memory):
+        """
+        Converts a memory amount as printed by queuing systems (e.g. '10240K', '1.5G', '204800kb' or '512mb') into KB. A number without units is assumed to be bytes.
+
+        Args:
+            memory (str): The amount of memory.
+
+        Returns:
+            memory_KB (float): The amount of memory in KB.
+        """
+        match = re.fullmatch(r'([0-9.]+)\s*([kmgtp]?)b?', memory.strip().lower())
+        if match is None:
+            raise ValueError('Could not understand the amount of memory. Here memory = ', memory)
+
+        unit_to_KB = {'': 1 / 1024, 'k': 1, 'm': 1024, 'g': 1024**2, 't': 1024**3, 'p': 1024**4}
+        memory_KB = float(match.group(1)) * unit_to_KB[match.group(2)]
+
+        return memory_KB
+
+    @staticmethod
+    def getArrayIndicesFromQueueStdOut(stdout):
+        """
+        checkQueue and checkPendingArrayTasks return the array numbers as one number per line of stdout. This converts that into a sorted list of ints (any lines that aren't a number are ignored).
+
+        Args:
+            stdout (str): The stdout from checkQueue or checkPendingArrayTasks.
+
+        Returns:
+            list_of_array_indices (list of ints): The array numbers in ascending order.
+        """
+        list_of_array_indices = sorted(set([int(line.strip()) for line in stdout.split("\n") if line.strip().isdigit()]))
+
+        return list_of_array_indices
+
+    @staticmethod
+    def getStageJobIdsFromChainStdOut(stdout):
+        """
+        Reads the stdout created by the commands from createDependencyChainCommands and returns the job ID of each stage.
+
+        Args:
+            stdout (str): The stdout after sending the dependency chain commands.
+
+        Returns:
+            stage_name_to_job_id_dict (dict): Keys are the stage names and values are the job IDs (int).
+        """
+        stage_name_to_job_id_dict = {}
+        for line in stdout.strip().split("\n"):
+            match = re.fullmatch(r'([A-Za-z_][A-Za-z0-9_]*)=(\d+)', line.strip())
+            if match is not None:
+                stage_name_to_job_id_dict[match.group(1)] = int(match.group(2))
+
+        return stage_name_to_job_id_dict
+
+    def createStandardSubmissionScript(self, file_name_and_path, pbs_script_list, file_permissions = "700"):
+        """
+        Creates a submission script with appropriate file permissions.
+
+        Args:
+            file_name_and_path (str): The file name (try to use absolute file paths to be safe).
+            pbs_script_list (list of strings): A list of strings where each string is a line of the submission script.
+            file_permisions = "700" (str): The desired file permissions for the submission script (can be numbers or symbols e.g. "700" or "u+x" etc). Submission scripts need to be executable and so the default setting is "700" which is read, write and execute for the user and nothing for anyone else.
+        """
+        # write the code to a file
+        Connection.createLocalFile(file_name_and_path, pbs_script_list, file_permissions)
+
+        return
+
+    def stageFilesByContent(self, file_source_to_file_dest_dict):
+        """
+        Transfers files to the cluster but only sends content that the cluster has never seen before. Every local file is hashed and stored once on the cluster in a content addressed object store (self.object_store_path) and each destination is then created as a hardlink to the stored object (or a symlink if a hardlink isn't possible, e.g. the destination is on a different file system). This means that shared model inputs, common scripts and settings templates that are the same every generation are only sent once.
+
+        The file permissions are part of the name of the stored object so two files with the same contents but different permissions are stored separately. IMPORTANT: because the destinations are links to the stored objects the jobs must not modify the staged files in place.
+
+        Args:
+            file_source_to_file_dest_dict (dict): Keys are local files and values are the directories on the cluster that they need to be put in (i.e. the same as BaseJobSubmission.file_source_to_file_dest_dict). Keys that are directories rather than files are sent with transferFile as normal.
+
+        Returns:
+            list_of_output_dicts (list of dicts): The output dicts of all the connections made (each has the key 'return_code').
+        """
+        list_of_output_dicts = []
+        source_to_object_name_dict = {}
+        for file_source in file_source_to_file_dest_dict.keys():
+            if os.path.isfile(file_source):
+                source_to_object_name_dict[file_source] = self.getObjectName(file_source)
+            else:
+                list_of_output_dicts.append(self.checkSuccess(self.transferFile, file_source, file_source_to_file_dest_dict[file_source]))
+
+        if len(source_to_object_name_dict) == 0:
+            return list_of_output_dicts
+
+        # ask the cluster which of the objects we don't already know about it has (one connection)
+        set_of_unknown_object_names = set(source_to_object_name_dict.values()) - self.known_remote_object_names
+        if len(set_of_unknown_object_names) > 0:
+            list_of_check_cmds = ['mkdir -p ' + self.object_store_path + ' && cd ' + self.object_store_path] + ['if [ -f ' + object_name + ' ]; then echo ' + object_name + '; fi' for object_name in sorted(set_of_unknown_object_names)]
+            check_output_dict = self.checkSuccess(self.sendCommand, list_of_check_cmds)
+            list_of_output_dicts.append(check_output_dict)
+            self.known_remote_object_names.update(set([object_name for object_name in check_output_dict['stdout'].split() if object_name in set_of_unknown_object_names]))
+
+        # only send the content that the cluster has never seen
+        list_of_output_dicts += self.sendObjectsToStore(source_to_object_name_dict, set(source_to_object_name_dict.values()) - self.known_remote_object_names)
+
+        # create all the destinations as links to the objects (one connection). If the store was purged since the objects were last seen then the missing objects are sent again and only their destinations are linked again.
+        link_output_dict, set_of_missing_object_names = self.linkObjectsToDestinations(source_to_object_name_dict, file_source_to_file_dest_dict)
+        list_of_output_dicts.append(link_output_dict)
+        if len(set_of_missing_object_names) > 0:
+            print('Objects ', sorted(set_of_missing_object_names), ' are no longer in the object store ', self.object_store_path, ' so they are being sent again.')
+            self.known_remote_object_names -= set_of_missing_object_names
+            resend_source_to_object_name_dict = {file_source: object_name for file_source, object_name in source_to_object_name_dict.items() if object_name in set_of_missing_object_names}
+            list_of_output_dicts += self.sendObjectsToStore(resend_source_to_object_name_dict, set_of_missing_object_names)
+            link_output_dict, set_of_missing_object_names = self.linkObjectsToDestinations(resend_source_to_object_name_dict, file_source_to_file_dest_dict)
+            list_of_output_dicts.append(link_output_dict)
+            if len(set_of_missing_object_names) > 0:
+                raise ValueError('Some objects are still missing from the object store after they were sent again. Here set_of_missing_object_names = ', set_of_missing_object_names, ' and self.object_store_path = ', self.object_store_path)
+
+        return list_of_output_dicts
+
+    def sendObjectsToStore(self, source_to_object_name_dict, set_of_object_names):
+        """
+        Sends the local files with the given object names into the object store (see stageFilesByContent). Each object is only sent once even if several local files have the same content.
+
+        Args:
+            source_to_object_name_dict (dict): Keys are local files and values are their object names (see getObjectName).
+            set_of_object_names (set of str): The objects to send.
+
+        Returns:
+            list_of_output_dicts (list of dicts): The output dicts of all the connections made.
+        """
+        list_of_output_dicts = []
+        set_of_sent_object_names = set()
+        for file_source in source_to_object_name_dict.keys():
+            object_name = source_to_object_name_dict[file_source]
+            if (object_name in set_of_object_names) and (object_name not in set_of_sent_object_names):
+                # the object is sent to a temporary name and then moved so a failed transfer can never leave a partial object in the store
+                transfer_output_dict = self.checkSuccess(self.transferFile, file_source, self.object_store_path + '/' + object_name + '.partial')
+                list_of_output_dicts.append(transfer_output_dict)
+                set_of_sent_object_names.add(object_name)
+
+        if len(set_of_sent_object_names) > 0:
+            list_of_output_dicts.append(self.checkSuccess(self.sendCommand, ['mv -f ' + self.object_store_path + '/' + object_name + '.partial ' + self.object_store_path + '/' + object_name for object_name in sorted(set_of_sent_object_names)]))
+            self.known_remote_object_names.update(set_of_sent_object_names)
+
+        return list_of_output_dicts
+
+    def linkObjectsToDestinations(self, source_to_object_name_dict, file_source_to_file_dest_dict):
+        """
+        Creates the destination of every local file as a hardlink (or a symlink if a hardlink isn't possible) to its object in the object store, all in one connection. A destination is only linked if its object is in the store so a missing object can never leave a dangling symlink behind.
+
+        Args:
+            source_to_object_name_dict (dict): Keys are local files and values are their object names (see getObjectName).
+            file_source_to_file_dest_dict (dict): Keys are local files and values are the directories on the cluster that they need to be put in.
+
+        Returns:
+            output_dict (dict): The output dict of the connection.
+            set_of_missing_object_names (set of str): The objects that weren't in the store (their destinations weren't linked).
         """
-        Creates a submission script with appropriate file permissions.
+        list_of_link_cmds = ['set -e']
+        for file_source in source_to_object_name_dict.keys():
+            destination = file_source_to_file_dest_dict[file_source].rstrip('/') + '/' + os.path.basename(file_source)
+            object_path = self.object_store_path + '/' + source_to_object_name_dict[file_source]
+            list_of_link_cmds.append('if [ -f ' + object_path + ' ]; then ln -f ' + object_path + ' ' + destination + ' 2> /dev/null || ln -sf ' + object_path + ' ' + destination + '; else echo "CCF_MISSING_OBJECT ' + source_to_object_name_dict[file_source] + '"; fi')
+        output_dict = self.checkSuccess(self.sendCommand, list_of_link_cmds)
+        set_of_missing_object_names = set(re.findall(r'^CCF_MISSING_OBJECT (\S+)$', output_dict['stdout'], flags = re.MULTILINE))
+
+        return output_dict, set_of_missing_object_names
+
+    def getObjectName(self, file_name_and_path):
+        """
+        Returns the name of a local file in the object store. This is the sha256 of the contents followed by the file permissions. Hashes are cached using the size and modification time of the file so files that haven't changed aren't read again.
 
         Args:
-            file_name_and_path (str): The file name (try to use absolute file paths to be safe).
-            pbs_script_list (list of strings): A list of strings where each string is a line of the submission script.
-            file_permisions = "700" (str): The desired file permissions for the submission script (can be numbers or symbols e.g. "700" or "u+x" etc). Submission scripts need to be executable and so the default setting is "700" which is read, write and execute for the user and nothing for anyone else.
+            file_name_and_path (str): A file on the local computer.
+
+        Returns:
+            object_name (str): e.g. '9f86d0...0f00a08_700'.
         """
-        # write the code to a file
-        Connection.createLocalFile(file_name_and_path, pbs_script_list, file_permissions)
+        file_stat = os.stat(file_name_and_path)
+        cache_key = (os.path.abspath(file_name_and_path), file_stat.st_size, file_stat.st_mtime_ns)
+        if cache_key not in self.local_file_to_hash_cache:
+            sha256 = hashlib.sha256()
+            with open(file_name_and_path, mode = 'rb') as myfile:
+                for chunk in iter(lambda: myfile.read(1048576), b''):
+                    sha256.update(chunk)
+            self.local_file_to_hash_cache[cache_key] = sha256.hexdigest()
 
-        return
+        object_name = self.local_file_to_hash_cache[cache_key] + '_' + format(file_stat.st_mode & 0o777, 'o')
+
+        return object_name
 
 class BasePbs(BaseCluster):
     """
@@ -318,8 +1938,7 @@ class BasePbs(BaseCluster):
 
     This is meant to contain the BASIC commands that can be used by programs to control the remote computer (that aren't already included in base_connection.Connection). This is atomistic level commands that form the basis of more complex and specific programs.
 
-    Abstract methods that are left out are:
-         - checkDiskUsage
+    The disk usage of the user is checked with the quota tools (see BaseCluster.checkDiskUsage).
     """
 
     def __init__(self, remote_user_name, ssh_config_alias, forename_of_user, surname_of_user, user_email, base_output_path, base_runfiles_path, remote_computer_info, max_array_size, affiliation = None):
@@ -407,7 +2026,7 @@ class BasePbs(BaseCluster):
 
         return list_of_pbs_commands
 
-    def createStandardSubmissionScriptList(self, list_of_job_specific_code, pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, initial_message_in_code = None, shebang = "#!/bin/bash\n"):
+    def createStandardSubmissionScriptList(self, list_of_job_specific_code, pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, initial_message_in_code = None, shebang = "#!/bin/bash\n", job_class = None, scratch_staging_dict = None, progress_dir = None):
         """
         This creates a PBS submission script based on the resources you request and the job specific code that you supply. It then writes this code to a file that you specify.
 
@@ -424,10 +2043,22 @@ class BasePbs(BaseCluster):
             initial_message_in_code == None (str): Should the user wish to put a meaasge near the top of the script (maybe explanation or something) then they can add it here as a string. If it's value is None (the default value) then the line is omitted.
             file_permissions = "700" (str): The file permissions that the user would like the PBS submission script to have. If it is None then it will not attempt to change the settings. The default setting, 700, makes it read, write and executable only to the user. NOTE: For the submission script to work one needs to make it executable.
             shebang = "#!/bin/bash" (str): The shebang line tells the operating system what interpreter to use when executing this script. The default interpreter is BASH which is normally found in /bin/bash.
+            job_class = None (str): If given and self.resource_history_db_path is set then the walltime and number of cores are replaced by the ones recommended from previous jobs of this class (see applyResourceRecommendation). If None (the default) then the resources are used as they are given.
+            scratch_staging_dict = None (dict): If given then the shared inputs are copied to node-local scratch once per node and the task's output is written locally and copied back when it exits (see createScratchStagingLines for the keys and the environment variables the job specific code can use). If None (the default) then nothing is staged.
+            progress_dir = None (str): If given then the job specific code can report its progress with the reportProgress shell function and the records are written to this directory (see createProgressReportingLines). If None (the default) then progress isn't reported.
         """
 
+        no_of_cores, walltime = self.applyResourceRecommendation(job_class, no_of_cores, walltime)
         # Create the PBS template
         pbs_script_list = self.createSubmissionScriptTemplate(pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, initial_message_in_code, shebang)
+        # Set up the software environment (from a snapshot if there is one)
+        pbs_script_list += self.getEnvironmentActivationLines()
+        # Stage shared inputs onto node-local scratch
+        if scratch_staging_dict is not None:
+            pbs_script_list += self.createScratchStagingLines(scratch_staging_dict)
+        # Let the task report its progress
+        if progress_dir is not None:
+            pbs_script_list += self.createProgressReportingLines(progress_dir)
         # Add the code that is specific to this job
         pbs_script_list += list_of_job_specific_code
 
@@ -446,14 +2077,278 @@ class BasePbs(BaseCluster):
         
         return int(re.search(r'\d+', stdout).group())
 
+    def getDependencyFlag(self, dependency_job_ids, dependency_type = 'afterok'):
+        """
+        Creates the qsub flag that holds a job until the jobs in dependency_job_ids have finished.
+
+        PBS/TORQUE treats job arrays differently to normal jobs. To wait for a whole job array one must use the array versions of the dependency types (e.g. 'afterokarray' or 'afteranyarray') and the array job ID must end in '[]'. This function adds the '[]' automatically when an array dependency type is used.
+
+        Args:
+            dependency_job_ids (list): The job IDs (ints or strings) to wait for.
+            dependency_type = 'afterok' (str): One of 'after', 'afterok', 'afternotok', 'afterany', 'afterstartarray', 'afterokarray', 'afternotokarray' or 'afteranyarray'.
+
+        Returns:
+            dependency_flag (str): e.g. '-W depend=afterok:123:124'.
+        """
+        valid_dependency_types = ('after', 'afterok', 'afternotok', 'afterany', 'afterstartarray', 'afterokarray', 'afternotokarray', 'afteranyarray')
+        if dependency_type not in valid_dependency_types:
+            raise ValueError('dependency_type must be one of ', valid_dependency_types, '. Here dependency_type = ', dependency_type)
+
+        if dependency_type.endswith('array'):
+            list_of_ids = [str(job_id) + '[]' for job_id in dependency_job_ids]
+        else:
+            list_of_ids = [str(job_id) for job_id in dependency_job_ids]
+
+        dependency_flag = '-W depend=' + dependency_type + ':' + ':'.join(list_of_ids)
+
+        return dependency_flag
+
+    def getArrayIndicesFlag(self, list_of_array_indices):
+        """
+        Creates the qsub flag that overrides the '#PBS -t' line of a submission script.
+
+        Args:
+            list_of_array_indices (list of ints or ArrayIndexSet): The array numbers to submit. An ArrayIndexSet can also limit how many run at once.
+
+        Returns:
+            array_flag (str): e.g. '-t 3-5,7'.
+        """
+        array_flag = '-t ' + ArrayIndexSet(list_of_array_indices).toArraySpec()
+
+        return array_flag
+
+    def checkPendingArrayTasks(self, job_number):
+        """
+        Returns the array numbers of the tasks of a job that are still waiting in the queue (i.e. in the 'Q' state and so haven't started yet).
+
+        Args:
+            job_number (int): The job number of the job array.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'. The stdout has one array number per line (see getArrayIndicesFromQueueStdOut).
+        """
+        # the tenth column of 'qstat -tu' is the state of the job
+        grep_part_of_cmd = "qstat -tu " + self.user_name + " | grep " + str(job_number) + " | awk \'$10 == \"Q\" {print $1}\' | awk -F \"[][]\" \'{print $2}\'"
+
+        output_dict = self.checkSuccess(self.remoteConnection, [grep_part_of_cmd])
+
+        return output_dict
+
+    def cancelArrayTasks(self, job_number, list_of_array_indices):
+        """
+        Cancels specific tasks of a job array (e.g. 'qdel -t 3,5,7 123[]').
+
+        Args:
+            job_number (int): The job number of the job array.
+            list_of_array_indices (list of ints): The array numbers of the tasks to cancel.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        cancel_cmd = "qdel -t " + ArrayIndexSet(list_of_array_indices).toArraySpec(include_max_concurrent_tasks = False) + " " + str(job_number) + "[]"
+
+        output_dict = self.checkSuccess(self.remoteConnection, [cancel_cmd])
+
+        return output_dict
+
+    def getQueueAvailability(self, list_of_queue_names):
+        """
+        Returns how busy each queue is right now. The number of jobs waiting comes from 'qstat -Q' and the free gaps come from the Moab/Maui 'showbf' command. If showbf isn't available then the queue is treated as having no free gaps (so the estimate is based only on the jobs waiting).
+
+        Args:
+            list_of_queue_names (list of str): The queues to look at.
+
+        Returns:
+            queue_name_to_availability_dict (dict of dicts): The keys are the queue names and the values are dicts with the keys 'backfill_windows' (list of tuples - each is (no_of_cores, duration_seconds) of a gap that a job could start in now), 'pending_jobs' (int) and 'max_walltime_seconds' (float - inf if the queue has no limit).
+        """
+        list_of_commands = []
+        for queue_name in list_of_queue_names:
+            list_of_commands += ['echo "QUEUE=' + queue_name + '"', 'qstat -Qf ' + queue_name + ' 2>/dev/null | grep -E "state_count|resources_max.walltime"', 'showbf -c ' + queue_name + ' 2>/dev/null || true']
+
+        output_dict = self.checkSuccess(self.remoteConnection, list_of_commands)
+        queue_name_to_availability_dict = self.parseQueueAvailabilityOutput(output_dict['stdout'])
+
+        return queue_name_to_availability_dict
+
+    @staticmethod
+    def parseQueueAvailabilityOutput(stdout):
+        """
+        Reads the output created by getQueueAvailability.
+
+        Args:
+            stdout (str): The stdout from getQueueAvailability.
+
+        Returns:
+            queue_name_to_availability_dict (dict of dicts): See getQueueAvailability.
+        """
+        queue_name_to_availability_dict = {}
+        for queue_block in re.split(r'^QUEUE=', stdout, flags = re.MULTILINE)[1:]:
+            queue_name = queue_block.split("\n", 1)[0].strip()
+            availability_dict = {'backfill_windows': [], 'pending_jobs': 0, 'max_walltime_seconds': float('inf')}
+            for line in queue_block.split("\n")[1:]:
+                state_count_match = re.search(r'state_count\s*=.*Queued:(\d+)', line)
+                walltime_match = re.search(r'resources_max\.walltime\s*=\s*(\S+)', line)
+                # showbf lines look like 'ALL   24   2   INFINITY   00:00:00   10:33:21_11/20'
+                showbf_match = re.fullmatch(r'\s*\S+\s+(\d+)\s+\d+\s+(INFINITY|[\d:-]+)\s+.*', line)
+                if state_count_match is not None:
+                    availability_dict['pending_jobs'] = int(state_count_match.group(1))
+                elif walltime_match is not None:
+                    availability_dict['max_walltime_seconds'] = BaseCluster.walltimeToSeconds(walltime_match.group(1))
+                elif showbf_match is not None:
+                    duration_seconds = float('inf') if showbf_match.group(2) == 'INFINITY' else BaseCluster.walltimeToSeconds(showbf_match.group(2))
+                    availability_dict['backfill_windows'].append((int(showbf_match.group(1)), duration_seconds))
+
+            queue_name_to_availability_dict[queue_name] = availability_dict
+
+        return queue_name_to_availability_dict
+
+    def getArrayJobShellVariables(self):
+        """
+        Returns the shell expressions that give the job ID (without the array number or server name) and array number inside a running task. TORQUE uses PBS_ARRAYID and PBS Pro uses PBS_ARRAY_INDEX.
+
+        Returns:
+            shell_variables_dict (dict): Has the keys 'job_id' and 'array_index'.
+        """
+        return {'job_id': '${PBS_JOBID%%[.[]*}', 'array_index': '${PBS_ARRAYID:-${PBS_ARRAY_INDEX:-0}}'}
+
+    def getPilotLaunchCommand(self, worker_command):
+        """
+        Creates the line of a pilot script that runs the worker once on every node of the allocation. pbsdsh is used if the pilot has more than one node, otherwise the worker is just run on this node.
+
+        Args:
+            worker_command (str): The command that runs the pilot worker (it must use absolute paths because pbsdsh doesn't keep the working directory).
+
+        Returns:
+            launch_cmd (str): The line of shell code.
+        """
+        launch_cmd = 'if [ "$(sort -u ${PBS_NODEFILE} | wc -l)" -gt 1 ]; then pbsdsh -u ' + worker_command + '; else ' + worker_command + '; fi'
+
+        return launch_cmd
+
+    def getSubmissionTokenFlag(self, submission_token):
+        """
+        Attaches a submission token to a job by using it as the job name (PBS/TORQUE has no free text comment that can be set with qsub). NOTE: this replaces the job name set in the submission script.
+
+        Args:
+            submission_token (str): The token (see createSubmissionToken).
+
+        Returns:
+            token_flag (str): e.g. '-N ccf1a2b3c4d5e6'.
+        """
+        return '-N ' + submission_token
+
+    def createFindTokenCommand(self, submission_token):
+        """
+        Creates a shell command that prints the job numbers of the user's jobs whose name is the submission token. 'qselect -N' compares the whole job name (the job name column of 'qstat -u' is cut to 10 characters on PBS Pro and so can't be used). On PBS Pro '-x' also selects jobs that have finished so a short job that has already left the queue is still found. TORQUE doesn't understand '-x' but keeps finished jobs for as long as keep_completed is set.
+
+        Args:
+            submission_token (str): The token (see createSubmissionToken).
+
+        Returns:
+            find_cmd (str): The shell command.
+        """
+        find_cmd = "{ qselect -x -u " + self.user_name + " -N " + submission_token + " 2>/dev/null || qselect -u " + self.user_name + " -N " + submission_token + "; } | sed \'s/[^0-9].*//\' | sort -u"
+
+        return find_cmd
+
+    def countTasksInQueue(self):
+        """
+        Returns how many of the user's tasks (each array task counts as one) are in the queue right now.
+
+        Returns:
+            no_of_tasks (int): The number of tasks in the queue.
+        """
+        # grep -c returns 1 if there are no matches so '|| true' stops an empty queue looking like a failed connection
+        count_cmd = "qstat -tu " + self.user_name + " | grep -c '^[0-9]' || true"
+
+        output_dict = self.checkSuccess(self.remoteConnection, [count_cmd])
+        no_of_tasks = int(output_dict['stdout'].strip() or 0)
+
+        return no_of_tasks
+
+    def getMaxQueuedTasks(self):
+        """
+        Returns the most tasks that the user can have in the queue at once. This is 'max_user_queuable' on TORQUE and 'max_queued' on PBS Pro (the smallest of the server and queue settings is used).
+
+        Returns:
+            max_queued_tasks (int or None): None if no limit is set (or it can't be read).
+        """
+        output_dict = self.checkSuccess(self.remoteConnection, ["qmgr -c 'print server' 2>/dev/null | grep -E 'max_user_queuable|max_queued' || true"])
+        max_queued_tasks = self.parseMaxQueuedTasksOutput(output_dict['stdout'])
+
+        return max_queued_tasks
+
+    @staticmethod
+    def parseMaxQueuedTasksOutput(stdout):
+        """
+        Reads the limits from the output of 'qmgr -c "print server"', e.g. 'set server max_user_queuable = 200' (TORQUE) or 'set queue workq max_queued = [u:PBS_GENERIC=500]' (PBS Pro).
+
+        Args:
+            stdout (str): The lines of the qmgr output that set limits.
+
+        Returns:
+            max_queued_tasks (int or None): The smallest limit or None if there isn't one.
+        """
+        list_of_limits = [int(limit) for limit in re.findall(r'max_user_queuable\s*=\s*(\d+)', stdout)]
+        list_of_limits += [int(limit) for limit in re.findall(r'max_queued\s*=\s*\[u:PBS_GENERIC=(\d+)\]', stdout)]
+        max_queued_tasks = min(list_of_limits) if len(list_of_limits) > 0 else None
+
+        return max_queued_tasks
+
+    def getArrayTaskAccounting(self, job_number):
+        """
+        Returns the resources actually used by each finished task of a job array. This reads 'qstat -f -t' which on PBS Pro needs the '-x' flag to show finished jobs and on TORQUE only shows finished jobs for as long as the server keeps them (keep_completed) so this should be called soon after the job has finished.
+
+        Args:
+            job_number (int): The job number of the job array.
+
+        Returns:
+            list_of_records (list of dicts): See parseAccountingOutput.
+        """
+        # PBS Pro needs -x to show finished jobs but TORQUE doesn't understand it
+        accounting_cmd = "qstat -x -f -t " + str(job_number) + "[] 2>/dev/null || qstat -f -t " + str(job_number) + "[]"
+
+        output_dict = self.checkSuccess(self.remoteConnection, [accounting_cmd])
+        list_of_records = self.parseAccountingOutput(output_dict['stdout'])
+
+        return list_of_records
+
+    @staticmethod
+    def parseAccountingOutput(stdout):
+        """
+        Reads the output of 'qstat -f -t' (see getArrayTaskAccounting) and returns the resources used by each task that has finished. The 'resources_used' lines look the same in tracejob output so it can be used on that too.
+
+        Args:
+            stdout (str): The stdout of 'qstat -f -t'.
+
+        Returns:
+            list_of_records (list of dicts): One dict per finished task with the keys 'array_index' (int, 0 if the job isn't an array), 'runtime_seconds', 'cpu_time_seconds', 'peak_memory_KB' (floats) and 'state' ('COMPLETED' if the exit status was 0 and 'FAILED' otherwise).
+        """
+        list_of_records = []
+        # each job starts with 'Job Id: 123[4].server' and the attributes are indented underneath
+        for job_block in re.split(r'^Job Id:\s*', stdout, flags = re.MULTILINE)[1:]:
+            array_index_match = re.match(r'\d+\[(\d+)\]', job_block)
+            attribute_dict = dict(re.findall(r'^\s*([\w.]+)\s*=\s*(\S+)', job_block, flags = re.MULTILINE))
+            # tasks that are still queued or running don't have an exit status yet
+            if 'exit_status' not in attribute_dict or 'resources_used.walltime' not in attribute_dict:
+                continue
+
+            record = {'array_index': int(array_index_match.group(1)) if array_index_match is not None else 0}
+            record['runtime_seconds'] = BaseCluster.walltimeToSeconds(attribute_dict['resources_used.walltime'])
+            record['cpu_time_seconds'] = BaseCluster.walltimeToSeconds(attribute_dict['resources_used.cput']) if 'resources_used.cput' in attribute_dict else 0.0
+            record['peak_memory_KB'] = BaseCluster.memoryToKB(attribute_dict['resources_used.mem']) if 'resources_used.mem' in attribute_dict else 0.0
+            record['state'] = 'COMPLETED' if attribute_dict['exit_status'] == '0' else 'FAILED'
+            list_of_records.append(record)
+
+        return list_of_records
+
 class BaseSlurm(BaseCluster):
     """
     This is meant to be a template to create a connection object for a standard PBS/TORQUE cluster. This inherits from the base_connect.Connection class in base_connection.py. It will not define ALL of the abstract classes specified in base_connection.Connection and so you will not be able to create an instance of it. One should create a class that inherits this class and add all the neccessary methods to statisfy the base_connection.Connection abstract methods.
 
     This is meant to contain the BASIC commands that can be used by programs to control the remote computer (that aren't already included in base_connection.Connection). This is atomistic level commands that form the basis of more complex and specific programs.
 
-    Abstract methods that are left out are:
-         - checkDiskUsage
+    The disk usage of the user is checked with the quota tools (see BaseCluster.checkDiskUsage).
     """
 
     def __init__(self, remote_user_name, ssh_config_alias, forename_of_user, surname_of_user, user_email, base_output_path, base_runfiles_path, remote_computer_info, max_array_size, affiliation = None, slurm_account_name = None):
@@ -541,11 +2436,11 @@ class BaseSlurm(BaseCluster):
             list_of_slurm_commands += ["## Declare what account the simulations are registered to", "#SBATCH -A " + slurm_account_name + "\n"]
 
         # add the next part of the template to the list
-        list_of_slurm_commands += ["# Last Updated: " + str(datetime.datetime.now()) + "\n", "## Job name", "#SBATCH --job-name=" + job_name + "\n", "## Resource request", "#SBATCH --ntasks=1", "#SBATCH --cpus-per-task=" + str(no_of_cores) + " # No. of cores", "#SBATCH --time=" + str(walltime) + " # walltime", "#SBATCH -p " + queue_name + " # queue/partition\n", "## Job array request", "#SBATCH --array=" + job_array_numbers + "\n", "## designate output and error files", "#SBATCH --output=" + outfile_name_and_path + "_%A_%a.out", "#SBATCH --error=" + errorfile_name_and_path  + "_%A_%a.err" + "\n", "# print some details about the job", 'echo "The Array task ID is: ${SLURM_ARRAY_TASK_ID}"', 'echo "The Array job ID is: ${SLURM_ARRAY_JOB_ID}"', 'echo Running on host `hostname`', 'echo Time is `date`', 'echo Directory is `pwd`' + "\n"]
+        list_of_slurm_commands += ["# Last Updated: " + str(datetime.datetime.now()) + "\n", "## Job name", "#SBATCH --job-name=" + job_name + "\n", "## Resource request", "#SBATCH --nodes=" + str(no_of_nodes), "#SBATCH --ntasks-per-node=1", "#SBATCH --cpus-per-task=" + str(no_of_cores) + " # No. of cores", "#SBATCH --time=" + str(walltime) + " # walltime", "#SBATCH -p " + queue_name + " # queue/partition\n", "## Job array request", "#SBATCH --array=" + job_array_numbers + "\n", "## designate output and error files", "#SBATCH --output=" + outfile_name_and_path + "_%A_%a.out", "#SBATCH --error=" + errorfile_name_and_path  + "_%A_%a.err" + "\n", "# print some details about the job", 'echo "The Array task ID is: ${SLURM_ARRAY_TASK_ID}"', 'echo "The Array job ID is: ${SLURM_ARRAY_JOB_ID}"', 'echo Running on host `hostname`', 'echo Time is `date`', 'echo Directory is `pwd`' + "\n"]
 
         return list_of_slurm_commands
 
-    def createStandardSubmissionScriptList(self, list_of_job_specific_code, pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, slurm_account_name = None, initial_message_in_code = None, shebang = "#!/bin/bash\n"):
+    def createStandardSubmissionScriptList(self, list_of_job_specific_code, pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, slurm_account_name = None, initial_message_in_code = None, shebang = "#!/bin/bash\n", job_class = None, scratch_staging_dict = None, progress_dir = None):
         """
         This creates a PBS submission script based on the resources you request and the job specific code that you supply. It then writes this code to a file that you specify.
 
@@ -562,10 +2457,22 @@ class BaseSlurm(BaseCluster):
             initial_message_in_code == None (str): Should the user wish to put a meaasge near the top of the script (maybe explanation or something) then they can add it here as a string. If it's value is None (the default value) then the line is omitted.
             file_permissions = "700" (str): The file permissions that the user would like the PBS submission script to have. If it is None then it will not attempt to change the settings. The default setting, 700, makes it read, write and executable only to the user. NOTE: For the submission script to work one needs to make it executable.
             shebang = "#!/bin/bash" (str): The shebang line tells the operating system what interpreter to use when executing this script. The default interpreter is BASH which is normally found in /bin/bash.
+            job_class = None (str): If given and self.resource_history_db_path is set then the walltime and number of cores are replaced by the ones recommended from previous jobs of this class (see applyResourceRecommendation). If None (the default) then the resources are used as they are given.
+            scratch_staging_dict = None (dict): If given then the shared inputs are copied to node-local scratch once per node and the task's output is written locally and copied back when it exits (see createScratchStagingLines for the keys and the environment variables the job specific code can use). If None (the default) then nothing is staged.
+            progress_dir = None (str): If given then the job specific code can report its progress with the reportProgress shell function and the records are written to this directory (see createProgressReportingLines). If None (the default) then progress isn't reported.
         """
 
+        no_of_cores, walltime = self.applyResourceRecommendation(job_class, no_of_cores, walltime)
         # Create the PBS template
         pbs_script_list = self.createSubmissionScriptTemplate(pbs_job_name, no_of_nodes, no_of_cores, array_nos, walltime, queue_name, outfile_name_and_path, errorfile_name_and_path, slurm_account_name = None, initial_message_in_code = initial_message_in_code, shebang = shebang)
+        # Set up the software environment (from a snapshot if there is one)
+        pbs_script_list += self.getEnvironmentActivationLines()
+        # Stage shared inputs onto node-local scratch
+        if scratch_staging_dict is not None:
+            pbs_script_list += self.createScratchStagingLines(scratch_staging_dict)
+        # Let the task report its progress
+        if progress_dir is not None:
+            pbs_script_list += self.createProgressReportingLines(progress_dir)
         # Add the code that is specific to this job
         pbs_script_list += list_of_job_specific_code
 
@@ -584,3 +2491,246 @@ class BaseSlurm(BaseCluster):
         
         return int(re.search(r'\d+', stdout).group())
 
+    def getDependencyFlag(self, dependency_job_ids, dependency_type = 'afterok'):
+        """
+        Creates the sbatch flag that holds a job until the jobs in dependency_job_ids have finished.
+
+        Unlike PBS/TORQUE, SLURM treats a dependency on a job array as a dependency on every task in the array and so there are no special array dependency types. So that the same code can be used on both kinds of clusters the PBS/TORQUE array types (e.g. 'afterokarray') are accepted and converted to their SLURM equivalent.
+
+        Args:
+            dependency_job_ids (list): The job IDs (ints or strings) to wait for.
+            dependency_type = 'afterok' (str): One of 'after', 'afterok', 'afternotok', 'afterany', 'afterokarray', 'afternotokarray' or 'afteranyarray'.
+
+        Returns:
+            dependency_flag (str): e.g. '--dependency=afterok:123:124'.
+        """
+        pbs_array_type_to_slurm_type = {'afterokarray': 'afterok', 'afternotokarray': 'afternotok', 'afteranyarray': 'afterany'}
+        valid_dependency_types = ('after', 'afterok', 'afternotok', 'afterany') + tuple(pbs_array_type_to_slurm_type.keys())
+        if dependency_type not in valid_dependency_types:
+            raise ValueError('dependency_type must be one of ', valid_dependency_types, '. Here dependency_type = ', dependency_type)
+
+        dependency_type = pbs_array_type_to_slurm_type.get(dependency_type, dependency_type)
+        dependency_flag = '--dependency=' + dependency_type + ':' + ':'.join([str(job_id) for job_id in dependency_job_ids])
+
+        return dependency_flag
+
+    def getArrayIndicesFlag(self, list_of_array_indices):
+        """
+        Creates the sbatch flag that overrides the '#SBATCH --array' line of a submission script.
+
+        Args:
+            list_of_array_indices (list of ints or ArrayIndexSet): The array numbers to submit. An ArrayIndexSet can also limit how many run at once.
+
+        Returns:
+            array_flag (str): e.g. '--array=3-5,7'.
+        """
+        array_flag = '--array=' + ArrayIndexSet(list_of_array_indices).toArraySpec()
+
+        return array_flag
+
+    def checkPendingArrayTasks(self, job_number):
+        """
+        Returns the array numbers of the tasks of a job that are still waiting in the queue (i.e. in the PENDING state and so haven't started yet).
+
+        Args:
+            job_number (int): The job number of the job array.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'. The stdout has one array number per line (see getArrayIndicesFromQueueStdOut).
+        """
+        grep_part_of_cmd = "squeue -rh -u " + self.user_name + " -t PENDING -o \'%i\' | grep \'^" + str(job_number) + "_\' | awk -F \"_\" \'{print $2}\'"
+
+        output_dict = self.checkSuccess(self.sendCommand, [grep_part_of_cmd])
+
+        return output_dict
+
+    def cancelArrayTasks(self, job_number, list_of_array_indices):
+        """
+        Cancels specific tasks of a job array (e.g. 'scancel 123_[3,5,7]').
+
+        Args:
+            job_number (int): The job number of the job array.
+            list_of_array_indices (list of ints): The array numbers of the tasks to cancel.
+
+        Returns:
+            output_dict (dict): Has keys 'return_code', 'stdout', and 'stderr'.
+        """
+        cancel_cmd = "scancel " + str(job_number) + "_[" + ArrayIndexSet(list_of_array_indices).toArraySpec(include_max_concurrent_tasks = False) + "]"
+
+        output_dict = self.checkSuccess(self.sendCommand, [cancel_cmd])
+
+        return output_dict
+
+    def getQueueAvailability(self, list_of_queue_names):
+        """
+        Returns how busy each partition is right now using sinfo (for the idle cores and time limit) and squeue (for the number of jobs waiting). SLURM doesn't show its backfill gaps directly so the idle cores are treated as a gap that lasts as long as the partition's time limit.
+
+        Args:
+            list_of_queue_names (list of str): The partitions to look at.
+
+        Returns:
+            queue_name_to_availability_dict (dict of dicts): The keys are the partition names and the values are dicts with the keys 'backfill_windows' (list of tuples - each is (no_of_cores, duration_seconds) of a gap that a job could start in now), 'pending_jobs' (int) and 'max_walltime_seconds' (float - inf if the partition has no limit).
+        """
+        list_of_commands = []
+        for queue_name in list_of_queue_names:
+            # %C is allocated/idle/other/total CPUs and %l is the time limit
+            list_of_commands += ["echo \"QUEUE=" + queue_name + " $(sinfo -h -p " + queue_name + " -o '%C %l' | head -n 1) $(squeue -h -p " + queue_name + " -t PENDING -o '%i' | wc -l)\""]
+
+        output_dict = self.checkSuccess(self.sendCommand, ["; ".join(list_of_commands)])
+        queue_name_to_availability_dict = self.parseQueueAvailabilityOutput(output_dict['stdout'])
+
+        return queue_name_to_availability_dict
+
+    @staticmethod
+    def parseQueueAvailabilityOutput(stdout):
+        """
+        Reads the output created by getQueueAvailability. Each line looks like 'QUEUE=name 10/22/0/32 2-00:00:00 5'.
+
+        Args:
+            stdout (str): The stdout from getQueueAvailability.
+
+        Returns:
+            queue_name_to_availability_dict (dict of dicts): See getQueueAvailability. Partitions that sinfo doesn't know about are left out.
+        """
+        queue_name_to_availability_dict = {}
+        for line in stdout.strip().split("\n"):
+            match = re.fullmatch(r'QUEUE=(\S+)\s+\d+/(\d+)/\d+/\d+\s+(\S+)\s+(\d+)', line.strip())
+            if match is None:
+                continue
+
+            max_walltime_seconds = float('inf') if match.group(3) in ('infinite', 'UNLIMITED') else BaseCluster.walltimeToSeconds(match.group(3))
+            queue_name_to_availability_dict[match.group(1)] = {'backfill_windows': [(int(match.group(2)), max_walltime_seconds)], 'pending_jobs': int(match.group(4)), 'max_walltime_seconds': max_walltime_seconds}
+
+        return queue_name_to_availability_dict
+
+    def getArrayJobShellVariables(self):
+        """
+        Returns the shell expressions that give the job ID (the ID of the whole array) and array number inside a running task.
+
+        Returns:
+            shell_variables_dict (dict): Has the keys 'job_id' and 'array_index'.
+        """
+        return {'job_id': '${SLURM_ARRAY_JOB_ID:-${SLURM_JOB_ID}}', 'array_index': '${SLURM_ARRAY_TASK_ID:-0}'}
+
+    def getPilotLaunchCommand(self, worker_command):
+        """
+        Creates the line of a pilot script that runs the worker once on every node of the allocation. srun is used if the pilot has more than one node, otherwise the worker is just run on this node.
+
+        Args:
+            worker_command (str): The command that runs the pilot worker.
+
+        Returns:
+            launch_cmd (str): The line of shell code.
+        """
+        launch_cmd = 'if [ "${SLURM_JOB_NUM_NODES:-1}" -gt 1 ]; then srun --ntasks=${SLURM_JOB_NUM_NODES} --ntasks-per-node=1 ' + worker_command + '; else ' + worker_command + '; fi'
+
+        return launch_cmd
+
+    def getSubmissionTokenFlag(self, submission_token):
+        """
+        Attaches a submission token to a job as its comment so that the job name in the submission script is kept.
+
+        Args:
+            submission_token (str): The token (see createSubmissionToken).
+
+        Returns:
+            token_flag (str): e.g. '--comment=ccf1a2b3c4d5e6'.
+        """
+        return '--comment=' + submission_token
+
+    def createFindTokenCommand(self, submission_token):
+        """
+        Creates a shell command that prints the job numbers of the user's jobs whose comment is the submission token (array tasks of the same job are only printed once). Jobs that have left the queue in the last day are found with sacct, which only knows the comment if AccountingStoreFlags includes job_comment.
+
+        Args:
+            submission_token (str): The token (see createSubmissionToken).
+
+        Returns:
+            find_cmd (str): The shell command.
+        """
+        find_cmd = "{ squeue -h -u " + self.user_name + " -o \'%i|%k\'; sacct -n -X -P -u " + self.user_name + " -S $(date -d \'1 day ago\' +%Y-%m-%dT%H:%M:%S) -o JobID,Comment 2>/dev/null; } | awk -F \'|\' \'$2 == \"" + submission_token + "\" {split($1, job_id, /[^0-9]/); print job_id[1]}\' | sort -u"
+
+        return find_cmd
+
+    def countTasksInQueue(self):
+        """
+        Returns how many of the user's tasks (each array task counts as one) are in the queue right now.
+
+        Returns:
+            no_of_tasks (int): The number of tasks in the queue.
+        """
+        output_dict = self.checkSuccess(self.sendCommand, ["squeue -rh -u " + self.user_name + " | wc -l"])
+        no_of_tasks = int(output_dict['stdout'].strip() or 0)
+
+        return no_of_tasks
+
+    def getMaxQueuedTasks(self):
+        """
+        Returns the most tasks that the user can have in the queue at once (the MaxSubmitJobs limit of the user's associations). Limits that come from a QOS are not read so if they are the tighter limit set self.max_queued_tasks by hand.
+
+        Returns:
+            max_queued_tasks (int or None): None if no limit is set (or it can't be read).
+        """
+        output_dict = self.checkSuccess(self.sendCommand, ["sacctmgr -nP show assoc where user=" + self.user_name + " format=MaxSubmit 2>/dev/null || true"])
+        list_of_limits = [int(line.strip()) for line in output_dict['stdout'].split("\n") if line.strip().isdigit()]
+        max_queued_tasks = min(list_of_limits) if len(list_of_limits) > 0 else None
+
+        return max_queued_tasks
+
+    def getArrayTaskAccounting(self, job_number):
+        """
+        Returns the resources actually used by each finished task of a job array using sacct.
+
+        Args:
+            job_number (int): The job number of the job array.
+
+        Returns:
+            list_of_records (list of dicts): See parseAccountingOutput.
+        """
+        accounting_cmd = "sacct -j " + str(job_number) + " -n -P -o JobID,State,ElapsedRaw,TotalCPU,MaxRSS"
+
+        output_dict = self.checkSuccess(self.sendCommand, [accounting_cmd])
+        list_of_records = self.parseAccountingOutput(output_dict['stdout'])
+
+        return list_of_records
+
+    @staticmethod
+    def parseAccountingOutput(stdout):
+        """
+        Reads the output of 'sacct -n -P -o JobID,State,ElapsedRaw,TotalCPU,MaxRSS' (see getArrayTaskAccounting) and returns the resources used by each task that has finished. SLURM records the peak memory against the job steps (e.g. '123_4.batch') rather than the task itself so the largest peak memory of all the steps of a task is used.
+
+        Args:
+            stdout (str): The stdout of sacct.
+
+        Returns:
+            list_of_records (list of dicts): One dict per finished task with the keys 'array_index' (int, 0 if the job isn't an array), 'runtime_seconds', 'cpu_time_seconds', 'peak_memory_KB' (floats) and 'state' (the SLURM state, e.g. 'COMPLETED', 'FAILED' or 'TIMEOUT').
+        """
+        unfinished_states = ('PENDING', 'RUNNING', 'REQUEUED', 'RESIZING', 'SUSPENDED')
+        array_index_to_record_dict = {}
+        array_index_to_peak_memory_dict = {}
+        for line in stdout.strip().split("\n"):
+            fields = line.strip().split('|')
+            if len(fields) < 5:
+                continue
+
+            job_id, state, elapsed, total_cpu, max_rss = fields[:5]
+            match = re.fullmatch(r'\d+(?:_(\d+))?(\..+)?', job_id)
+            if match is None:
+                continue
+
+            array_index = int(match.group(1)) if match.group(1) is not None else 0
+            if max_rss != '':
+                array_index_to_peak_memory_dict[array_index] = max(array_index_to_peak_memory_dict.get(array_index, 0.0), BaseCluster.memoryToKB(max_rss))
+
+            # the line without a step suffix is the task itself, e.g. 'CANCELLED by 123' only needs the first word
+            state = state.split(' ')[0]
+            if match.group(2) is None and state not in unfinished_states:
+                array_index_to_record_dict[array_index] = {'array_index': array_index, 'runtime_seconds': float(elapsed), 'cpu_time_seconds': BaseCluster.walltimeToSeconds(total_cpu), 'peak_memory_KB': 0.0, 'state': state}
+
+        list_of_records = []
+        for array_index in sorted(array_index_to_record_dict.keys()):
+            record = array_index_to_record_dict[array_index]
+            record['peak_memory_KB'] = array_index_to_peak_memory_dict.get(array_index, 0.0)
+            list_of_records.append(record)
+
+        return list_of_records
@@ -1,7 +1,10 @@
 from abc import ABCMeta, abstractmethod # Used to define abstract classes which is needed for the MGA class
-import random # Some of the instance methods from the WholeCellModelBase class need the random library
 import re
 import operator
+import bisect
+import time
+import concurrent.futures
+import types
 import numpy as np
 
 class MGA(metaclass=ABCMeta):
@@ -10,7 +13,7 @@ class MGA(metaclass=ABCMeta):
     
     This class will assume that all connections are child classes of the base_connection.Connection class and all job submissions and job submission management classes are children of the relavent base_cluster_submissions class.
     """
-    def __init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, temp_storage_path):
+    def __init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, temp_storage_path, random_seed = None):
         """
         This creates a basis for a multi-generation algorithm class.
 
@@ -19,6 +22,7 @@ class MGA(metaclass=ABCMeta):
             MGA_name (str): The name of the multi-generation algorithm to be used as labels and names and records etc.
             relative2clusterBasePath_simulation_output_path (str): Each cluster connection instance has a base path depending on the cluster. This is the base path (i.e. the initial directory of this multi-generation algorithm) that will be apended to the cluster base path. More sub-directories will be created for each generation etc.
             repetitions_of_a_unique_simulation (int): The number of times each simulation needs to be repeated.
+            random_seed (int or None): The seed that every random number used by the algorithm comes from (see getRandomGenerator). If None a seed is taken from the operating system and stored in self.random_seed so that the run can still be reproduced.
         """
         self.cluster_instances_dict = dict_of_cluster_instances
         self.generation_counter = None
@@ -35,6 +39,19 @@ class MGA(metaclass=ABCMeta):
         self.runSimulationsFuncName = runSimulationsFuncName
         self.runSims_params_dict = runSims_params_dict
         self.temp_storage_path = temp_storage_path
+        # records which cluster and which children each job submission of the current generation has (see createJobSubmissionInstances)
+        self.submission_key_to_cluster_dict = {}
+        self.submission_key_to_child_dict = {}
+        # children that were moved from one cluster to another by the work stealing coordinator. Keys are child names and values are dicts with keys 'from', 'to' and 'genome'.
+        self.stolen_children_dict = {}
+        # every random number comes from a stream of this seed sequence. self.random_generator is the stream that the mating and mutation methods use and is switched to a new stream for every child (see GeneticAlgorithmBase.breedChildren).
+        self.seed_sequence = np.random.SeedSequence(random_seed)
+        self.random_seed = self.seed_sequence.entropy
+        self.random_generator = np.random.Generator(np.random.PCG64(self.seed_sequence))
+        # islands get their own streams (0 means no island is active, see GeneticAlgorithmBase.swapIslandState)
+        self.active_island_number = 0
+        # the surrogate model used to pre-screen children before they are submitted (see preScreenChildren). This is created the first time children are pre-screened.
+        self.surrogate_model = None
 
     # instance methods
     def passFunction(self, *args):
@@ -51,6 +68,23 @@ class MGA(metaclass=ABCMeta):
         # generation counter is one too high so remove it
         self.generation_counter -= 1
 
+    def getRandomGenerator(self, *stream_keys):
+        """
+        Returns a numpy Generator for one independent stream of random numbers. The stream is worked out from the seed, the active island, the current generation and stream_keys alone, so the same stream is produced no matter which order the streams are asked for in or which process asks for them. This is what lets breeding be split across processes and still give exactly the same children for a given seed.
+
+        The streams used by this library are (0,) for picking parents, (1, child_idx) for breeding each child and (2,) for pre-screening children.
+
+        Args:
+            stream_keys (ints): Identify the stream within the generation.
+
+        Returns:
+            random_generator (numpy.random.Generator): A generator for the stream.
+        """
+        generation = 0 if self.generation_counter is None else self.generation_counter
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key = tuple(self.seed_sequence.spawn_key) + (self.active_island_number, generation) + tuple(stream_keys))
+
+        return np.random.Generator(np.random.PCG64(seed_sequence))
+
     def runSimulations(self, runSimulationsFuncDict, runSims_params_dict):
         return getattr(self, runSimulationsFuncDict)(runSims_params_dict)
 
@@ -62,7 +96,22 @@ class MGA(metaclass=ABCMeta):
         # get the new children
         # The child name (i.e. key) will be the name used to describe the individual child. The value must contaiin all the arguements neccessary to create a job on the cluster to simulate (or whatever else it might be) the child.
         child_name_to_genome_dict = self.getNewGenerationFunction(self.getNewGenerationFuncName, self.newGen_params_dict)
-        
+
+        # optionally drop the children that a surrogate model predicts will do badly
+        child_name_to_genome_dict = self.preScreenChildren(child_name_to_genome_dict, runSims_params_dict)
+
+        self.simulateChildren(child_name_to_genome_dict, runSims_params_dict)
+
+        return
+
+    def simulateChildren(self, child_name_to_genome_dict, runSims_params_dict):
+        """
+        Spreads some children across the clusters, submits them, waits for the submission manager and then runs the post simulation function on every submission.
+
+        Args:
+            child_name_to_genome_dict (dict): The children to simulate.
+            runSims_params_dict (dict): See standardRunSimulations.
+        """
         # spread the children across clusters
         child_name_to_genome_dict_per_cluster = self.spreadChildrenAcrossClusters(child_name_to_genome_dict)
 
@@ -70,36 +119,327 @@ class MGA(metaclass=ABCMeta):
         child_name_to_genome_dict_per_cluster = self.spreadChildrenAcrossJobs(child_name_to_genome_dict_per_cluster)
 
         # submit generation to the cluster
-        dict_of_job_submission_insts = {}
         dict_of_job_management_insts = {}
-        list_of_cluster_instance_keys = list(self.cluster_instances_dict.keys()) 
         # create submission instances
+        dict_of_job_submission_insts = self.createJobSubmissionInstances(child_name_to_genome_dict_per_cluster, runSims_params_dict)
+
+        # send all jobs to clusters 
+        self.submissionManager_params_dict['dict_of_job_submission_insts'] = dict_of_job_submission_insts
+        dict_of_job_management_insts = self.createSubmissionManagementInstance(self.submissionManagerFuncName, self.submissionManager_params_dict)
+
+        # convert list into the dict that the rest of the library is expecting
+        #dict_of_job_management_insts = {list_of_job_sub_dict_keys[idx]: list_of_dict_of_job_management_instances[idx] for idx in range(len(dict_of_job_submission_insts))}
+
+        # Perform all tasks neccessary after a generation of simulations has finished
+        for cluster_connection in dict_of_job_submission_insts.keys():
+            self.postSimulationFunction(runSims_params_dict['postSimulationFunctionFuncName'], dict_of_job_submission_insts[cluster_connection], dict_of_job_management_insts[cluster_connection], runSims_params_dict)
+
+        return
+
+    def workStealingRunSimulations(self, runSims_params_dict):
+        """
+        The same as standardRunSimulations except that once the generation has been submitted the clusters are watched and when one cluster runs out of work the tasks that are still waiting in the queue of a lagging cluster are cancelled and resubmitted to the idle cluster (see coordinateWorkStealing). This stops a whole generation waiting on one slow or stalled cluster.
+
+        NOTE: The submission manager function must return once the jobs have been submitted (like base_cluster_submissions.BaseManageSubmission.__init__ does) rather than waiting for them to finish, otherwise there is nothing left to steal by the time the coordinator starts.
+
+        Args:
+            runSims_params_dict (dict): The same as standardRunSimulations with the additional key 'workStealing_params_dict' which is a dict with keys 'poll_interval' (seconds between checking the queues) and 'max_children_to_steal' (the maximum number of children moved in one go).
+        """
+        child_name_to_genome_dict = self.getNewGenerationFunction(self.getNewGenerationFuncName, self.newGen_params_dict)
+        child_name_to_genome_dict = self.preScreenChildren(child_name_to_genome_dict, runSims_params_dict)
+        child_name_to_genome_dict_per_cluster = self.spreadChildrenAcrossClusters(child_name_to_genome_dict)
+        child_name_to_genome_dict_per_cluster = self.spreadChildrenAcrossJobs(child_name_to_genome_dict_per_cluster)
+        dict_of_job_submission_insts = self.createJobSubmissionInstances(child_name_to_genome_dict_per_cluster, runSims_params_dict)
+
+        # send all jobs to clusters
+        self.submissionManager_params_dict['dict_of_job_submission_insts'] = dict_of_job_submission_insts
+        dict_of_job_management_insts = self.createSubmissionManagementInstance(self.submissionManagerFuncName, self.submissionManager_params_dict)
+
+        # move work from lagging clusters to idle ones until everything has finished (this adds any new submissions to the two dicts)
+        self.coordinateWorkStealing(dict_of_job_submission_insts, dict_of_job_management_insts, runSims_params_dict)
+
+        # Perform all tasks neccessary after a generation of simulations has finished
+        for submission_key in dict_of_job_submission_insts.keys():
+            self.postSimulationFunction(runSims_params_dict['postSimulationFunctionFuncName'], dict_of_job_submission_insts[submission_key], dict_of_job_management_insts[submission_key], runSims_params_dict)
+
+        return
+
+    def createJobSubmissionInstances(self, child_name_to_genome_dict_per_cluster, runSims_params_dict):
+        """
+        Creates a job submission instance for every dictionary of children of every cluster and records which cluster and children each one has in self.submission_key_to_cluster_dict and self.submission_key_to_child_dict.
+
+        Args:
+            child_name_to_genome_dict_per_cluster (dict): Keys are cluster keys and values are lists of dicts of child names to genomes (see spreadChildrenAcrossJobs).
+            runSims_params_dict (dict): Must have the keys 'createJobSubmisions_params_dict' and 'createJobSubmissionFuncName'.
+
+        Returns:
+            dict_of_job_submission_insts (dict): Keys are of the form cluster_key + '_' + job number and values are the job submission instances.
+        """
+        dict_of_job_submission_insts = {}
+        self.submission_key_to_cluster_dict = {}
+        self.submission_key_to_child_dict = {}
+        self.stolen_children_dict = {}
+        list_of_cluster_instance_keys = list(self.cluster_instances_dict.keys()) 
         for cluster_connection in list_of_cluster_instance_keys:
+            # the island model submits to one cluster at a time
+            if cluster_connection not in child_name_to_genome_dict_per_cluster:
+                continue
+
             if type(child_name_to_genome_dict_per_cluster[cluster_connection]) is not list:
                 raise TypeError('child_name_to_genome_dict_per_cluster[cluster_connection] must be a list! This is because there can potentially be more than one dictionary of jobs passed to one cluster and so (even if there is only one ditionary) the dictionaries must be in a list. Here type(child_name_to_genome_dict_per_cluster[cluster_connection]) = ', type(child_name_to_genome_dict_per_cluster[cluster_connection]))
 
             inner_loop_counter = 1
             for single_child_name_to_genome_dict in child_name_to_genome_dict_per_cluster[cluster_connection]:
+                submission_key = cluster_connection + '_' + str(inner_loop_counter)
                 createJobSubmisions_params_dict = runSims_params_dict['createJobSubmisions_params_dict'].copy()
                 createJobSubmisions_params_dict['cluster_conn'] = self.cluster_instances_dict[cluster_connection]
-                createJobSubmisions_params_dict['single_child_name_to_genome_dict'] = single_child_name_to_genome_dict.copy()
-                dict_of_job_submission_insts[cluster_connection + '_' + str(inner_loop_counter)] = self.createJobSubmissionInstance(runSims_params_dict['createJobSubmissionFuncName'], createJobSubmisions_params_dict)
-                #, self.cluster_instances_dict[cluster_connection], single_child_name_to_genome_dict)
+                # the job submission gets its own (shallow) copy of the dict of children so that user code can change it without changing the record in self.submission_key_to_child_dict. Only the dict is copied, the genomes are shared.
+                createJobSubmisions_params_dict['single_child_name_to_genome_dict'] = dict(single_child_name_to_genome_dict)
+                dict_of_job_submission_insts[submission_key] = self.createJobSubmissionInstance(runSims_params_dict['createJobSubmissionFuncName'], createJobSubmisions_params_dict)
+                self.submission_key_to_cluster_dict[submission_key] = cluster_connection
+                self.submission_key_to_child_dict[submission_key] = single_child_name_to_genome_dict
                 inner_loop_counter += 1
 
-        # send all jobs to clusters 
-        self.submissionManager_params_dict['dict_of_job_submission_insts'] = dict_of_job_submission_insts
-        dict_of_job_management_insts = self.createSubmissionManagementInstance(self.submissionManagerFuncName, self.submissionManager_params_dict)
+        return dict_of_job_submission_insts
 
-        # convert list into the dict that the rest of the library is expecting
-        #dict_of_job_management_insts = {list_of_job_sub_dict_keys[idx]: list_of_dict_of_job_management_instances[idx] for idx in range(len(dict_of_job_submission_insts))}
+    ### METHODS FOR PRE-SCREENING CHILDREN
 
-        # Perform all tasks neccessary after a generation of simulations has finished
-        for cluster_connection in dict_of_job_submission_insts.keys():
-            self.postSimulationFunction(runSims_params_dict['postSimulationFunctionFuncName'], dict_of_job_submission_insts[cluster_connection], dict_of_job_management_insts[cluster_connection], runSims_params_dict)
+    def preScreenChildren(self, child_name_to_genome_dict, runSims_params_dict):
+        """
+        Uses a cheap surrogate model (see RidgeSurrogate) of all the genomes that have been scored so far to predict the fitness of the new children and only returns the children that are predicted to do best plus a random selection of the rest (so that the surrogate keeps learning about the parts of the search space it thinks are poor). The idea is that the new generation function over-generates candidates (i.e. the population size is set to several times the number of simulations you want to run) and only the promising ones cost any cluster time.
+
+        If runSims_params_dict has no 'preScreen_params_dict' key, or the surrogate has been trained on fewer than preScreen_params_dict['min_training_samples'] scores, all the children are returned unchanged. The surrogate is trained by GeneticAlgorithmBase.standardUpdateFittestPopulation.
+
+        Args:
+            child_name_to_genome_dict (dict): The candidate children. Genomes must be sequences of numbers of the same length.
+            runSims_params_dict (dict): Can have the key 'preScreen_params_dict' which is a dict with the keys 'submit_fraction' (the fraction of the candidates with the best predictions to keep), 'exploration_fraction' (the fraction of the candidates to pick at random from the rest), 'min_training_samples', 'ridge_penalty' and 'max_or_min'.
+
+        Returns:
+            child_name_to_genome_dict (dict): The children that should be submitted.
+        """
+        if 'preScreen_params_dict' not in runSims_params_dict:
+            return child_name_to_genome_dict
+
+        preScreen_params_dict = runSims_params_dict['preScreen_params_dict']
+        if self.surrogate_model is None:
+            self.surrogate_model = RidgeSurrogate(preScreen_params_dict['ridge_penalty'])
+
+        if self.surrogate_model.no_of_samples < preScreen_params_dict['min_training_samples'] or len(child_name_to_genome_dict) == 0:
+            return child_name_to_genome_dict
+
+        list_of_child_names = list(child_name_to_genome_dict.keys())
+        predicted_fitness = self.surrogate_model.predict([child_name_to_genome_dict[child_name] for child_name in list_of_child_names])
+        if preScreen_params_dict['max_or_min'] == 'max':
+            predicted_fitness = -predicted_fitness
+        elif preScreen_params_dict['max_or_min'] != 'min':
+            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', preScreen_params_dict['max_or_min'])
+
+        ordered_child_idxs = np.argsort(predicted_fitness, kind='stable')
+        no_of_best_children = int(np.ceil(preScreen_params_dict['submit_fraction'] * len(list_of_child_names)))
+        no_of_exploration_children = min(int(np.ceil(preScreen_params_dict['exploration_fraction'] * len(list_of_child_names))), len(list_of_child_names) - no_of_best_children)
+        list_of_child_idxs_to_keep = list(ordered_child_idxs[:no_of_best_children])
+        if no_of_exploration_children > 0:
+            list_of_child_idxs_to_keep += list(self.getRandomGenerator(2).choice(ordered_child_idxs[no_of_best_children:], no_of_exploration_children, replace=False))
+
+        list_of_child_idxs_to_keep.sort()
+        print('Pre-screening kept ', len(list_of_child_idxs_to_keep), ' of ', len(list_of_child_names), ' children')
+
+        return {list_of_child_names[idx]: child_name_to_genome_dict[list_of_child_names[idx]] for idx in list_of_child_idxs_to_keep}
+
+    ### METHODS FOR CANCELLING HOPELESS CHILDREN
+
+    def getAdmissionThreshold(self, max_or_min):
+        """
+        Returns the score that a child has to beat to be of any use. The base class doesn't keep a population so it has no threshold and nothing is ever terminated early. Child classes that keep a population of the fittest individuals should override this.
+
+        Args:
+            max_or_min (str): Either 'max' or 'min' depending on whether fitness is maximised or minimised.
+
+        Returns:
+            admission_threshold (float or None): None means every child could be useful.
+        """
+        return None
+
+    def terminateHopelessChildren(self, dict_of_job_submission_insts, dict_of_job_management_insts, runSims_params_dict):
+        """
+        Cancels the running children that report (see base_connection.BaseCluster.createProgressReportingLines) that the best score they could still get can't beat the admission threshold (see getAdmissionThreshold). The progress records are harvested once per cluster for all the submissions on that cluster and then each job management instance cancels its own hopeless array tasks (see base_cluster_submissions.BaseManageSubmission.terminateHopelessTasks) so that their cores go to the children still waiting.
+
+        This only does anything if runSims_params_dict has the key 'earlyTermination_params_dict' and it is called from the polling loops of workStealingRunSimulations and islandRunSimulations (standardRunSimulations hands the whole wait to the submission manager).
+
+        Args:
+            dict_of_job_submission_insts (dict): The job submission instances that might still be running.
+            dict_of_job_management_insts (dict): The corresponding job management instances.
+            runSims_params_dict (dict): Can have the key 'earlyTermination_params_dict' which is a dict with the keys 'progress_dir' (the directory relative to each cluster's base_output_path that the progress records are written to, i.e. the directory passed to createStandardSubmissionScriptList is cluster_conn.base_output_path + '/' + progress_dir), 'max_or_min', 'min_progress_fraction' and 'overallScoreFuncName' (see terminateHopelessTasks). Each child is judged on the optimistic bounds of all its repetitions (see getArrayIndexToChildNameDict) combined with the overall score method of the job management instances called overallScoreFuncName, which should be the same one that scores the finished children. earlyTermination_params_dict is passed to it as its second argument (in the same way that extractContender_params_dict is when the fittest population is updated) so it can hold any other keys that the method needs.
+
+        Returns:
+            submission_key_to_terminated_array_indices_dict (dict): Keys are submission keys and values are the array numbers cancelled by this call (submissions with nothing cancelled are left out).
+        """
+        if 'earlyTermination_params_dict' not in runSims_params_dict:
+            return {}
+
+        earlyTermination_params_dict = runSims_params_dict['earlyTermination_params_dict']
+        admission_threshold = self.getAdmissionThreshold(earlyTermination_params_dict['max_or_min'])
+        if admission_threshold is None:
+            return {}
+
+        # group the submissions by cluster so that each cluster's records are read in one connection
+        cluster_conn_to_submission_keys_dict = {}
+        for submission_key in dict_of_job_submission_insts.keys():
+            cluster_conn_to_submission_keys_dict.setdefault(dict_of_job_submission_insts[submission_key].cluster_connection, []).append(submission_key)
+
+        submission_key_to_terminated_array_indices_dict = {}
+        for cluster_conn, list_of_submission_keys in cluster_conn_to_submission_keys_dict.items():
+            progress_dir = cluster_conn.base_output_path + '/' + earlyTermination_params_dict['progress_dir']
+            list_of_job_numbers = []
+            for submission_key in list_of_submission_keys:
+                list_of_job_numbers.append(dict_of_job_submission_insts[submission_key].cluster_job_number)
+                list_of_job_numbers += [job_number for job_number, list_of_array_indices in dict_of_job_management_insts[submission_key].resubmissions]
+
+            job_number_to_progress_records_dict = cluster_conn.harvestProgressRecords(progress_dir, list_of_job_numbers)
+            for submission_key in list_of_submission_keys:
+                # all the repetitions of a child are judged (and cancelled) together
+                array_index_to_child_name_dict = self.getArrayIndexToChildNameDict(submission_key, dict_of_job_submission_insts[submission_key])
+                list_of_terminated_array_indices = dict_of_job_management_insts[submission_key].terminateHopelessTasks(progress_dir, admission_threshold, earlyTermination_params_dict['max_or_min'], earlyTermination_params_dict['min_progress_fraction'], job_number_to_progress_records_dict, array_index_to_child_name_dict, earlyTermination_params_dict['overallScoreFuncName'], earlyTermination_params_dict)
+                if len(list_of_terminated_array_indices) > 0:
+                    submission_key_to_terminated_array_indices_dict[submission_key] = list_of_terminated_array_indices
+
+        return submission_key_to_terminated_array_indices_dict
+
+    ### METHODS FOR MOVING WORK BETWEEN CLUSTERS
+
+    def coordinateWorkStealing(self, dict_of_job_submission_insts, dict_of_job_management_insts, runSims_params_dict):
+        """
+        Watches the queues of all the clusters until every job of the generation has left the queue. Whenever a cluster has nothing left in its queue and another cluster still has array tasks that haven't started, the waiting tasks are cancelled on the lagging cluster and their children are resubmitted to the idle cluster. New submissions are added to dict_of_job_submission_insts and dict_of_job_management_insts.
+
+        Args:
+            dict_of_job_submission_insts (dict): The job submission instances of this generation (see createJobSubmissionInstances).
+            dict_of_job_management_insts (dict): The corresponding job management instances.
+            runSims_params_dict (dict): Must have the key 'workStealing_params_dict' (see workStealingRunSimulations).
+        """
+        workStealing_params_dict = runSims_params_dict['workStealing_params_dict']
+        steal_counter = 1
+        while True:
+            # take a snapshot of every queue
+            cluster_to_no_of_tasks_in_queue_dict = {cluster: 0 for cluster in self.cluster_instances_dict.keys()}
+            cluster_to_pending_tasks_list_dict = {cluster: [] for cluster in self.cluster_instances_dict.keys()}
+            for submission_key in dict_of_job_submission_insts.keys():
+                cluster = self.submission_key_to_cluster_dict[submission_key]
+                cluster_conn = self.cluster_instances_dict[cluster]
+                job_number = dict_of_job_submission_insts[submission_key].cluster_job_number
+                list_of_tasks_in_queue = cluster_conn.getArrayIndicesFromQueueStdOut(cluster_conn.checkQueue(job_number)['stdout'])
+                cluster_to_no_of_tasks_in_queue_dict[cluster] += len(list_of_tasks_in_queue)
+                if len(list_of_tasks_in_queue) > 0:
+                    list_of_pending_tasks = cluster_conn.getArrayIndicesFromQueueStdOut(cluster_conn.checkPendingArrayTasks(job_number)['stdout'])
+                    if len(list_of_pending_tasks) > 0:
+                        cluster_to_pending_tasks_list_dict[cluster].append((submission_key, list_of_pending_tasks))
+
+            if sum(cluster_to_no_of_tasks_in_queue_dict.values()) == 0:
+                break
+
+            # pair each idle cluster with the cluster that has the most waiting tasks
+            list_of_idle_clusters = [cluster for cluster in cluster_to_no_of_tasks_in_queue_dict.keys() if cluster_to_no_of_tasks_in_queue_dict[cluster] == 0]
+            list_of_lagging_clusters = sorted([cluster for cluster in cluster_to_pending_tasks_list_dict.keys() if len(cluster_to_pending_tasks_list_dict[cluster]) > 0], key = lambda cluster: sum([len(pending) for key, pending in cluster_to_pending_tasks_list_dict[cluster]]), reverse = True)
+            for idle_cluster, lagging_cluster in zip(list_of_idle_clusters, list_of_lagging_clusters):
+                stolen_child_name_to_genome_dict = self.cancelPendingChildren(lagging_cluster, cluster_to_pending_tasks_list_dict[lagging_cluster], dict_of_job_submission_insts, min(workStealing_params_dict['max_children_to_steal'], self.cluster_instances_dict[idle_cluster].max_array_size))
+                if len(stolen_child_name_to_genome_dict) == 0:
+                    continue
+
+                new_submission_key = idle_cluster + '_stolen_' + str(steal_counter)
+                steal_counter += 1
+                print('Moving ', len(stolen_child_name_to_genome_dict), ' children from ', lagging_cluster, ' to ', idle_cluster, ' (', new_submission_key, ')')
+                createJobSubmisions_params_dict = runSims_params_dict['createJobSubmisions_params_dict'].copy()
+                createJobSubmisions_params_dict['cluster_conn'] = self.cluster_instances_dict[idle_cluster]
+                createJobSubmisions_params_dict['single_child_name_to_genome_dict'] = dict(stolen_child_name_to_genome_dict)
+                dict_of_job_submission_insts[new_submission_key] = self.createJobSubmissionInstance(runSims_params_dict['createJobSubmissionFuncName'], createJobSubmisions_params_dict)
+                self.submission_key_to_cluster_dict[new_submission_key] = idle_cluster
+                self.submission_key_to_child_dict[new_submission_key] = stolen_child_name_to_genome_dict
+                for child_name in stolen_child_name_to_genome_dict.keys():
+                    self.stolen_children_dict[child_name]['to'] = new_submission_key
+
+                submissionManager_params_dict = self.submissionManager_params_dict.copy()
+                submissionManager_params_dict['dict_of_job_submission_insts'] = {new_submission_key: dict_of_job_submission_insts[new_submission_key]}
+                dict_of_job_management_insts.update(self.createSubmissionManagementInstance(self.submissionManagerFuncName, submissionManager_params_dict))
+
+            # cancel children that can't get into the fittest population so that their cores go to the children still waiting
+            self.terminateHopelessChildren(dict_of_job_submission_insts, dict_of_job_management_insts, runSims_params_dict)
+            time.sleep(workStealing_params_dict['poll_interval'])
 
         return
 
+    def cancelPendingChildren(self, cluster, list_of_pending_tasks, dict_of_job_submission_insts, max_no_of_children):
+        """
+        Cancels the array tasks of up to max_no_of_children children on a cluster. Only children whose array tasks are all still waiting in the queue are cancelled and the children at the end of the arrays are taken first (since they would have started last).
+
+        A task can finish in between checking the queue and cancelling it, in which case both the original and the new copy of the child produce results. To make sure that the child is only recorded once every moved child is added to the stolen_child_name_to_genome_dict of the original submission instance and the results of their genomes from the original submission are ignored by standardUpdateFittestPopulation (see the stolen_genomes of the submission instance). The results are keyed by genome and so if a child that is left in the submission has the same genome as a moved child then that genome's results are kept.
+
+        Args:
+            cluster (str): The key of the lagging cluster.
+            list_of_pending_tasks (list of tuples): Each tuple is (submission_key, list_of_pending_array_indices).
+            dict_of_job_submission_insts (dict): The job submission instances of this generation.
+            max_no_of_children (int): The maximum number of children to cancel.
+
+        Returns:
+            stolen_child_name_to_genome_dict (dict): The children that were cancelled and need to be resubmitted.
+        """
+        cluster_conn = self.cluster_instances_dict[cluster]
+        stolen_child_name_to_genome_dict = {}
+        for submission_key, list_of_pending_array_indices in list_of_pending_tasks:
+            if len(stolen_child_name_to_genome_dict) >= max_no_of_children:
+                break
+
+            submission_inst = dict_of_job_submission_insts[submission_key]
+            array_index_to_child_name_dict = self.getArrayIndexToChildNameDict(submission_key, submission_inst)
+            child_name_to_array_indices_dict = {}
+            for array_index in array_index_to_child_name_dict.keys():
+                child_name_to_array_indices_dict.setdefault(array_index_to_child_name_dict[array_index], []).append(array_index)
+
+            set_of_pending_array_indices = set(list_of_pending_array_indices)
+            list_of_movable_children = [child_name for child_name in child_name_to_array_indices_dict.keys() if set(child_name_to_array_indices_dict[child_name]).issubset(set_of_pending_array_indices) and child_name not in self.stolen_children_dict]
+            list_of_movable_children.sort(key = lambda child_name: max(child_name_to_array_indices_dict[child_name]), reverse = True)
+            list_of_children_to_move = list_of_movable_children[:max_no_of_children - len(stolen_child_name_to_genome_dict)]
+            if len(list_of_children_to_move) == 0:
+                continue
+
+            list_of_array_indices_to_cancel = sorted([array_index for child_name in list_of_children_to_move for array_index in child_name_to_array_indices_dict[child_name]])
+            cluster_conn.cancelArrayTasks(submission_inst.cluster_job_number, list_of_array_indices_to_cancel)
+            for child_name in list_of_children_to_move:
+                genome = self.submission_key_to_child_dict[submission_key][child_name]
+                stolen_child_name_to_genome_dict[child_name] = genome
+                submission_inst.stolen_child_name_to_genome_dict[child_name] = genome
+                self.stolen_children_dict[child_name] = {'from': submission_key, 'to': None, 'genome': self.getGenomeKey(genome)}
+
+            # only the genomes that no child left in the submission has are ignored
+            set_of_kept_genomes = set([self.getGenomeKey(genome) for child_name, genome in self.submission_key_to_child_dict[submission_key].items() if child_name not in submission_inst.stolen_child_name_to_genome_dict])
+            submission_inst.stolen_genomes = set([self.getGenomeKey(genome) for genome in submission_inst.stolen_child_name_to_genome_dict.values()]) - set_of_kept_genomes
+
+        return stolen_child_name_to_genome_dict
+
+    def getArrayIndexToChildNameDict(self, submission_key, submission_inst):
+        """
+        Returns which child each array number of a submission simulates. If the submission instance has an array_index_to_child_name_dict then that is used, otherwise each child is assumed to have self.reps_of_unique_sim consecutive array numbers in the order the children were passed to the submission, i.e. the k-th child has the array numbers (k - 1) * self.reps_of_unique_sim + 1 to k * self.reps_of_unique_sim (with one repetition array number 1 is the first child, array number 2 the second etc). Submissions that lay out their array differently must set array_index_to_child_name_dict.
+
+        Args:
+            submission_key (str): The key of the submission in self.submission_key_to_child_dict.
+            submission_inst (BaseJobSubmission): The job submission instance.
+
+        Returns:
+            array_index_to_child_name_dict (dict): Keys are array numbers (int) and values are child names.
+        """
+        if submission_inst.array_index_to_child_name_dict is not None:
+            array_index_to_child_name_dict = submission_inst.array_index_to_child_name_dict
+        else:
+            list_of_child_names = list(self.submission_key_to_child_dict[submission_key].keys())
+            array_index_to_child_name_dict = {child_idx * self.reps_of_unique_sim + rep_idx + 1: list_of_child_names[child_idx] for child_idx in range(len(list_of_child_names)) for rep_idx in range(self.reps_of_unique_sim)}
+
+        return array_index_to_child_name_dict
+
+    @staticmethod
+    def getGenomeKey(genome):
+        """
+        Returns a hashable key for a genome that is equal for equal genomes (e.g. for sets of genomes or dict keys). A KnockoutGenome is its own key because tuple() would turn it into a full length dense tuple, which is exactly the memory and hashing cost it exists to avoid. Other genomes (e.g. lists) are turned into tuples.
+        """
+        return genome if type(genome) is KnockoutGenome else tuple(genome)
+
     def getNewGenerationFunction(self, getNewGenerationFuncName, newGen_params_dict):
         return getattr(self, getNewGenerationFuncName)(newGen_params_dict)
 
@@ -121,7 +461,7 @@ class MGA(metaclass=ABCMeta):
  
     def stopAfterNoProgress(self, max_no_of_gens_without_improvement):
         stop_algorithm = False
-        progress_record = self.progress_record.copy()
+        progress_record = self.progress_record
         if progress_record['no_of_generations_of_no_progress'] > max_no_of_gens_without_improvement:
             stop_algorithm = True
 
@@ -206,57 +546,646 @@ class MGA(metaclass=ABCMeta):
             if len(child_name_to_genome_dict_per_cluster[cluster]) <= self.cluster_instances_dict[cluster].max_array_size:
                 child_name_to_set_dict_per_job_per_cluster[cluster] = [child_name_to_genome_dict_per_cluster[cluster]]
             else:
-                list_of_children_names = list(child_name_to_genome_dict_per_cluster[cluster].keys())
-                # create a list of lists where each inner-list is a set of self.cluster_instances_dict[cluster].max_array_size children names - excpet the last one which could be a remainder
-                children_names_split = [list_of_children_names[i:i + self.cluster_instances_dict[cluster].max_array_size] for i in range(0, len(list_of_children_names), self.cluster_instances_dict[cluster].max_array_size)]
-                # This is a dictionary comprehension inside a list comprehension. The list comprehension loops through each inner-list from list_of_children_names and presents it to the dictionary comprehension. The dictionary comprehension then loops through each of the elements inside inner-list and creates a dictionary of children names to sets. This results in a list of dictionaries.
-                child_name_to_set_dict_per_job_per_cluster[cluster] = [{child_name: child_name_to_genome_dict_per_cluster[cluster][child_name] for child_name in child_name_set} for child_name_set in children_names_split]
+                list_of_children_names = list(child_name_to_genome_dict_per_cluster[cluster].keys())
+                # create a list of lists where each inner-list is a set of self.cluster_instances_dict[cluster].max_array_size children names - excpet the last one which could be a remainder
+                children_names_split = [list_of_children_names[i:i + self.cluster_instances_dict[cluster].max_array_size] for i in range(0, len(list_of_children_names), self.cluster_instances_dict[cluster].max_array_size)]
+                # This is a dictionary comprehension inside a list comprehension. The list comprehension loops through each inner-list from list_of_children_names and presents it to the dictionary comprehension. The dictionary comprehension then loops through each of the elements inside inner-list and creates a dictionary of children names to sets. This results in a list of dictionaries.
+                child_name_to_set_dict_per_job_per_cluster[cluster] = [{child_name: child_name_to_genome_dict_per_cluster[cluster][child_name] for child_name in child_name_set} for child_name_set in children_names_split]
+
+        return child_name_to_set_dict_per_job_per_cluster
+
+    # METHODS RELATED TO SENDING JOBS TO CLUSTERS
+
+    def createJobSubmissionInstance(self, createJobSubmissionFuncName, jobSubmission_params_dict):
+        return getattr(self, createJobSubmissionFuncName)(jobSubmission_params_dict)
+
+    def createSubmissionManagementInstance(self, createSubmissionManagerFuncName, submissionManager_params_dict):
+        return getattr(self, createSubmissionManagerFuncName)(submissionManager_params_dict)
+
+    def postSimulationFunction(self, postSimulationFunctionFuncName, job_submission_info, job_manage_info, postSimulationFunc_params_dict):
+        return getattr(self, postSimulationFunctionFuncName)(job_submission_info, job_manage_info, postSimulationFunc_params_dict)
+
+class KnockoutGenome():
+    """
+    A sparse genome for genomes that are mostly 1s with a few knocked out (0) genes. Only the genome length and the sorted indices of the knocked out genes are stored and the hash is worked out once when the genome is created, so using KnockoutGenomes as the keys of GeneticAlgorithmBase.fittest_individuals costs memory and hashing time proportional to the number of knockouts rather than the length of the genome.
+
+    KnockoutGenomes are immutable (so copy just returns the same genome) and the mating and mutation methods return new genomes. len, indexing and iterating behave like the dense genome so code written for dense genomes still works, just without the savings. Use GeneticAlgorithmBase.sparseSliceMate, sparseMixMate, sparseUniformMutation and sparseExponentialMutation to breed them.
+    """
+    __slots__ = ('genome_length', 'knockouts', 'genome_hash')
+
+    def __init__(self, genome_length, knockouts = ()):
+        """
+        Args:
+            genome_length (int): The number of genes in the genome.
+            knockouts (iterable of ints): The indices of the knocked out genes.
+        """
+        knockouts = tuple(sorted(set(knockouts)))
+        if len(knockouts) > 0 and (knockouts[0] < 0 or knockouts[-1] >= genome_length):
+            raise ValueError('Knockout indices must be between 0 and genome_length - 1. Here genome_length = ', genome_length, ' and knockouts = ', knockouts)
+
+        self.genome_length = genome_length
+        self.knockouts = knockouts
+        self.genome_hash = hash((genome_length, knockouts))
+
+    @classmethod
+    def fromDense(cls, dense_genome):
+        """
+        Creates a KnockoutGenome from a dense genome of 0s and 1s.
+        """
+        list_of_knockouts = []
+        for idx in range(len(dense_genome)):
+            if dense_genome[idx] == 0:
+                list_of_knockouts.append(idx)
+            elif dense_genome[idx] != 1:
+                raise ValueError('A dense genome can only contain 0s and 1s to be converted into a KnockoutGenome. Here dense_genome[', idx, '] = ', dense_genome[idx])
+
+        return cls(len(dense_genome), list_of_knockouts)
+
+    def toDense(self):
+        """
+        Returns the genome as a list of 0s and 1s.
+        """
+        dense_genome = [1] * self.genome_length
+        for idx in self.knockouts:
+            dense_genome[idx] = 0
+
+        return dense_genome
+
+    def flipGenes(self, gene_idxs_to_flip):
+        """
+        Returns a new genome where the given genes have been flipped (knocked out genes are put back and the others are knocked out).
+        """
+        return KnockoutGenome(self.genome_length, set(self.knockouts).symmetric_difference(gene_idxs_to_flip))
+
+    def copy(self):
+        return self
+
+    def __hash__(self):
+        return self.genome_hash
+
+    def __eq__(self, other):
+        if type(other) is not KnockoutGenome:
+            return NotImplemented
+
+        return (self.genome_hash == other.genome_hash) and (self.genome_length == other.genome_length) and (self.knockouts == other.knockouts)
+
+    def __len__(self):
+        return self.genome_length
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.genome_length
+
+        if idx < 0 or idx >= self.genome_length:
+            raise IndexError('KnockoutGenome index out of range')
+
+        knockout_idx = bisect.bisect_left(self.knockouts, idx)
+
+        return 0 if knockout_idx < len(self.knockouts) and self.knockouts[knockout_idx] == idx else 1
+
+    def __iter__(self):
+        return iter(self.toDense())
+
+    def __repr__(self):
+        return 'KnockoutGenome(' + str(self.genome_length) + ', ' + str(self.knockouts) + ')'
+
+class DiversityMonitor():
+    """
+    Keeps track of how diverse a population of binary genomes (dense 0/1 genomes or KnockoutGenomes) is. For every gene it counts how many individuals have the gene knocked out (i.e. equal to 0) and these counts are updated as individuals join and leave the population, so an update only costs time proportional to the number of individuals that changed (and, for KnockoutGenomes, only to their number of knockouts).
+
+    Everything else follows from the counts. In particular the mean Hamming distance over all pairs of individuals is sum_g z_g (n - z_g) / (n (n - 1) / 2), where z_g is the number of individuals with gene g knocked out and n is the population size, so it doesn't need any pairwise comparisons.
+    """
+    def __init__(self):
+        self.no_of_individuals = 0
+        self.knockout_counts = None
+        self.genome_length = None
+
+    def update(self, list_of_added_genomes, list_of_removed_genomes = ()):
+        """
+        Adds the genomes that joined the population and removes the ones that left. The monitor doesn't keep the population itself (comparing it with the new population would mean hashing every genome on every update) so the caller must pass exactly the genomes that changed, e.g. a genome that is already in the population must not be added again.
+
+        Args:
+            list_of_added_genomes (iterable): The genomes that joined the population.
+            list_of_removed_genomes = () (iterable): The genomes that left the population.
+        """
+        for genome in list_of_removed_genomes:
+            self.changeCounts(genome, -1)
+            self.no_of_individuals -= 1
+        for genome in list_of_added_genomes:
+            self.changeCounts(genome, 1)
+            self.no_of_individuals += 1
+
+        return
+
+    def changeCounts(self, genome, change):
+        if type(genome) is KnockoutGenome:
+            genome_length = genome.genome_length
+            knockout_idxs = list(genome.knockouts)
+        else:
+            genome_length = len(genome)
+            knockout_idxs = np.flatnonzero(np.asarray(genome) == 0)
+
+        if self.knockout_counts is None:
+            self.genome_length = genome_length
+            self.knockout_counts = np.zeros(genome_length, dtype=np.int64)
+        elif genome_length != self.genome_length:
+            raise ValueError('All the genomes in the population must have the same length. Here self.genome_length = ', self.genome_length, ' and len(genome) = ', genome_length)
+
+        self.knockout_counts[knockout_idxs] += change
+
+        return
+
+    def getAlleleFrequencies(self):
+        """
+        Returns the fraction of the population that has each gene (i.e. has it equal to 1).
+        """
+        return 1.0 - self.knockout_counts / self.no_of_individuals
+
+    def getMeanPairwiseHammingDistance(self):
+        """
+        Returns the mean number of genes that differ between two different individuals of the population (0 if there are fewer than two).
+        """
+        no_of_individuals = self.no_of_individuals
+        if no_of_individuals < 2:
+            return 0.0
+
+        return float(np.sum(self.knockout_counts * (no_of_individuals - self.knockout_counts)) / (no_of_individuals * (no_of_individuals - 1) / 2))
+
+    def getMeanEntropy(self):
+        """
+        Returns the Shannon entropy (in bits) of each gene averaged over the genes. This is 1 when every gene is present in half of the population and 0 when the population is identical.
+        """
+        allele_frequencies = self.getAlleleFrequencies()
+        entropies = np.zeros(len(allele_frequencies))
+        mixed_genes = (allele_frequencies > 0) & (allele_frequencies < 1)
+        frequencies = allele_frequencies[mixed_genes]
+        entropies[mixed_genes] = -(frequencies * np.log2(frequencies) + (1 - frequencies) * np.log2(1 - frequencies))
+
+        return float(np.mean(entropies))
+
+    def getDiversityRecord(self):
+        """
+        Returns a summary of the diversity of the population.
+
+        Returns:
+            diversity_record (dict): Has the keys 'no_of_individuals', 'mean_hamming_distance', 'normalised_hamming_distance' (the mean Hamming distance divided by the genome length) and 'mean_entropy'.
+        """
+        if self.knockout_counts is None or self.no_of_individuals == 0:
+            return {'no_of_individuals': 0, 'mean_hamming_distance': 0.0, 'normalised_hamming_distance': 0.0, 'mean_entropy': 0.0}
+
+        mean_hamming_distance = self.getMeanPairwiseHammingDistance()
+
+        return {'no_of_individuals': self.no_of_individuals, 'mean_hamming_distance': mean_hamming_distance, 'normalised_hamming_distance': mean_hamming_distance / self.genome_length, 'mean_entropy': self.getMeanEntropy()}
+
+class AliasTable():
+    """
+    Walker's alias method (Vose's version) for drawing from a discrete distribution. Building the table takes O(N) and then every draw takes O(1) no matter how many outcomes there are, unlike np.random.choice with p=... which rebuilds the cumulative distribution and searches it on every call. Draws are vectorised so thousands of parents can be drawn at once.
+    """
+    def __init__(self, probabilities):
+        """
+        Args:
+            probabilities (sequence of floats): The (not necessarily normalised) probability of each outcome.
+        """
+        probabilities = np.asarray(probabilities, dtype=float)
+        if len(probabilities) == 0 or np.any(probabilities < 0) or not np.isfinite(probabilities.sum()) or probabilities.sum() <= 0:
+            raise ValueError('probabilities must be a non-empty sequence of non-negative numbers with a positive sum. Here probabilities = ', probabilities)
+
+        no_of_outcomes = len(probabilities)
+        scaled_probabilities = probabilities * no_of_outcomes / probabilities.sum()
+        self.no_of_outcomes = no_of_outcomes
+        self.no_of_possible_outcomes = int(np.count_nonzero(probabilities))
+        self.acceptance_probabilities = np.ones(no_of_outcomes)
+        self.aliases = np.arange(no_of_outcomes)
+        list_of_small = [idx for idx in range(no_of_outcomes) if scaled_probabilities[idx] < 1.0]
+        list_of_large = [idx for idx in range(no_of_outcomes) if scaled_probabilities[idx] >= 1.0]
+        while len(list_of_small) > 0 and len(list_of_large) > 0:
+            small_idx = list_of_small.pop()
+            large_idx = list_of_large[-1]
+            self.acceptance_probabilities[small_idx] = scaled_probabilities[small_idx]
+            self.aliases[small_idx] = large_idx
+            scaled_probabilities[large_idx] -= 1.0 - scaled_probabilities[small_idx]
+            if scaled_probabilities[large_idx] < 1.0:
+                list_of_small.append(list_of_large.pop())
+
+        # whatever is left over only differs from 1 by rounding errors
+        for idx in list_of_small + list_of_large:
+            self.acceptance_probabilities[idx] = 1.0
+
+    def sample(self, size, random_generator = None):
+        """
+        Draws outcomes from the table.
+
+        Args:
+            size (int): The number of draws.
+            random_generator: Anything with a random(size) method that gives uniform floats in [0, 1). Defaults to the np.random module.
+
+        Returns:
+            outcomes (numpy array of ints): The indices of the drawn outcomes.
+        """
+        if random_generator is None:
+            random_generator = np.random
+
+        # one uniform number per draw gives both the column (its integer part) and the coin flip (its fractional part)
+        scaled_uniforms = random_generator.random(size) * self.no_of_outcomes
+        columns = np.minimum(scaled_uniforms.astype(int), self.no_of_outcomes - 1)
+        coin_flips = scaled_uniforms - columns
+        outcomes = np.where(coin_flips < self.acceptance_probabilities[columns], columns, self.aliases[columns])
+
+        return outcomes
+
+    def samplePairs(self, no_of_pairs, random_generator = None):
+        """
+        Draws pairs of different outcomes (e.g. two parents). The second of a pair is redrawn until it differs from the first.
+
+        Returns:
+            first_outcomes, second_outcomes (numpy arrays of ints): The pairs.
+        """
+        if self.no_of_possible_outcomes < 2:
+            raise ValueError('At least two outcomes need a non-zero probability to draw pairs of different outcomes. Here there are ', self.no_of_possible_outcomes)
+
+        first_outcomes = self.sample(no_of_pairs, random_generator)
+        second_outcomes = self.sample(no_of_pairs, random_generator)
+        same_idxs = np.flatnonzero(first_outcomes == second_outcomes)
+        while len(same_idxs) > 0:
+            second_outcomes[same_idxs] = self.sample(len(same_idxs), random_generator)
+            same_idxs = same_idxs[first_outcomes[same_idxs] == second_outcomes[same_idxs]]
+
+        return first_outcomes, second_outcomes
+
+class RidgeSurrogate():
+    """
+    A ridge regression of fitness on the genes of a genome that is cheap enough to be retrained every generation. Only the sufficient statistics X^T X and X^T y are kept (where the rows of X are genomes with an extra constant 1 for the intercept and y are the fitness scores) so adding new scores costs O(no_of_new_scores * genome_length^2) and refitting costs O(genome_length^3) no matter how many genomes have been scored.
+
+    If a genome that has already been observed is observed again its old score is replaced with the new one (the overall score of a genome changes as more repetitions come in, see GeneticAlgorithmBase.standardUpdateFittestPopulation). Since the genome itself hasn't changed only X^T y needs updating.
+    """
+    def __init__(self, ridge_penalty = 1.0):
+        self.ridge_penalty = ridge_penalty
+        self.no_of_samples = 0
+        self.xtx = None
+        self.xty = None
+        self.weights = None
+        self.genome_to_score_dict = {}
+
+    def addObservations(self, list_of_genomes, list_of_scores):
+        """
+        Adds the scores of some genomes to the training data. The model is refitted the next time predict is called.
+
+        Args:
+            list_of_genomes (list): Genomes as sequences of numbers of the same length.
+            list_of_scores (list of floats): The fitness of each genome.
+        """
+        list_of_new_rows = []
+        list_of_new_scores = []
+        for genome, score in zip(list_of_genomes, list_of_scores):
+            genome_key = genome if type(genome) is KnockoutGenome else tuple(genome)
+            if genome_key in self.genome_to_score_dict:
+                if self.xty is not None:
+                    self.xty += self.getDesignMatrix([genome_key])[0] * (score - self.genome_to_score_dict[genome_key])
+            else:
+                list_of_new_rows.append(genome_key)
+                list_of_new_scores.append(score)
+
+            self.genome_to_score_dict[genome_key] = score
+
+        if len(list_of_new_rows) > 0:
+            design_matrix = self.getDesignMatrix(list_of_new_rows)
+            if self.xtx is None:
+                self.xtx = np.zeros((design_matrix.shape[1], design_matrix.shape[1]))
+                self.xty = np.zeros(design_matrix.shape[1])
+
+            self.xtx += design_matrix.T @ design_matrix
+            self.xty += design_matrix.T @ np.asarray(list_of_new_scores, dtype=float)
+            self.no_of_samples += len(list_of_new_rows)
+
+        self.weights = None
+
+        return
+
+    def predict(self, list_of_genomes):
+        """
+        Predicts the fitness of some genomes.
+
+        Args:
+            list_of_genomes (list): Genomes as sequences of numbers of the same length as the training genomes.
+
+        Returns:
+            predictions (numpy array): The predicted fitness of each genome.
+        """
+        if self.xtx is None:
+            raise ValueError('The surrogate model can\'t make predictions until it has been given some observations. Here self.no_of_samples = ', self.no_of_samples)
+
+        if self.weights is None:
+            # the intercept (the last column) isn't penalised
+            penalty = self.ridge_penalty * np.eye(self.xtx.shape[0])
+            penalty[-1, -1] = 0.0
+            self.weights = np.linalg.solve(self.xtx + penalty + 1e-9 * np.eye(self.xtx.shape[0]), self.xty)
+
+        return self.getDesignMatrix(list_of_genomes) @ self.weights
+
+    @staticmethod
+    def getDesignMatrix(list_of_genomes):
+        design_matrix = np.ones((len(list_of_genomes), len(list_of_genomes[0]) + 1))
+        if type(list_of_genomes[0]) is KnockoutGenome:
+            for row_idx in range(len(list_of_genomes)):
+                design_matrix[row_idx, list(list_of_genomes[row_idx].knockouts)] = 0.0
+        else:
+            design_matrix[:, :-1] = np.asarray(list_of_genomes, dtype=float)
+
+        return design_matrix
+
+class ParetoArchive():
+    """
+    An archive of individuals with several objectives that ranks them by Pareto front (front 0 is the non-dominated individuals, front 1 is the individuals that are only dominated by front 0 etc.) and by crowding distance within a front, as in NSGA-II. It is used by GeneticAlgorithmBase.paretoUpdateFittestPopulation.
+
+    The fronts are found with a non-dominated sort that sorts the individuals lexicographically and then puts each individual into the first front that doesn't dominate it using a binary search over the fronts (ENS-BS). With two objectives only the last individual added to a front needs checking so the whole sort is O(N log N). With three objectives each front keeps a staircase of its other two objectives so each check is a bisection and the sort is O(N log^2 N). With more objectives each check is against the members of one front (vectorised with NumPy), which is still far below the O(M N^2) of the original NSGA-II sort unless most individuals are in a few very large fronts. Crowding distances take O(M N log N).
+    """
+    def __init__(self, max_or_min):
+        """
+        Args:
+            max_or_min (str or tuple of str): Either 'max' or 'min' for all the objectives or a tuple with 'max' or 'min' for each objective.
+        """
+        self.max_or_min = max_or_min
+        self.list_of_genomes = []
+        self.genome_to_row_dict = {}
+        # objectives are stored so that every objective is minimised
+        self.objectives = None
+        self.objective_signs = None
+        self.front_ranks = np.zeros(0, dtype=int)
+        self.crowding_distances = np.zeros(0)
+
+    def addIndividuals(self, genome_to_objectives_dict):
+        """
+        Adds new individuals to the archive and re-ranks it. If a genome is already in the archive its objectives are replaced with the new ones.
+
+        Args:
+            genome_to_objectives_dict (dict): Keys are genomes and values are sequences of objective values (the same number of objectives for every genome).
+
+        Returns:
+            list_of_new_genomes (list): The genomes that weren't already in the archive.
+        """
+        if len(genome_to_objectives_dict) == 0:
+            return []
+
+        if self.objective_signs is None:
+            no_of_objectives = len(next(iter(genome_to_objectives_dict.values())))
+            list_of_max_or_min = [self.max_or_min] * no_of_objectives if type(self.max_or_min) is str else list(self.max_or_min)
+            if len(list_of_max_or_min) != no_of_objectives or not set(list_of_max_or_min).issubset({'max', 'min'}):
+                raise ValueError('max_or_min must be either \'max\', \'min\' or a tuple of them with one for each objective. Here max_or_min = ', self.max_or_min, ' and there are ', no_of_objectives, ' objectives')
+
+            self.objective_signs = np.array([-1.0 if direction == 'max' else 1.0 for direction in list_of_max_or_min])
+            self.objectives = np.zeros((0, no_of_objectives))
+
+        list_of_new_rows = []
+        list_of_new_genomes = []
+        for genome in genome_to_objectives_dict.keys():
+            objectives = np.asarray(genome_to_objectives_dict[genome], dtype=float) * self.objective_signs
+            if genome in self.genome_to_row_dict:
+                self.objectives[self.genome_to_row_dict[genome]] = objectives
+            else:
+                self.genome_to_row_dict[genome] = len(self.list_of_genomes) + len(list_of_new_rows)
+                self.list_of_genomes.append(genome)
+                list_of_new_genomes.append(genome)
+                list_of_new_rows.append(objectives)
+
+        if len(list_of_new_rows) > 0:
+            self.objectives = np.vstack([self.objectives, np.array(list_of_new_rows)])
+
+        self.front_ranks = self.getFrontRanks(self.objectives)
+        self.crowding_distances = self.getCrowdingDistances(self.objectives, self.front_ranks)
+
+        return list_of_new_genomes
+
+    def truncate(self, max_no_of_individuals):
+        """
+        Keeps the max_no_of_individuals best individuals (lowest front first and then the largest crowding distance within a front).
+
+        Returns:
+            list_of_removed_genomes (list): The genomes that were removed.
+        """
+        if len(self.list_of_genomes) <= max_no_of_individuals:
+            return []
+
+        order = self.getOrder()
+        list_of_removed_genomes = [self.list_of_genomes[row] for row in order[max_no_of_individuals:]]
+        rows_to_keep = np.sort(order[:max_no_of_individuals])
+        self.list_of_genomes = [self.list_of_genomes[row] for row in rows_to_keep]
+        self.genome_to_row_dict = {self.list_of_genomes[row]: row for row in range(len(self.list_of_genomes))}
+        self.objectives = self.objectives[rows_to_keep]
+        # removing individuals from the last front doesn't change any fronts but it does change the crowding distances of the last front
+        self.front_ranks = self.front_ranks[rows_to_keep]
+        self.crowding_distances = self.getCrowdingDistances(self.objectives, self.front_ranks)
+
+        return list_of_removed_genomes
+
+    def getOrder(self):
+        """
+        Returns the rows of the archive ordered from best to worst.
+        """
+        return np.lexsort((-self.crowding_distances, self.front_ranks))
+
+    def getFittestIndividuals(self):
+        """
+        Returns the archive in the form of GeneticAlgorithmBase.fittest_individuals, ordered from best to worst, i.e. {(genome): [tuple_of_objectives, (front_rank, crowding_distance)]}. The objectives are given in their original direction.
+        """
+        return {self.list_of_genomes[row]: [tuple((self.objectives[row] * self.objective_signs).tolist()), (int(self.front_ranks[row]), float(self.crowding_distances[row]))] for row in self.getOrder()}
+
+    @staticmethod
+    def getFrontRanks(objectives):
+        """
+        Finds the Pareto front of every individual (see the class docstring for the algorithm). Identical individuals don't dominate each other so they are ranked once and share a front.
+
+        Args:
+            objectives (numpy array): One row per individual and one column per objective. Every objective is minimised.
+
+        Returns:
+            front_ranks (numpy array of ints): The front of each individual (0 is the non-dominated front).
+        """
+        no_of_individuals, no_of_objectives = objectives.shape
+        if no_of_individuals == 0:
+            return np.zeros(0, dtype=int)
+
+        # np.unique sorts the rows lexicographically and once the duplicates have gone an individual is dominated by any individual before it that is no worse in every objective but the first
+        unique_objectives, inverse = np.unique(objectives, axis=0, return_inverse=True)
+        unique_front_ranks = np.zeros(len(unique_objectives), dtype=int)
+        # with two objectives each front only needs its last (i.e. smallest) second objective, with three objectives each front keeps the staircase of its second and third objectives (second objectives increasing and third objectives decreasing) and otherwise each front keeps all of its members in an array that doubles in size when it fills up
+        list_of_front_last_values = []
+        list_of_front_staircases = []
+        list_of_front_arrays = []
+        list_of_front_sizes = []
+        for row in range(len(unique_objectives)):
+            individual = unique_objectives[row]
+            lowest_front = 0
+            highest_front = max(len(list_of_front_last_values), len(list_of_front_staircases), len(list_of_front_sizes))
+            no_of_fronts = highest_front
+            while lowest_front < highest_front:
+                middle_front = (lowest_front + highest_front) // 2
+                if no_of_objectives == 1:
+                    is_dominated = True
+                elif no_of_objectives == 2:
+                    is_dominated = list_of_front_last_values[middle_front] <= individual[1]
+                elif no_of_objectives == 3:
+                    second_objectives, third_objectives = list_of_front_staircases[middle_front]
+                    step_idx = bisect.bisect_right(second_objectives, individual[1]) - 1
+                    is_dominated = step_idx >= 0 and third_objectives[step_idx] <= individual[2]
+                else:
+                    # narrow down the members that are no worse one objective at a time (the arrays are stored one row per objective)
+                    front_array = list_of_front_arrays[middle_front]
+                    candidate_idxs = np.flatnonzero(front_array[1, :list_of_front_sizes[middle_front]] <= individual[1])
+                    for objective_idx in range(2, no_of_objectives):
+                        if len(candidate_idxs) == 0:
+                            break
+                        candidate_idxs = candidate_idxs[front_array[objective_idx, candidate_idxs] <= individual[objective_idx]]
+                    is_dominated = len(candidate_idxs) > 0
+
+                if is_dominated:
+                    lowest_front = middle_front + 1
+                else:
+                    highest_front = middle_front
+
+            front = lowest_front
+            unique_front_ranks[row] = front
+            if no_of_objectives <= 2:
+                if front == no_of_fronts:
+                    list_of_front_last_values.append(None)
+
+                list_of_front_last_values[front] = individual[-1]
+            elif no_of_objectives == 3:
+                if front == no_of_fronts:
+                    list_of_front_staircases.append(([], []))
+
+                second_objectives, third_objectives = list_of_front_staircases[front]
+                step_idx = bisect.bisect_right(second_objectives, individual[1])
+                # remove the steps that the new individual covers
+                if step_idx > 0 and second_objectives[step_idx - 1] == individual[1]:
+                    step_idx -= 1
+                last_covered_idx = step_idx
+                while last_covered_idx < len(second_objectives) and third_objectives[last_covered_idx] >= individual[2]:
+                    last_covered_idx += 1
+                second_objectives[step_idx:last_covered_idx] = [individual[1]]
+                third_objectives[step_idx:last_covered_idx] = [individual[2]]
+            else:
+                if front == no_of_fronts:
+                    list_of_front_arrays.append(np.zeros((no_of_objectives, 16)))
+                    list_of_front_sizes.append(0)
 
-        return child_name_to_set_dict_per_job_per_cluster
+                if list_of_front_sizes[front] == list_of_front_arrays[front].shape[1]:
+                    list_of_front_arrays[front] = np.hstack([list_of_front_arrays[front], np.zeros_like(list_of_front_arrays[front])])
 
-    # METHODS RELATED TO SENDING JOBS TO CLUSTERS
+                list_of_front_arrays[front][:, list_of_front_sizes[front]] = individual
+                list_of_front_sizes[front] += 1
 
-    def createJobSubmissionInstance(self, createJobSubmissionFuncName, jobSubmission_params_dict):
-        return getattr(self, createJobSubmissionFuncName)(jobSubmission_params_dict)
+        front_ranks = unique_front_ranks[np.ravel(inverse)]
 
-    def createSubmissionManagementInstance(self, createSubmissionManagerFuncName, submissionManager_params_dict):
-        return getattr(self, createSubmissionManagerFuncName)(submissionManager_params_dict)
+        return front_ranks
 
-    def postSimulationFunction(self, postSimulationFunctionFuncName, job_submission_info, job_manage_info, postSimulationFunc_params_dict):
-        return getattr(self, postSimulationFunctionFuncName)(job_submission_info, job_manage_info, postSimulationFunc_params_dict)
+    @staticmethod
+    def getCrowdingDistances(objectives, front_ranks):
+        """
+        Works out the NSGA-II crowding distance of every individual within its front. The individuals at the ends of a front in any objective get an infinite distance.
+
+        Args:
+            objectives (numpy array): One row per individual and one column per objective.
+            front_ranks (numpy array of ints): The front of each individual (see getFrontRanks).
+
+        Returns:
+            crowding_distances (numpy array): The crowding distance of each individual.
+        """
+        crowding_distances = np.zeros(len(front_ranks))
+        for objective_idx in range(objectives.shape[1]):
+            # sort by front and then by the objective so that each front is a contiguous block
+            order = np.lexsort((objectives[:, objective_idx], front_ranks))
+            sorted_fronts = front_ranks[order]
+            sorted_values = objectives[order, objective_idx]
+            is_first = np.ones(len(order), dtype=bool)
+            is_first[1:] = sorted_fronts[1:] != sorted_fronts[:-1]
+            is_last = np.ones(len(order), dtype=bool)
+            is_last[:-1] = sorted_fronts[:-1] != sorted_fronts[1:]
+            front_starts = np.flatnonzero(is_first)
+            front_ends = np.flatnonzero(is_last)
+            front_ranges = np.repeat(sorted_values[front_ends] - sorted_values[front_starts], front_ends - front_starts + 1)
+            gaps = np.zeros(len(order))
+            inner = ~(is_first | is_last)
+            gaps[inner] = (sorted_values[2:] - sorted_values[:-2])[inner[1:-1]] / np.where(front_ranges[inner] > 0, front_ranges[inner], 1.0)
+            gaps[is_first | is_last] = np.inf
+            crowding_distances[order] += gaps
+
+        return crowding_distances
 
 class GeneticAlgorithmBase(MGA):
-    def __init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, max_no_of_fit_individuals, temp_storage_path, updateFittestPopulationFuncName):
-        MGA.__init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, temp_storage_path)
+    def __init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, max_no_of_fit_individuals, temp_storage_path, updateFittestPopulationFuncName, random_seed = None):
+        MGA.__init__(self, dict_of_cluster_instances, MGA_name, MGA_description, relative2clusterBasePath_simulation_output_path, repetitions_of_a_unique_simulation, submissionManagerFuncName, submissionManager_params_dict, checkStopFuncName, checkStop_params_dict, getNewGenerationFuncName, newGen_params_dict, runSimulationsFuncName, runSims_params_dict, temp_storage_path, random_seed)
         self.fittest_individuals = {}
         self.max_no_of_fit_individuals = max_no_of_fit_individuals
         self.updateFittestPopulationFuncName = updateFittestPopulationFuncName
         self.progress_record = {'no_of_generations_of_no_progress': 0, 'best_fitness_score': 0}
+        # the archive used by paretoUpdateFittestPopulation
+        self.pareto_archive = None
+        # the diversity of the fittest individuals, updated whenever they change (see updateDiversityRecord)
+        self.diversity_monitor = DiversityMonitor()
+        self.diversity_record = self.diversity_monitor.getDiversityRecord()
+        # all the repetition scores of the genomes that are being raced (see racingRunSimulations). This is None when no race is running.
+        self.racing_genome_to_scores_dict = None
+        # state of the island model (see islandRunSimulations). Keys of all the dicts are cluster keys since each cluster evolves its own island.
+        self.island_fittest_individuals = None
+        self.island_generation_counter_dict = {}
+        self.island_to_neighbours_dict = {}
+        self.island_to_submissions_dict = {}
 
     def mateTheFittest(self, mateFittest_params_dict):
         # check the right mateFittest_params_dict have been passed
         set_of_neccessary_of_mateFittest_params_dict_keys = {'getFittestProbabilitiesFuncName', 'fittestProbabilities_params_dict', 'populationSize_params_dict', 'getPopulationSizeFuncName', 'mateTwoParentsFuncName', 'mateTwoParents_params_dict', 'mutateChildFuncName', 'mutateChild_params_dict'}
-        if set_of_neccessary_of_mateFittest_params_dict_keys != set(mateFittest_params_dict.keys()):
+        # 'no_of_breeding_processes' is optional (see breedChildren)
+        if set_of_neccessary_of_mateFittest_params_dict_keys != set(mateFittest_params_dict.keys()) - {'no_of_breeding_processes'}:
             raise ValueError('mateFittest_params_dict must have certain keys. Here mateFittest_params_dict = ', mateFittest_params_dict, ' required keys are: ', set_of_neccessary_of_mateFittest_params_dict_keys)
 
-        # get the fittest 
-        fittest_individuals = self.fittest_individuals.copy()
+        # get the fittest (self.fittest_individuals is only ever replaced, never changed in place, so it can be read without copying it)
+        fittest_individuals = self.fittest_individuals
         fittest_genomes = list(fittest_individuals.keys())
-        fittest_scores = [fittest_individuals[genome][-1] for genome in fittest_genomes]
-        print("fittest_genomes = ", fittest_genomes)
-        print("fittest_scores = ", fittest_scores)
+        print("no_of_fittest_genomes = ", len(fittest_genomes))
         # create a tuple of probabilities that correspond to the probability of picking the corresponding individual from the fittest list
         tuple_of_probabilities = getattr(self, mateFittest_params_dict['getFittestProbabilitiesFuncName'])(mateFittest_params_dict['fittestProbabilities_params_dict'])
+        # build the alias table once and draw all the parents in one go
+        parent_sampler = AliasTable(tuple_of_probabilities)
 
         # create new generation
         pop_size = getattr(self, mateFittest_params_dict['getPopulationSizeFuncName'])(mateFittest_params_dict['populationSize_params_dict'])
-        list_of_children = [float('NaN') for i in range(pop_size)]
-        list_of_child_names = [float('NaN') for i in range(pop_size)]
-        for child_idx in range(pop_size):
-            parent1_genome = list(fittest_genomes[np.random.choice(len(fittest_genomes), p=tuple_of_probabilities)]) # we convert from tuple to list because creating the child involves changing elements which you can't do with a tuple. fittest_individuals are always tuples though to ensure there is not accidental changes
-            parent2_genome = parent1_genome.copy()
-            while parent2_genome == parent1_genome:
-                parent2_genome = list(fittest_genomes[np.random.choice(len(fittest_genomes), p=tuple_of_probabilities)])
+        parent1_idxs, parent2_idxs = parent_sampler.samplePairs(pop_size, self.getRandomGenerator(0))
+        list_of_parent_pairs = [(fittest_genomes[parent1_idxs[child_idx]], fittest_genomes[parent2_idxs[child_idx]]) for child_idx in range(pop_size)]
+        no_of_breeding_processes = mateFittest_params_dict.get('no_of_breeding_processes', 1)
+        if no_of_breeding_processes > 1 and pop_size > 1:
+            # every child has its own random stream so splitting them between processes gives exactly the same children
+            list_of_child_idx_chunks = [chunk.tolist() for chunk in np.array_split(np.arange(pop_size), min(no_of_breeding_processes, pop_size))]
+            with concurrent.futures.ProcessPoolExecutor(max_workers = len(list_of_child_idx_chunks)) as executor:
+                list_of_children_chunks = list(executor.map(self.breedChildren, list_of_child_idx_chunks, [[list_of_parent_pairs[child_idx] for child_idx in chunk] for chunk in list_of_child_idx_chunks], [mateFittest_params_dict] * len(list_of_child_idx_chunks)))
+            list_of_children = [child for children_chunk in list_of_children_chunks for child in children_chunk]
+        else:
+            list_of_children = self.breedChildren(list(range(pop_size)), list_of_parent_pairs, mateFittest_params_dict)
+
+        # create ko set names
+        list_of_child_names = ['child' + str(child_idx + 1) for child_idx in range(pop_size)]
+
+        child_name_to_genome_dict = {list_of_child_names[idx]: list_of_children[idx] for idx in range(len(list_of_children))}
+
+        return child_name_to_genome_dict
+
+    def breedChildren(self, list_of_child_idxs, list_of_parent_pairs, mateFittest_params_dict):
+        """
+        Mates and mutates the children of a generation. Before each child is bred self.random_generator is switched to the child's own stream (see MGA.getRandomGenerator) so a child only depends on the seed, the generation, its index and its parents. This means the children can be bred in any order or split between processes (set mateFittest_params_dict['no_of_breeding_processes'] to more than 1, which needs the algorithm instance to be picklable) and still come out exactly the same.
+
+        Args:
+            list_of_child_idxs (list of ints): The index of each child within the generation.
+            list_of_parent_pairs (list of tuples): The genomes of the two parents of each child.
+            mateFittest_params_dict (dict): See mateTheFittest.
+
+        Returns:
+            list_of_children (list): The genomes of the children in the same order as list_of_child_idxs.
+        """
+        list_of_children = []
+        default_random_generator = self.random_generator
+        for child_idx, (parent1_genome, parent2_genome) in zip(list_of_child_idxs, list_of_parent_pairs):
+            self.random_generator = self.getRandomGenerator(1, child_idx)
+            parent1_genome = self.getWorkingGenome(parent1_genome) # we convert from tuple to list because creating the child involves changing elements which you can't do with a tuple. fittest_individuals are always tuples though to ensure there is not accidental changes
+            parent2_genome = self.getWorkingGenome(parent2_genome)
 
 #    # convert parent ko codes to ids
 #    parent1_ids = [self.gene_code_to_id_dict[code] for code in parent1_codes]
@@ -271,10 +1200,11 @@ class GeneticAlgorithmBase(MGA):
 #        parent2_genome[self.id_to_genome_idx_dict[id]] = 0
 
             # mate the genomes
-            tmp_child = getattr(self, mateFittest_params_dict['mateTwoParentsFuncName'])(parent1_genome.copy(), parent2_genome.copy(), mateFittest_params_dict['mateTwoParents_params_dict'])
+            # the working genomes are already private to this child so they don't need copying again
+            tmp_child = getattr(self, mateFittest_params_dict['mateTwoParentsFuncName'])(parent1_genome, parent2_genome, mateFittest_params_dict['mateTwoParents_params_dict'])
 
             # mutate child
-            tmp_child = getattr(self, mateFittest_params_dict['mutateChildFuncName'])(tmp_child.copy(), mateFittest_params_dict['mutateChild_params_dict'])
+            tmp_child = getattr(self, mateFittest_params_dict['mutateChildFuncName'])(tmp_child, mateFittest_params_dict['mutateChild_params_dict'])
 
 #    # mutate genes randomly 10% of the time
 #    if random.random() < self.mutation_probability:
@@ -288,13 +1218,11 @@ class GeneticAlgorithmBase(MGA):
 #        tmp_child = tuple([self.gene_id_to_code_dict[gene_id] for gene_id in tmp_child])
 #
             # update children
-            list_of_children[child_idx] = tmp_child.copy()
-            # create ko set names
-            list_of_child_names[child_idx] = 'child' + str(child_idx + 1)
+            list_of_children.append(tmp_child)
 
-        child_name_to_genome_dict = {list_of_child_names[idx]: list_of_children[idx] for idx in range(len(list_of_children))}
+        self.random_generator = default_random_generator
 
-        return child_name_to_genome_dict
+        return list_of_children
 
     ### METHODS THAT GET A NEW GENERATION
 
@@ -335,9 +1263,10 @@ class GeneticAlgorithmBase(MGA):
                 # create a list that is ordered with the highest suffix first
                 child_prefix_to_suffix_list = list(zip(list_of_child_prefixs, list_of_child_suffix_numbers))
                 child_prefix_to_suffix_list.sort(key = operator.itemgetter(1), reverse = True)
-                for new_ind in range(len(self.fittest_individuals)):
+                fittest_genomes = list(self.fittest_individuals.keys())
+                for new_ind in range(len(fittest_genomes)):
                     new_child_name = child_prefix_to_suffix_list[0][0] + str(int(child_prefix_to_suffix_list[0][1]) + new_ind + 1)
-                    child_name_to_genome_dict[new_child_name] = list(self.fittest_individuals.keys())[new_ind]
+                    child_name_to_genome_dict[new_child_name] = fittest_genomes[new_ind]
 
             else:
                 print("Normal mating!")
@@ -354,7 +1283,7 @@ class GeneticAlgorithmBase(MGA):
         output = getattr(self, updateFittestPopulationFuncName)(submission_instance, submission_management_instance, extractAndScoreContendersFuncName, extractContender_params_dict, max_or_min)
 
         # record progress
-        fittest_individuals = self.fittest_individuals.copy()
+        fittest_individuals = self.fittest_individuals
         if max_or_min == 'max':
             fittest_score = max(fittest_individuals[-1][-1][0])
             if self.progress_record['best_fitness_score'] < fittest_score:
@@ -374,11 +1303,28 @@ class GeneticAlgorithmBase(MGA):
 
     def standardUpdateFittestPopulation(self, submission_instance, submission_management_instance, extractAndScoreContendersFuncName, extractContender_params_dict, max_or_min):
         # validate, score and extract children
-        new_individuals = getattr(submission_management_instance, extractAndScoreContendersFuncName)(submission_management_instance.simulation_data_dict.copy(), extractContender_params_dict)
+        # the simulation data is passed as a read-only view rather than a copy
+        new_individuals = getattr(submission_management_instance, extractAndScoreContendersFuncName)(types.MappingProxyType(submission_management_instance.simulation_data_dict), extractContender_params_dict)
+        # children that were moved to another cluster are recorded from the new copy only (see MGA.cancelPendingChildren)
+        if len(submission_instance.stolen_genomes) > 0:
+            new_individuals = {genome: new_individuals[genome] for genome in new_individuals.keys() if self.getGenomeKey(genome) not in submission_instance.stolen_genomes}
         new_genomes = list(new_individuals.keys())
 
-        #  get the odl fittest individuals
-        old_individuals = self.fittest_individuals.copy()
+        #  get the odl fittest individuals (these are never changed in place so there is no need to copy them)
+        old_individuals = self.fittest_individuals
+
+        # when racing, genomes that dropped out of the fittest individuals in an earlier round are judged on the scores of every round
+        if self.racing_genome_to_scores_dict is not None:
+            for genome in new_genomes:
+                genome_key = self.getGenomeKey(genome)
+                if genome_key in self.racing_genome_to_scores_dict:
+                    self.racing_genome_to_scores_dict[genome_key] += tuple(new_individuals[genome][-2])
+                    if genome not in old_individuals:
+                        # new_individuals might be a view of the simulation data so it is copied before it is changed
+                        if type(new_individuals) is not dict:
+                            new_individuals = dict(new_individuals)
+                        new_individuals[genome] = list(new_individuals[genome])
+                        new_individuals[genome][-2] = self.racing_genome_to_scores_dict[genome_key]
         old_genomes = list(old_individuals.keys())
         # get a unique list of all the old and new fitetst genomes
         all_genomes = list(set(new_genomes + old_genomes))
@@ -397,12 +1343,11 @@ class GeneticAlgorithmBase(MGA):
         # whilst the dictionary only has unique genomes as keys, the values are lists of scores we want to add the overall score so that it has the form {(genome): [tuple_of_scores, overall_score]
         all_individuals = getattr(submission_management_instance, extractContender_params_dict['overallScoreFuncName'])(genome_to_scores_dict, extractContender_params_dict)
         # convert into a sorted list of the form [((genome), [tuple_of_scores, (overall_score,)]), ((genome), [tuple_of_scores, (overall_score,)])]
-        if max_or_min == 'max':
-            genome_to_score_list = sorted(all_individuals.items(), key=lambda kv: kv[1][-1][0], reverse=True)
-        elif max_or_min == 'min':
-            genome_to_score_list = sorted(all_individuals.items(), key=lambda kv: kv[1][-1][0], reverse=False)
-        else:
-            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', max_or_min)
+        genome_to_score_list = self.sortIndividualsByFitness(all_individuals, max_or_min)
+
+        # teach the pre-screening surrogate (if there is one) about the genomes that were just simulated
+        if self.surrogate_model is not None and len(new_genomes) > 0:
+            self.surrogate_model.addObservations(new_genomes, [all_individuals[genome][-1][0] for genome in new_genomes])
 
         # create a list of the fittest individuals
         if len(genome_to_score_list) > self.max_no_of_fit_individuals:
@@ -410,10 +1355,364 @@ class GeneticAlgorithmBase(MGA):
         else:
             fittest_individuals = {genome_to_score_list[idx][0]: genome_to_score_list[idx][1] for idx in range(len(genome_to_score_list))}
 
-        self.fittest_individuals = fittest_individuals.copy()
+        # only the genomes that joined or left are passed to the diversity monitor. Genomes beyond the cut off are the only ones that can have left.
+        list_of_added_genomes = [genome for genome in new_genomes if (genome in fittest_individuals) and (genome not in old_individuals)]
+        list_of_removed_genomes = [genome for genome, scores in genome_to_score_list[self.max_no_of_fit_individuals:] if genome in old_individuals]
+        self.fittest_individuals = fittest_individuals
+        self.updateDiversityRecord(list_of_added_genomes, list_of_removed_genomes)
+
+        return
+
+    def paretoUpdateFittestPopulation(self, submission_instance, submission_management_instance, extractAndScoreContendersFuncName, extractContender_params_dict, max_or_min):
+        """
+        A multi-objective alternative to standardUpdateFittestPopulation (pass its name as updateFittestPopulationFuncName). Rather than collapsing the scores of each individual into one overall score, the tuple_of_scores of each individual is treated as a tuple of objectives and the individuals are kept in a ParetoArchive which ranks them by Pareto front and crowding distance. The archive is updated with each new set of contenders as they arrive and is cut down to self.max_no_of_fit_individuals.
+
+        Afterwards self.fittest_individuals has the form {(genome): [tuple_of_objectives, (front_rank, crowding_distance)]} and is ordered from best to worst, so selection methods that use the last element should treat it as minimised (front 0 is the best). If a genome is scored again its objectives are replaced with the new ones.
+
+        Args:
+            max_or_min (str or tuple of str): Either 'max' or 'min' for all the objectives or a tuple with one for each objective.
+        """
+        new_individuals = getattr(submission_management_instance, extractAndScoreContendersFuncName)(types.MappingProxyType(submission_management_instance.simulation_data_dict), extractContender_params_dict)
+        # children that were moved to another cluster are recorded from the new copy only (see MGA.cancelPendingChildren)
+        if len(submission_instance.stolen_genomes) > 0:
+            new_individuals = {genome: new_individuals[genome] for genome in new_individuals.keys() if self.getGenomeKey(genome) not in submission_instance.stolen_genomes}
+
+        if self.pareto_archive is None:
+            self.pareto_archive = ParetoArchive(max_or_min)
+
+        list_of_new_genomes = self.pareto_archive.addIndividuals({genome: new_individuals[genome][-2] for genome in new_individuals.keys()})
+        list_of_truncated_genomes = self.pareto_archive.truncate(self.max_no_of_fit_individuals)
+        self.fittest_individuals = self.pareto_archive.getFittestIndividuals()
+        # genomes that were added and then cut straight away never joined the fittest individuals
+        set_of_new_genomes = set(list_of_new_genomes)
+        self.updateDiversityRecord([genome for genome in list_of_new_genomes if genome in self.pareto_archive.genome_to_row_dict], [genome for genome in list_of_truncated_genomes if genome not in set_of_new_genomes])
+
+        return
+
+    ### METHODS THAT TRACK THE DIVERSITY OF THE FITTEST INDIVIDUALS
+
+    def updateDiversityRecord(self, list_of_added_genomes, list_of_removed_genomes):
+        """
+        Brings self.diversity_monitor up to date with self.fittest_individuals and stores a summary in self.diversity_record (see DiversityMonitor.getDiversityRecord). Only the individuals that joined or left the fittest individuals since the last update are processed.
+
+        With the island model the record is of the fittest individuals across all the islands, so nothing is done whilst an island's population is swapped in (see swapIslandState) and islandRunSimulations updates the record once the islands have been merged.
+
+        Args:
+            list_of_added_genomes (list): The genomes that joined self.fittest_individuals.
+            list_of_removed_genomes (list): The genomes that left self.fittest_individuals.
+        """
+        if self.active_island_number != 0:
+            return
+
+        self.diversity_monitor.update(list_of_added_genomes, list_of_removed_genomes)
+        self.diversity_record = self.diversity_monitor.getDiversityRecord()
+        print('Diversity of the fittest individuals: ', self.diversity_record)
+
+        return
+
+    def stopAtLowDiversity(self, lowDiversity_params_dict):
+        """
+        Stops once the fittest individuals have (nearly) converged, i.e. the mean Hamming distance between them as a fraction of the genome length has fallen below lowDiversity_params_dict['min_normalised_hamming_distance']. Since an almost identical population mostly produces children that have already been simulated this stops the algorithm using cluster time without getting anywhere.
+
+        Args:
+            lowDiversity_params_dict (dict): Must have the keys 'min_normalised_hamming_distance' and 'min_no_of_individuals' (the diversity of a population smaller than this is not trusted so the algorithm doesn't stop).
+
+        Returns:
+            stop_algorithm (bool): True if the algorithm should stop.
+        """
+        if self.diversity_record['no_of_individuals'] < lowDiversity_params_dict['min_no_of_individuals']:
+            return False
+
+        return self.diversity_record['normalised_hamming_distance'] < lowDiversity_params_dict['min_normalised_hamming_distance']
+
+    def stopAfterNoProgressOrLowDiversity(self, stop_params_dict):
+        """
+        Stops if either stopAfterNoProgress or stopAtLowDiversity would.
+
+        Args:
+            stop_params_dict (dict): Must have the key 'max_no_of_gens_without_improvement' as well as the keys needed by stopAtLowDiversity.
+        """
+        return self.stopAfterNoProgress(stop_params_dict['max_no_of_gens_without_improvement']) or self.stopAtLowDiversity(stop_params_dict)
+
+    ### METHODS FOR RACING THE REPETITIONS OF CHILDREN
+
+    def racingRunSimulations(self, runSims_params_dict):
+        """
+        The same as standardRunSimulations except that instead of every child getting self.reps_of_unique_sim repetitions the children are raced. Every child first gets racing_params_dict['initial_repetitions'] repetitions and after each round only the children whose confidence interval still contains the admission threshold of the fittest individuals (see getRacingContenders) get another racing_params_dict['repetitions_per_round'] repetitions. This carries on until no child is undecided or every undecided child has had racing_params_dict['max_repetitions'] repetitions. Clearly bad (and clearly good) children therefore stop using cluster time early.
+
+        Each round is simulated like a normal generation (see simulateChildren) with self.reps_of_unique_sim set to the number of repetitions of that round and with '_round' + the round number added to the child names of every round after the first. standardUpdateFittestPopulation concatenates the scores of every round (including those of children that dropped out of the fittest individuals in an earlier round) so that the fittest individuals are always judged on all their repetitions.
+
+        NOTE: The confidence intervals are worked out from the tuple of scores of each genome (i.e. one number per repetition), so the overall score must be on the same scale as the repetition scores (e.g. their mean).
+
+        Args:
+            runSims_params_dict (dict): The same as standardRunSimulations with the additional key 'racing_params_dict' which is a dict with the keys 'initial_repetitions', 'repetitions_per_round', 'max_repetitions', 'confidence_z' (the number of standard errors either side of the mean, e.g. 1.96 for a 95% interval) and 'max_or_min'.
+        """
+        racing_params_dict = runSims_params_dict['racing_params_dict']
+        child_name_to_genome_dict = self.getNewGenerationFunction(self.getNewGenerationFuncName, self.newGen_params_dict)
+        child_name_to_genome_dict = self.preScreenChildren(child_name_to_genome_dict, runSims_params_dict)
+        genome_to_child_name_dict = {self.getGenomeKey(child_name_to_genome_dict[child_name]): child_name for child_name in child_name_to_genome_dict.keys()}
+        genome_key_to_genome_dict = {self.getGenomeKey(genome): genome for genome in child_name_to_genome_dict.values()}
+        self.racing_genome_to_scores_dict = {genome: () for genome in genome_to_child_name_dict.keys()}
+        reps_of_unique_sim = self.reps_of_unique_sim
+        self.reps_of_unique_sim = racing_params_dict['initial_repetitions']
+        racing_round = 1
+        while len(child_name_to_genome_dict) > 0:
+            print('Racing round ', racing_round, ' with ', len(child_name_to_genome_dict), ' children and ', self.reps_of_unique_sim, ' repetitions each')
+            self.simulateChildren(child_name_to_genome_dict, runSims_params_dict)
+            racing_round += 1
+            self.reps_of_unique_sim = racing_params_dict['repetitions_per_round']
+            child_name_to_genome_dict = {genome_to_child_name_dict[genome] + '_round' + str(racing_round): genome_key_to_genome_dict[genome] for genome in self.getRacingContenders(racing_params_dict)}
+
+        self.reps_of_unique_sim = reps_of_unique_sim
+        self.racing_genome_to_scores_dict = None
+
+        return
+
+    def getAdmissionThreshold(self, max_or_min):
+        """
+        Returns the overall score of the least fit of the fittest individuals, which is the score a new individual has to beat to get into the fittest population. If there are fewer than self.max_no_of_fit_individuals fittest individuals everything gets in and so there is no threshold. There is also no threshold when the fittest population is a Pareto archive (see paretoUpdateFittestPopulation) because there isn't a single overall score to compare with.
+
+        Args:
+            max_or_min (str): Either 'max' or 'min' depending on whether fitness is maximised or minimised.
+
+        Returns:
+            admission_threshold (float or None): None means every individual gets in.
+        """
+        if self.pareto_archive is not None or len(self.fittest_individuals) < self.max_no_of_fit_individuals:
+            return None
+
+        if max_or_min == 'max':
+            admission_threshold = min([individual[-1][0] for individual in self.fittest_individuals.values()])
+        elif max_or_min == 'min':
+            admission_threshold = max([individual[-1][0] for individual in self.fittest_individuals.values()])
+        else:
+            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', max_or_min)
+
+        return admission_threshold
+
+    def getRacingContenders(self, racing_params_dict):
+        """
+        Finds the genomes of the current race that need more repetitions. The admission threshold is the overall score of the least fit of the fittest individuals (see getAdmissionThreshold, if there is no threshold everything gets in and so nothing needs more repetitions). A genome is still a contender if the confidence interval of the mean of its repetition scores contains the threshold and another round wouldn't take it over racing_params_dict['max_repetitions'] repetitions. Genomes with only one score have an unbounded interval.
+
+        Args:
+            racing_params_dict (dict): See racingRunSimulations.
+
+        Returns:
+            list_of_contenders (list): The genome keys (see getGenomeKey) of the genomes that should get another round of repetitions.
+        """
+        admission_threshold = self.getAdmissionThreshold(racing_params_dict['max_or_min'])
+        if admission_threshold is None:
+            return []
+
+        list_of_contenders = []
+        for genome in self.racing_genome_to_scores_dict.keys():
+            scores = np.asarray(self.racing_genome_to_scores_dict[genome], dtype=float)
+            if len(scores) == 0 or len(scores) + racing_params_dict['repetitions_per_round'] > racing_params_dict['max_repetitions']:
+                continue
+
+            if len(scores) > 1:
+                half_width = racing_params_dict['confidence_z'] * np.std(scores, ddof=1) / np.sqrt(len(scores))
+                if abs(np.mean(scores) - admission_threshold) > half_width:
+                    continue
+
+            list_of_contenders.append(genome)
+
+        return list_of_contenders
+
+    ### METHODS FOR THE ISLAND MODEL
+
+    def islandRunSimulations(self, runSims_params_dict):
+        """
+        An alternative to standardRunSimulations where every cluster evolves its own subpopulation (island) instead of the whole generation being spread across all the clusters. Each island keeps its own fittest individuals and generation counter so that as soon as the results of one island come back it can breed and submit its next generation without waiting for the other clusters. Every island_params_dict['migration_interval'] generations of an island its fittest individuals are copied to the neighbouring islands (see migrateFromIsland) so that good genomes spread between clusters while each island keeps its own diversity.
+
+        Each call submits a new generation to every island that has nothing running, waits until at least one island has left the queue and then processes the results of that one island, so self.generation_counter (as incremented by run) counts the number of island generations finished across all the islands. Whilst an island is breeding or being updated its fittest individuals and generation counter are swapped into self.fittest_individuals and self.generation_counter (see swapIslandState) so that the usual getNewGeneration, createJobSubmission and postSimulationFunction methods work unchanged. Afterwards self.fittest_individuals holds the fittest individuals across all the islands.
+
+        NOTE: As with workStealingRunSimulations the submission manager function must return once the jobs have been submitted rather than waiting for them to finish. Islands that are still running when the stopping condition is met are left on the cluster.
+
+        Args:
+            runSims_params_dict (dict): The same as standardRunSimulations with the additional key 'island_params_dict' which is a dict with keys 'topology' (see getIslandNeighbours), 'migration_interval' (the number of generations of an island between migrations), 'migration_rate' (the fraction of an island's fittest individuals that are sent to each neighbour), 'max_or_min' (whether fitness is maximised or minimised) and 'poll_interval' (seconds between checking the queues).
+        """
+        island_params_dict = runSims_params_dict['island_params_dict']
+        if self.island_fittest_individuals is None:
+            list_of_islands = list(self.cluster_instances_dict.keys())
+            self.island_fittest_individuals = {island: {} for island in list_of_islands}
+            self.island_generation_counter_dict = {island: 0 for island in list_of_islands}
+            self.island_to_neighbours_dict = self.getIslandNeighbours(list_of_islands, island_params_dict['topology'])
+
+        # every island that isn't waiting on its cluster breeds and submits its next generation straight away
+        for island in self.island_fittest_individuals.keys():
+            if island not in self.island_to_submissions_dict:
+                self.submitIslandGeneration(island, runSims_params_dict)
+
+        list_of_finished_islands = self.getFinishedIslands()
+        while len(list_of_finished_islands) == 0:
+            # each island's children only have to beat that island's fittest individuals
+            for island in self.island_to_submissions_dict.keys():
+                self.swapIslandState(island)
+                self.terminateHopelessChildren(self.island_to_submissions_dict[island][0], self.island_to_submissions_dict[island][1], runSims_params_dict)
+                self.swapIslandState(island)
+
+            time.sleep(island_params_dict['poll_interval'])
+            list_of_finished_islands = self.getFinishedIslands()
+
+        # process one island per call so that the generation counter counts island generations
+        island = list_of_finished_islands[0]
+        dict_of_job_submission_insts, dict_of_job_management_insts = self.island_to_submissions_dict.pop(island)
+        self.swapIslandState(island)
+        for submission_key in dict_of_job_submission_insts.keys():
+            self.postSimulationFunction(runSims_params_dict['postSimulationFunctionFuncName'], dict_of_job_submission_insts[submission_key], dict_of_job_management_insts[submission_key], runSims_params_dict)
+
+        self.swapIslandState(island)
+        self.island_generation_counter_dict[island] += 1
+        if self.island_generation_counter_dict[island] % island_params_dict['migration_interval'] == 0:
+            self.migrateFromIsland(island, island_params_dict['migration_rate'], island_params_dict['max_or_min'])
+
+        old_fittest_individuals = self.fittest_individuals
+        self.fittest_individuals = self.mergeFittestIndividuals(list(self.island_fittest_individuals.values()), island_params_dict['max_or_min'])
+        self.updateDiversityRecord([genome for genome in self.fittest_individuals.keys() if genome not in old_fittest_individuals], [genome for genome in old_fittest_individuals.keys() if genome not in self.fittest_individuals])
+
+        return
+
+    def submitIslandGeneration(self, island, runSims_params_dict):
+        """
+        Breeds the next generation of an island from its own fittest individuals and submits it to the island's cluster. The submission instances are stored in self.island_to_submissions_dict until the island has left the queue.
+
+        Args:
+            island (str): The key of the island's cluster in self.cluster_instances_dict.
+            runSims_params_dict (dict): See islandRunSimulations.
+        """
+        self.swapIslandState(island)
+        child_name_to_genome_dict = self.getNewGenerationFunction(self.getNewGenerationFuncName, self.newGen_params_dict)
+        child_name_to_genome_dict = self.preScreenChildren(child_name_to_genome_dict, runSims_params_dict)
+        child_name_to_genome_dict_per_cluster = self.spreadChildrenAcrossJobs({island: child_name_to_genome_dict})
+        dict_of_job_submission_insts = self.createJobSubmissionInstances(child_name_to_genome_dict_per_cluster, runSims_params_dict)
+        submissionManager_params_dict = self.submissionManager_params_dict.copy()
+        submissionManager_params_dict['dict_of_job_submission_insts'] = dict_of_job_submission_insts
+        dict_of_job_management_insts = self.createSubmissionManagementInstance(self.submissionManagerFuncName, submissionManager_params_dict)
+        self.swapIslandState(island)
+        self.island_to_submissions_dict[island] = (dict_of_job_submission_insts, dict_of_job_management_insts)
+
+        return
+
+    def swapIslandState(self, island):
+        """
+        Swaps the fittest individuals and generation counter of an island with self.fittest_individuals and self.generation_counter. Calling this once makes the island the current population and calling it again puts everything back.
+
+        Args:
+            island (str): The key of the island's cluster in self.cluster_instances_dict.
+        """
+        self.fittest_individuals, self.island_fittest_individuals[island] = self.island_fittest_individuals[island], self.fittest_individuals
+        self.generation_counter, self.island_generation_counter_dict[island] = self.island_generation_counter_dict[island], self.generation_counter
+        self.active_island_number = list(self.island_fittest_individuals.keys()).index(island) + 1 if self.active_island_number == 0 else 0
 
         return
 
+    def getFinishedIslands(self):
+        """
+        Returns the islands whose submissions have all left the queue of their cluster.
+
+        Returns:
+            list_of_finished_islands (list of str): The islands that are ready to be updated.
+        """
+        list_of_finished_islands = []
+        for island in self.island_to_submissions_dict.keys():
+            cluster_conn = self.cluster_instances_dict[island]
+            dict_of_job_submission_insts = self.island_to_submissions_dict[island][0]
+            no_of_tasks_in_queue = 0
+            for submission_key in dict_of_job_submission_insts.keys():
+                no_of_tasks_in_queue += len(cluster_conn.getArrayIndicesFromQueueStdOut(cluster_conn.checkQueue(dict_of_job_submission_insts[submission_key].cluster_job_number)['stdout']))
+
+            if no_of_tasks_in_queue == 0:
+                list_of_finished_islands.append(island)
+
+        return list_of_finished_islands
+
+    def migrateFromIsland(self, island, migration_rate, max_or_min):
+        """
+        Copies the fittest individuals of an island to each of its neighbours. The migrants compete with the individuals already on the neighbouring island so only migrants that are fitter than the least fit of the neighbour's (full) population survive there.
+
+        Args:
+            island (str): The island that the migrants come from.
+            migration_rate (float): The fraction of the island's fittest individuals to send to each neighbour (at least one individual is sent if the island has any).
+            max_or_min (str): Either 'max' or 'min' depending on whether fitness is maximised or minimised.
+
+        Returns:
+            migrants (dict): The individuals that were sent in the same form as self.fittest_individuals.
+        """
+        sorted_individuals = self.sortIndividualsByFitness(self.island_fittest_individuals[island], max_or_min)
+        no_of_migrants = min(len(sorted_individuals), max(1, int(round(migration_rate * len(sorted_individuals)))))
+        migrants = {genome: scores for genome, scores in sorted_individuals[:no_of_migrants]}
+        for neighbour in self.island_to_neighbours_dict[island]:
+            self.island_fittest_individuals[neighbour] = self.mergeFittestIndividuals([self.island_fittest_individuals[neighbour], migrants], max_or_min)
+
+        return migrants
+
+    def mergeFittestIndividuals(self, list_of_fittest_individuals, max_or_min):
+        """
+        Combines several dicts of fittest individuals (in the same form as self.fittest_individuals) and keeps the self.max_no_of_fit_individuals fittest. If a genome appears more than once the entry from the first dict is kept.
+
+        Args:
+            list_of_fittest_individuals (list of dicts): The populations to combine.
+            max_or_min (str): Either 'max' or 'min'.
+
+        Returns:
+            fittest_individuals (dict): The fittest individuals of the combined population.
+        """
+        all_individuals = {}
+        for fittest_individuals in list_of_fittest_individuals:
+            for genome in fittest_individuals.keys():
+                if genome not in all_individuals:
+                    all_individuals[genome] = fittest_individuals[genome]
+
+        genome_to_score_list = self.sortIndividualsByFitness(all_individuals, max_or_min)
+        fittest_individuals = {genome: scores for genome, scores in genome_to_score_list[:self.max_no_of_fit_individuals]}
+
+        return fittest_individuals
+
+    @staticmethod
+    def sortIndividualsByFitness(individuals, max_or_min):
+        """
+        Sorts a dict of individuals of the form {(genome): [tuple_of_scores, (overall_score,)]} by their overall score with the fittest first.
+
+        Returns:
+            genome_to_score_list (list of tuples): Each tuple is ((genome), [tuple_of_scores, (overall_score,)]).
+        """
+        if max_or_min == 'max':
+            genome_to_score_list = sorted(individuals.items(), key=lambda kv: kv[1][-1][0], reverse=True)
+        elif max_or_min == 'min':
+            genome_to_score_list = sorted(individuals.items(), key=lambda kv: kv[1][-1][0], reverse=False)
+        else:
+            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', max_or_min)
+
+        return genome_to_score_list
+
+    @staticmethod
+    def getIslandNeighbours(list_of_islands, topology):
+        """
+        Works out which islands each island sends its migrants to.
+
+        Args:
+            list_of_islands (list of str): The islands in a fixed order.
+            topology (str or dict): 'ring' sends migrants to the next island in list_of_islands (the last island sends to the first), 'fully_connected' sends migrants to every other island and a dict with island keys and lists of neighbouring islands as values gives any other topology.
+
+        Returns:
+            island_to_neighbours_dict (dict): Keys are islands and values are lists of the islands they send migrants to.
+        """
+        if type(topology) is dict:
+            if not set(topology.keys()).issubset(list_of_islands) or not set([neighbour for neighbours in topology.values() for neighbour in neighbours]).issubset(list_of_islands):
+                raise ValueError('A topology dict can only contain the islands in list_of_islands. Here list_of_islands = ', list_of_islands, ' and topology = ', topology)
+
+            island_to_neighbours_dict = {island: list(topology.get(island, [])) for island in list_of_islands}
+        elif topology == 'ring':
+            island_to_neighbours_dict = {list_of_islands[idx]: [list_of_islands[(idx + 1) % len(list_of_islands)]] for idx in range(len(list_of_islands)) if len(list_of_islands) > 1}
+            island_to_neighbours_dict.update({island: [] for island in list_of_islands if island not in island_to_neighbours_dict})
+        elif topology == 'fully_connected':
+            island_to_neighbours_dict = {island: [neighbour for neighbour in list_of_islands if neighbour != island] for island in list_of_islands}
+        else:
+            raise ValueError('topology must be either \'ring\', \'fully_connected\' or a dict of islands to lists of neighbouring islands. Here topology = ', topology)
+
+        return island_to_neighbours_dict
+
     ### METHODS THAT MATE TWO PARENTS
 
     def sliceMate(self, parent1_genome, parent2_genome, mateTwoParents_params_dict):
@@ -427,7 +1726,7 @@ class GeneticAlgorithmBase(MGA):
             raise TypeError('parent1_genome and parent2_genome must both have the same class and must be either lists of tuples. type(parent1_genome) = ', type(parent1_genome), ' type(parent2_genome) = ', type(parent2_genome))
 
         # pick a idx to split the geneomes by
-        split_idx = random.randint(0,len(parent1_genome) - 1)
+        split_idx = int(self.random_generator.integers(0, len(parent1_genome)))
 
         child = parent1_genome[:split_idx] + parent2_genome[split_idx:]
 
@@ -444,27 +1743,77 @@ class GeneticAlgorithmBase(MGA):
             raise TypeError('parent1_genome and parent2_genome must both have the same class and must be either lists of tuples. type(parent1_genome) = ', type(parent1_genome), ' type(parent2_genome) = ', type(parent2_genome))
 
         # pick a idx to split the geneomes by
-        split_idx = random.randint(0,len(parent1_genome) - 1)
+        split_idx = int(self.random_generator.integers(0, len(parent1_genome)))
 
         # randomly create the gene indexs to take from parent1
-        parent1_idxs_to_inherit = random.sample(range(len(parent1_genome)), split_idx)
+        parent1_idxs_to_inherit = set(self.random_generator.choice(len(parent1_genome), split_idx, replace=False).tolist())
         # create tmp child genome from randomly selected choice of genes from both parents
-        child = [parent1_genome[idx] if parent1_idxs_to_inherit.count(idx) > 0 else parent2_genome[idx] for idx in range(len(parent1_genome))]
+        child = [parent1_genome[idx] if idx in parent1_idxs_to_inherit else parent2_genome[idx] for idx in range(len(parent1_genome))]
 
         return child
 
+    def sparseSliceMate(self, parent1_genome, parent2_genome, mateTwoParents_params_dict):
+        """
+        The same as sliceMate for KnockoutGenomes. The child takes the knockouts of parent1 before a random index and the knockouts of parent2 from that index onwards, which only costs time proportional to the number of knockouts.
+        """
+        if (type(parent1_genome) is not KnockoutGenome) or (type(parent2_genome) is not KnockoutGenome):
+            raise TypeError('parent1_genome and parent2_genome must both be KnockoutGenomes. type(parent1_genome) = ', type(parent1_genome), ' type(parent2_genome) = ', type(parent2_genome))
+
+        if parent1_genome.genome_length != parent2_genome.genome_length:
+            raise ValueError('parent1_genome must have equal length to parent2_genome! parent1_genome.genome_length = ', parent1_genome.genome_length, ' parent2_genome.genome_length = ', parent2_genome.genome_length)
+
+        split_idx = int(self.random_generator.integers(0, parent1_genome.genome_length))
+        child = KnockoutGenome(parent1_genome.genome_length, parent1_genome.knockouts[:bisect.bisect_left(parent1_genome.knockouts, split_idx)] + parent2_genome.knockouts[bisect.bisect_left(parent2_genome.knockouts, split_idx):])
+
+        return child
+
+    def sparseMixMate(self, parent1_genome, parent2_genome, mateTwoParents_params_dict):
+        """
+        The same as mixMate for KnockoutGenomes. mixMate inherits a random set of split_idx genes from parent1 and the rest from parent2 but only the genes that are knocked out in exactly one of the parents are affected by the choice. The number of those genes that come from parent1 is hypergeometrically distributed so drawing it and then picking that many of them gives children with exactly the same distribution as mixMate in time proportional to the number of knockouts.
+        """
+        if (type(parent1_genome) is not KnockoutGenome) or (type(parent2_genome) is not KnockoutGenome):
+            raise TypeError('parent1_genome and parent2_genome must both be KnockoutGenomes. type(parent1_genome) = ', type(parent1_genome), ' type(parent2_genome) = ', type(parent2_genome))
+
+        if parent1_genome.genome_length != parent2_genome.genome_length:
+            raise ValueError('parent1_genome must have equal length to parent2_genome! parent1_genome.genome_length = ', parent1_genome.genome_length, ' parent2_genome.genome_length = ', parent2_genome.genome_length)
+
+        genome_length = parent1_genome.genome_length
+        split_idx = int(self.random_generator.integers(0, genome_length))
+        parent1_knockouts = set(parent1_genome.knockouts)
+        parent2_knockouts = set(parent2_genome.knockouts)
+        list_of_differing_genes = sorted(parent1_knockouts ^ parent2_knockouts)
+        no_from_parent1 = 0
+        if len(list_of_differing_genes) > 0:
+            no_from_parent1 = int(self.random_generator.hypergeometric(split_idx, genome_length - split_idx, len(list_of_differing_genes)))
+
+        genes_from_parent1 = set(self.random_generator.choice(list_of_differing_genes, no_from_parent1, replace=False).tolist()) if no_from_parent1 > 0 else set()
+        child_knockouts = (parent1_knockouts & parent2_knockouts) | {gene for gene in list_of_differing_genes if (gene in parent1_knockouts) == (gene in genes_from_parent1)}
+        child = KnockoutGenome(genome_length, child_knockouts)
+
+        return child
+
+    @staticmethod
+    def getWorkingGenome(genome):
+        """
+        Returns a version of a genome from the fittest individuals that the mating and mutation methods can work on. Dense genomes are stored as tuples so are converted into lists but KnockoutGenomes are immutable and so can be used as they are.
+        """
+        if type(genome) is KnockoutGenome:
+            return genome
+
+        return list(genome)
+
     ### METHODS THAT MUTATE CHILDREN
 
     def uniformMutation(self, child, mutateChild_params_dict):
         if type(child) is not list:
             raise TypeError('child must be a list! type(child) = ', type(child))
 
-        if random.random() < mutateChild_params_dict['mutation_probability']:
+        if self.random_generator.random() < mutateChild_params_dict['mutation_probability']:
             mutation_probability = mutateChild_params_dict['mutation_probability']
             number_of_mutations = mutateChild_params_dict['number_of_mutations']
 
             # pick indexs to flip uniformly
-            gene_idxs_to_flip = random.sample(range(len(child)), number_of_mutations)
+            gene_idxs_to_flip = self.random_generator.choice(len(child), number_of_mutations, replace=False).tolist()
             # flip the gene
             for idx in gene_idxs_to_flip:
                 child[idx] = (child[idx] + 1) % 2
@@ -480,28 +1829,81 @@ class GeneticAlgorithmBase(MGA):
         if not neccessary_keys.issubset(mutateChild_params_dict.keys()):
             raise ValueError('mutateChild_params_dict must contain all the following keys: ', neccessary_keys, ' mutateChild_params_dict = ', mutateChild_params_dict)
 
-        if random.random() < mutateChild_params_dict['mutation_probability']:
+        if self.random_generator.random() < mutateChild_params_dict['mutation_probability']:
             # pick the amount of gene mutations from a exponentially distributed random number with parameter self.exponential_parameter
             exponential_parameter = mutateChild_params_dict['exponential_parameter']
             # exp R.V. can produce zero, we don't want zeros
             number_of_gene_mutations = 0
             while number_of_gene_mutations == 0:
-                number_of_gene_mutations = int(np.around(np.random.exponential(exponential_parameter)))
+                number_of_gene_mutations = int(np.around(self.random_generator.exponential(exponential_parameter)))
 
             # flip number_of_gene_mutations amount of genes randomly
             # create list of indexs to flip
-            gene_idxs_to_flip = random.sample(range(len(child)), min(number_of_gene_mutations, len(child)))
+            gene_idxs_to_flip = self.random_generator.choice(len(child), min(number_of_gene_mutations, len(child)), replace=False).tolist()
             # flip genes
             for idx in gene_idxs_to_flip:
                 child[idx] = (child[idx] + 1) % 2
 
         return child
 
+    def sparseUniformMutation(self, child, mutateChild_params_dict):
+        """
+        The same as uniformMutation for KnockoutGenomes (and it uses the random numbers in the same way so gives the same child for the same random state).
+        """
+        if type(child) is not KnockoutGenome:
+            raise TypeError('child must be a KnockoutGenome! type(child) = ', type(child))
+
+        if self.random_generator.random() < mutateChild_params_dict['mutation_probability']:
+            gene_idxs_to_flip = self.random_generator.choice(child.genome_length, mutateChild_params_dict['number_of_mutations'], replace=False).tolist()
+            child = child.flipGenes(gene_idxs_to_flip)
+
+        return child
+
+    def sparseExponentialMutation(self, child, mutateChild_params_dict):
+        """
+        The same as exponentialMutation for KnockoutGenomes (and it uses the random numbers in the same way so gives the same child for the same random state).
+        """
+        if type(child) is not KnockoutGenome:
+            raise TypeError('child must be a KnockoutGenome! type(child) = ', type(child))
+
+        neccessary_keys = set(('mutation_probability', 'exponential_parameter'))
+        if not neccessary_keys.issubset(mutateChild_params_dict.keys()):
+            raise ValueError('mutateChild_params_dict must contain all the following keys: ', neccessary_keys, ' mutateChild_params_dict = ', mutateChild_params_dict)
+
+        if self.random_generator.random() < mutateChild_params_dict['mutation_probability']:
+            number_of_gene_mutations = 0
+            while number_of_gene_mutations == 0:
+                number_of_gene_mutations = int(np.around(self.random_generator.exponential(mutateChild_params_dict['exponential_parameter'])))
+
+            gene_idxs_to_flip = self.random_generator.choice(child.genome_length, min(number_of_gene_mutations, child.genome_length), replace=False).tolist()
+            child = child.flipGenes(gene_idxs_to_flip)
+
+        return child
+
+    def adaptiveExponentialMutation(self, child, mutateChild_params_dict):
+        """
+        exponentialMutation (or sparseExponentialMutation for KnockoutGenomes) with a mutation rate that goes up as the fittest individuals lose diversity. While the normalised mean Hamming distance of the fittest individuals (see updateDiversityRecord) is below mutateChild_params_dict['target_normalised_hamming_distance'] both the mutation probability (capped at 1) and the exponential parameter are multiplied by target / current, but by no more than mutateChild_params_dict['max_mutation_scale'].
+
+        Args:
+            mutateChild_params_dict (dict): Must have the keys 'mutation_probability', 'exponential_parameter', 'target_normalised_hamming_distance' and 'max_mutation_scale'.
+        """
+        current_diversity = self.diversity_record['normalised_hamming_distance']
+        target_diversity = mutateChild_params_dict['target_normalised_hamming_distance']
+        mutation_scale = 1.0
+        if current_diversity < target_diversity:
+            mutation_scale = min(mutateChild_params_dict['max_mutation_scale'], target_diversity / current_diversity) if current_diversity > 0 else mutateChild_params_dict['max_mutation_scale']
+
+        scaled_params_dict = {'mutation_probability': min(1.0, mutateChild_params_dict['mutation_probability'] * mutation_scale), 'exponential_parameter': mutateChild_params_dict['exponential_parameter'] * mutation_scale}
+        if type(child) is KnockoutGenome:
+            return self.sparseExponentialMutation(child, scaled_params_dict)
+
+        return self.exponentialMutation(child, scaled_params_dict)
+
     ### METHODS FOR CREATING PROBABILITUES OF PICKING PARENTS FROM THE FITTEST INDIVIDUALS LIST
     
     def getLinearProbsForMaximising(self, linearProbs_params_dict):
         # get the fittest 
-        fittest_individuals = self.fittest_individuals.copy()
+        fittest_individuals = self.fittest_individuals
         fittest_genomes = list(fittest_individuals.keys())
         fittest_scores = [fittest_individuals[genome][-1][0] for genome in fittest_genomes]
 
@@ -510,6 +1912,82 @@ class GeneticAlgorithmBase(MGA):
             raise ValueError('There should be an equal amount of fittest_genomes and fittest_scores! len(fittest_genomes) = ', len(fittest_genomes), ' and len(fittest_scores) = ', len(fittest_scores))
 
         # randomly pick a ko such that larger KOs are more likely to be picked
-        tuple_of_probabilities = tuple([fittest_scores[idx]/sum(fittest_scores) for idx in range(len(fittest_genomes))])
+        total_score = sum(fittest_scores)
+        tuple_of_probabilities = tuple([fittest_scores[idx]/total_score for idx in range(len(fittest_genomes))])
 
         return tuple_of_probabilities
+
+    def getRankProbabilities(self, rankProbs_params_dict):
+        """
+        Linear ranking selection. The probability of picking an individual only depends on its rank, so unlike getLinearProbsForMaximising it works for negative scores, minimisation and scores of very different sizes. The best individual is selection_pressure times more likely to be picked than the average individual and the worst is (2 - selection_pressure) times as likely.
+
+        Args:
+            rankProbs_params_dict (dict): Must have the keys 'selection_pressure' (between 1 and 2) and 'max_or_min'.
+
+        Returns:
+            tuple_of_probabilities (tuple of floats): The probability of picking each individual in the order of self.fittest_individuals.
+        """
+        selection_pressure = rankProbs_params_dict['selection_pressure']
+        if selection_pressure < 1 or selection_pressure > 2:
+            raise ValueError('selection_pressure must be between 1 and 2. Here selection_pressure = ', selection_pressure)
+
+        ranks = self.getFitnessRanks(rankProbs_params_dict['max_or_min'])
+        no_of_individuals = len(ranks)
+        if no_of_individuals == 1:
+            return (1.0,)
+
+        # rank 0 is the best
+        probabilities = ((2 - selection_pressure) + 2 * (selection_pressure - 1) * (no_of_individuals - 1 - ranks) / (no_of_individuals - 1)) / no_of_individuals
+
+        return tuple(probabilities.tolist())
+
+    def getTournamentProbabilities(self, tournamentProbs_params_dict):
+        """
+        Tournament selection (the fittest of tournament_size individuals picked uniformly with replacement) written as the equivalent probabilities so that it can be sampled with an alias table. The individual of rank r (0 is the best) out of N wins a tournament with probability ((N - r)^k - (N - r - 1)^k) / N^k where k is the tournament size.
+
+        Args:
+            tournamentProbs_params_dict (dict): Must have the keys 'tournament_size' and 'max_or_min'.
+
+        Returns:
+            tuple_of_probabilities (tuple of floats): The probability of picking each individual in the order of self.fittest_individuals.
+        """
+        tournament_size = tournamentProbs_params_dict['tournament_size']
+        ranks = self.getFitnessRanks(tournamentProbs_params_dict['max_or_min'])
+        no_of_individuals = len(ranks)
+        # work with fractions of N so that large populations and tournaments don't overflow
+        probabilities = ((no_of_individuals - ranks) / no_of_individuals) ** tournament_size - ((no_of_individuals - ranks - 1) / no_of_individuals) ** tournament_size
+
+        return tuple(probabilities.tolist())
+
+    def getTruncationProbabilities(self, truncationProbs_params_dict):
+        """
+        Truncation selection. Only the best truncation_fraction of the individuals can be picked and each of them is equally likely.
+
+        Args:
+            truncationProbs_params_dict (dict): Must have the keys 'truncation_fraction' and 'max_or_min'.
+
+        Returns:
+            tuple_of_probabilities (tuple of floats): The probability of picking each individual in the order of self.fittest_individuals.
+        """
+        ranks = self.getFitnessRanks(truncationProbs_params_dict['max_or_min'])
+        no_of_survivors = min(len(ranks), max(2, int(np.ceil(truncationProbs_params_dict['truncation_fraction'] * len(ranks)))))
+        probabilities = np.where(ranks < no_of_survivors, 1.0 / no_of_survivors, 0.0)
+
+        return tuple(probabilities.tolist())
+
+    def getFitnessRanks(self, max_or_min):
+        """
+        Returns the rank of every individual in self.fittest_individuals (in the order of its keys) where 0 is the fittest. Ties are broken by the order of the keys.
+        """
+        fittest_scores = np.array([scores[-1][0] for scores in self.fittest_individuals.values()], dtype=float)
+        if max_or_min == 'max':
+            order = np.argsort(-fittest_scores, kind='stable')
+        elif max_or_min == 'min':
+            order = np.argsort(fittest_scores, kind='stable')
+        else:
+            raise ValueError('max_or_min must be a string of either \'min\' or \'max\'. Here max_or_min = ', max_or_min)
+
+        ranks = np.empty(len(order), dtype=int)
+        ranks[order] = np.arange(len(order))
+
+        return ranks
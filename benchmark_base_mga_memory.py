@@ -0,0 +1,92 @@
+"""
+Measures how much memory the genetic algorithm loop of base_mga.GeneticAlgorithmBase uses on the driver. Every generation a large set of contenders is scored with standardUpdateFittestPopulation and then a new generation is bred with mateTheFittest, all without a cluster. For each generation the peak of the memory allocated by Python (from tracemalloc) and the peak resident set size of the process are printed.
+
+Usage:
+    python benchmark_base_mga_memory.py [--revision git_revision] [no_of_generations] [no_of_fit_individuals] [genome_length]
+
+With --revision the benchmark runs base_mga.py as it was at that git revision instead of the one in the working tree, so the numbers before and after a change can be compared on the same computer. For example, 'python benchmark_base_mga_memory.py --revision 182158c~1' runs the version that still copied self.fittest_individuals, the simulation data and every child's genome each generation.
+"""
+import os
+import sys
+import types
+import subprocess
+import resource
+import tracemalloc
+import numpy as np
+import base_mga
+
+def loadBaseMgaFromRevision(git_revision):
+    """
+    Loads base_mga.py as it was at a git revision of this repository as a module (without changing the working tree).
+
+    Args:
+        git_revision (str): Any git revision, e.g. a commit hash or 'HEAD~1'.
+
+    Returns:
+        mga_module (module): The old base_mga.
+    """
+    mga_source = subprocess.run(['git', 'show', git_revision + ':base_mga.py'], check = True, stdout = subprocess.PIPE, cwd = os.path.dirname(os.path.abspath(__file__))).stdout
+    mga_module = types.ModuleType('base_mga')
+    exec(compile(mga_source, 'base_mga.py (' + git_revision + ')', 'exec'), mga_module.__dict__)
+
+    return mga_module
+
+def createBenchmarkGeneticAlgorithm(mga_module, max_no_of_fit_individuals):
+    """
+    Creates a GeneticAlgorithmBase of the given version of base_mga with dummy values for everything that is only needed to talk to clusters.
+    """
+    return mga_module.GeneticAlgorithmBase({}, 'benchmark_mga', 'memory benchmark', 'benchmark/path', 1, 'passFunction', {}, 'passFunction', {}, 'passFunction', {}, 'passFunction', {}, max_no_of_fit_individuals, 'benchmark_tmp', 'passFunction')
+
+class BenchmarkSubmission():
+    """
+    Looks enough like a base_cluster_submissions.BaseJobSubmission instance for standardUpdateFittestPopulation.
+    """
+    def __init__(self):
+        self.stolen_genomes = set()
+
+class BenchmarkManager():
+    """
+    Looks enough like a base_cluster_submissions.BaseManageSubmission instance for standardUpdateFittestPopulation. The simulation data of each child is its genome and the scores of its repetitions.
+    """
+    def __init__(self, simulation_data_dict):
+        self.simulation_data_dict = simulation_data_dict
+
+    def extractContenders(self, simulation_data_dict, extractContender_params_dict):
+        return {simulation_data_dict[child_name]['genome']: [simulation_data_dict[child_name]['scores'], ()] for child_name in simulation_data_dict}
+
+    def getOverallScores(self, genome_to_scores_dict, extractContender_params_dict):
+        return {genome: [genome_to_scores_dict[genome][0], (float(np.mean(genome_to_scores_dict[genome][0])),)] for genome in genome_to_scores_dict}
+
+def runBenchmark(no_of_generations, no_of_fit_individuals, genome_length, mga_module = base_mga):
+    mga = createBenchmarkGeneticAlgorithm(mga_module, no_of_fit_individuals)
+    mga.generation_counter = 0
+    rng = np.random.default_rng(0)
+    mateFittest_params_dict = {'getFittestProbabilitiesFuncName': 'getLinearProbsForMaximising', 'fittestProbabilities_params_dict': {}, 'populationSize_params_dict': {-1: no_of_fit_individuals}, 'getPopulationSizeFuncName': 'getPopulationSizeFromDict', 'mateTwoParentsFuncName': 'sliceMate', 'mateTwoParents_params_dict': {}, 'mutateChildFuncName': 'uniformMutation', 'mutateChild_params_dict': {'mutation_probability': 0.5, 'number_of_mutations': 1}}
+    list_of_children = [list(genome) for genome in rng.integers(0, 2, size = (no_of_fit_individuals, genome_length)).tolist()]
+    tracemalloc.start()
+    for generation in range(no_of_generations):
+        tracemalloc.reset_peak()
+        # score the children (ten repetitions each, fitness is the number of genes present)
+        simulation_data_dict = {'child' + str(idx + 1): {'genome': tuple(list_of_children[idx]), 'scores': tuple((sum(list_of_children[idx]) + rng.normal(size = 10)).tolist())} for idx in range(len(list_of_children))}
+        mga.standardUpdateFittestPopulation(BenchmarkSubmission(), BenchmarkManager(simulation_data_dict), 'extractContenders', {'overallScoreFuncName': 'getOverallScores'}, 'max')
+        del simulation_data_dict
+        list_of_children = list(mga.mateTheFittest(mateFittest_params_dict).values())
+        mga.generation_counter += 1
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        print('generation ', generation, ': peak traced memory = ', round(peak_size / 2**20, 1), ' MiB, peak RSS = ', round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1), ' MiB', flush = True)
+
+    tracemalloc.stop()
+
+    return
+
+if __name__ == '__main__':
+    list_of_args = sys.argv[1:]
+    mga_module = base_mga
+    if len(list_of_args) > 1 and list_of_args[0] == '--revision':
+        mga_module = loadBaseMgaFromRevision(list_of_args[1])
+        list_of_args = list_of_args[2:]
+
+    no_of_generations = int(list_of_args[0]) if len(list_of_args) > 0 else 5
+    no_of_fit_individuals = int(list_of_args[1]) if len(list_of_args) > 1 else 5000
+    genome_length = int(list_of_args[2]) if len(list_of_args) > 2 else 500
+    runBenchmark(no_of_generations, no_of_fit_individuals, genome_length, mga_module)
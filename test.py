@@ -5,6 +5,9 @@ import shutil
 import os
 import random
 import subprocess
+import time
+import tarfile
+import io
 
 # ABSTRACT CLASSES
 class LocalBaseConnectionTest(unittest.TestCase):
@@ -109,6 +112,283 @@ class LocalBaseConnectionTest(unittest.TestCase):
         output_dict = base_connection.Connection.checkSuccess(self.returnZeroIfFiveIsPassed, 5)
         self.assertTrue(output_dict['return_code'] == 0)
 
+    def test_getDependencyFlag(self):
+        pbs_flag = base_connection.BasePbs.getDependencyFlag(None, [12, 13], 'afterok')
+        pbs_array_flag = base_connection.BasePbs.getDependencyFlag(None, [12], 'afteranyarray')
+        slurm_flag = base_connection.BaseSlurm.getDependencyFlag(None, [12, 13], 'afterokarray')
+        self.assertTrue((pbs_flag == '-W depend=afterok:12:13') and (pbs_array_flag == '-W depend=afteranyarray:12[]') and (slurm_flag == '--dependency=afterok:12:13'))
+
+    def test_clusterWithoutNewFeatures(self):
+        # a cluster class that only has the methods that BaseCluster has always needed can still be created and used without tokens
+        legacy_cluster = FakeLegacyCluster()
+        submit_command = legacy_cluster.createSubmitCommand('/runfiles/script.sh', submission_token = legacy_cluster.createSubmissionToken())
+        submit_output_dict = legacy_cluster.submitJob(submit_command, 'ccftoken')
+        with self.assertRaises(NotImplementedError):
+            legacy_cluster.cancelArrayTasks(123, [1, 2])
+        self.assertTrue((submit_command == 'qsub /runfiles/script.sh') and (submit_output_dict['stdout'] == '123.server'))
+
+    def test_getStageJobIdsFromChainStdOut(self):
+        stdout = 'some other output\nmain=359\nreduce=360\ncleanup=361\n'
+        output = base_connection.BaseCluster.getStageJobIdsFromChainStdOut(stdout)
+        self.assertTrue(output == {'main': 359, 'reduce': 360, 'cleanup': 361})
+
+    def test_parseDiskUsageOutput(self):
+        df_dict = base_connection.Connection.parseDfOutput('Filesystem 1024-blocks Used Available Capacity Mounted on\n/dev/sda1 1000 400 600 40% /')
+        lfs_dict = base_connection.Connection.parseQuotaOutput('/mnt/lustre\n 1200* 1000 2000 6d 10 0 0 -')
+        quota_dict = base_connection.Connection.parseQuotaOutput('/dev/sdb1 300 0 500 4 0 0')
+        self.assertTrue((df_dict == {'usage': 400, 'soft_limit': 1000, 'hard_limit': 1000, 'units': 'KB'}) and (lfs_dict == {'usage': 1200, 'soft_limit': 1000, 'hard_limit': 2000, 'units': 'KB'}) and (quota_dict == {'usage': 300, 'soft_limit': float('inf'), 'hard_limit': 500, 'units': 'KB'}))
+
+    def test_diskUsageIndex(self):
+        usage_dir = os.path.abspath(self.base_dir) + '/disk_usage_index/output'
+        fake_cluster = FakeLocalShellCluster(os.path.abspath(self.base_dir) + '/disk_usage_index/runfiles')
+        # the output directory doesn't exist until the first task writes to it
+        missing_usage_dict = fake_cluster.updateDiskUsageIndex(usage_dir)
+        os.makedirs(usage_dir)
+        for file_name in ('a.txt', 'b.txt'):
+            with open(usage_dir + '/' + file_name, mode = 'wb') as output_file:
+                output_file.write(b'x' * 2048)
+        first_usage_dict = fake_cluster.updateDiskUsageIndex(usage_dir)
+        # a file copied in with its old modification time kept (e.g. by 'rsync -a') is still seen by an incremental update
+        with open(usage_dir + '/c.txt', mode = 'wb') as output_file:
+            output_file.write(b'x' * 1024)
+        os.utime(usage_dir + '/c.txt', (0, 0))
+        copied_usage_dict = fake_cluster.updateDiskUsageIndex(usage_dir)
+        os.remove(usage_dir + '/a.txt')
+        rescan_usage_dict = fake_cluster.updateDiskUsageIndex(usage_dir, full_rescan = True)
+        # deleted files are noticed by the periodic full rescan
+        os.remove(usage_dir + '/c.txt')
+        fake_cluster.full_rescan_interval = -1
+        periodic_usage_dict = fake_cluster.updateDiskUsageIndex(usage_dir)
+        self.assertTrue((missing_usage_dict['usage'] == 0) and (first_usage_dict['usage'] == 4) and (copied_usage_dict['usage'] == 5) and (rescan_usage_dict['usage'] == 3) and (periodic_usage_dict['usage'] == 2) and (os.listdir(usage_dir) == ['b.txt']))
+
+    def test_checkDiskUsage(self):
+        fake_cluster = FakeLocalShellCluster(os.path.abspath(self.base_dir) + '/check_disk_usage/runfiles')
+        # BasePbs doesn't need to implement checkDiskUsage and the result is cached
+        disk_usage_dict = fake_cluster.checkDiskUsage(os.path.abspath(self.base_dir))
+        no_of_commands_sent = len(fake_cluster.list_of_commands_sent)
+        cached_disk_usage_dict = fake_cluster.checkDiskUsage(os.path.abspath(self.base_dir))
+        self.assertTrue((disk_usage_dict['units'] == 'KB') and (disk_usage_dict['usage'] <= disk_usage_dict['hard_limit']) and (cached_disk_usage_dict is disk_usage_dict) and (len(fake_cluster.list_of_commands_sent) == no_of_commands_sent))
+
+    def test_scanRemoteFileIndex(self):
+        scan_dir = os.path.abspath(self.base_dir) + '/file_index_scan/output'
+        index_db_path = self.base_dir + '/test_scan_index.db'
+        fake_cluster = FakeLocalShellCluster(os.path.abspath(self.base_dir) + '/file_index_scan/runfiles')
+        # the first scan of a generation's output can happen before any task has run
+        missing_output_dict = fake_cluster.scanRemoteFileIndex(scan_dir, index_db_path)
+        os.makedirs(scan_dir + '/child1')
+        with open(scan_dir + '/child1/data.txt', mode = 'wt', encoding = 'utf-8') as output_file:
+            output_file.write('data\n')
+        first_output_dict = fake_cluster.scanRemoteFileIndex(scan_dir, index_db_path)
+        # nothing has changed so the incremental scan lists nothing
+        second_output_dict = fake_cluster.scanRemoteFileIndex(scan_dir, index_db_path)
+        # the periodic full rescan notices deleted files
+        os.remove(scan_dir + '/child1/data.txt')
+        fake_cluster.full_rescan_interval = -1
+        periodic_output_dict = fake_cluster.scanRemoteFileIndex(scan_dir, index_db_path)
+        self.assertTrue((missing_output_dict['no_of_files_in_index'] == 0) and (first_output_dict['no_of_files_scanned'] == 1) and (second_output_dict == {'return_code': 0, 'no_of_files_scanned': 0, 'no_of_files_in_index': 1}) and (periodic_output_dict['no_of_files_in_index'] == 0) and (os.listdir(scan_dir) == ['child1']))
+
+    def test_stageFilesByContent(self):
+        staging_dir = os.path.abspath(self.base_dir) + '/content_staging'
+        os.makedirs(staging_dir + '/local')
+        os.makedirs(staging_dir + '/remote/generation1')
+        os.makedirs(staging_dir + '/remote/generation2')
+        for file_name, contents in (('settings.txt', 'same\n'), ('template.txt', 'same\n'), ('model.txt', 'different\n')):
+            with open(staging_dir + '/local/' + file_name, mode = 'wt', encoding = 'utf-8') as local_file:
+                local_file.write(contents)
+        fake_cluster = FakeLocalShellCluster(staging_dir + '/runfiles')
+        fake_cluster.object_store_path = staging_dir + '/runfiles/.object_store'
+        object_names = [fake_cluster.getObjectName(staging_dir + '/local/' + file_name) for file_name in ('settings.txt', 'template.txt', 'model.txt')]
+        # files with the same contents are only sent once and a second generation sends nothing
+        fake_cluster.stageFilesByContent({staging_dir + '/local/' + file_name: staging_dir + '/remote/generation1' for file_name in ('settings.txt', 'template.txt', 'model.txt')})
+        no_of_first_transfers = len(fake_cluster.list_of_transfers)
+        fake_cluster.stageFilesByContent({staging_dir + '/local/' + file_name: staging_dir + '/remote/generation2' for file_name in ('settings.txt', 'model.txt')})
+        no_of_second_transfers = len(fake_cluster.list_of_transfers) - no_of_first_transfers
+        # the store is purged but the cluster connection still thinks it has the objects
+        shutil.rmtree(fake_cluster.object_store_path)
+        shutil.rmtree(staging_dir + '/remote/generation2')
+        os.makedirs(staging_dir + '/remote/generation2')
+        fake_cluster.stageFilesByContent({staging_dir + '/local/settings.txt': staging_dir + '/remote/generation2'})
+        self.assertTrue((object_names[0] == object_names[1]) and (object_names[0] != object_names[2]) and (no_of_first_transfers == 2) and (no_of_second_transfers == 0) and (len(fake_cluster.list_of_transfers) == 3) and (open(staging_dir + '/remote/generation1/template.txt').read() == 'same\n') and (open(staging_dir + '/remote/generation2/settings.txt').read() == 'same\n') and any(['if [ -f ' + fake_cluster.object_store_path + '/' + object_names[2] + ' ]; then ln -f ' in command for command in fake_cluster.list_of_commands_sent]))
+
+    def test_fileIndex(self):
+        index_db_path = self.base_dir + '/test_file_index.db'
+        db_conn = base_connection.Connection.openFileIndex(index_db_path)
+        base_connection.Connection.insertRowsIntoFileIndex(db_conn, [('/out', '/out/child1/data.txt', 10, 1.0, 1), ('/out', '/out/child2/data.txt', 0, 1.0, 1), ('/other', '/other/data.txt', 5, 1.0, 1)])
+        db_conn.commit()
+        db_conn.close()
+        list_of_files = base_connection.Connection.getFilesFromIndex(index_db_path, '/out/')
+        existing_files = base_connection.Connection.getExistingFilesFromIndex(index_db_path, ['/out/child1/data.txt', '/out/child2/data.txt', '/out/child3/data.txt'])
+        self.assertTrue(([row[0] for row in list_of_files] == ['/out/child1/data.txt', '/out/child2/data.txt']) and (existing_files == {'/out/child1/data.txt'}))
+
+    def test_parseAccountingOutput(self):
+        pbs_stdout = "Job Id: 123[1].server\n    job_state = C\n    resources_used.cput = 00:01:30\n    resources_used.mem = 2048kb\n    resources_used.walltime = 00:01:00\n    exit_status = 0\nJob Id: 123[2].server\n    job_state = R\n    resources_used.walltime = 00:00:10\n"
+        slurm_stdout = "123_4|COMPLETED|62|01:02.500|\n123_4.batch|COMPLETED|62|01:02.500|1.5M\n123_4.0|COMPLETED|60|00:30|2048K\n123_5|RUNNING|10|00:05|\n"
+        pbs_records = base_connection.BasePbs.parseAccountingOutput(pbs_stdout)
+        slurm_records = base_connection.BaseSlurm.parseAccountingOutput(slurm_stdout)
+        self.assertTrue((pbs_records == [{'array_index': 1, 'runtime_seconds': 60.0, 'cpu_time_seconds': 90.0, 'peak_memory_KB': 2048.0, 'state': 'COMPLETED'}]) and (slurm_records == [{'array_index': 4, 'runtime_seconds': 62.0, 'cpu_time_seconds': 62.5, 'peak_memory_KB': 2048.0, 'state': 'COMPLETED'}]))
+
+    def test_recommendResources(self):
+        fake_cluster = FakeBaseConnection('ssh_alias', 'user_name', 'forename', 'surname', 'email', None)
+        fake_cluster.resource_history_db_path = self.base_dir + '/test_resource_history.db'
+        db_conn = base_connection.BaseCluster.openResourceHistory(fake_cluster.resource_history_db_path)
+        # twenty tasks that took between 100 and 1000 seconds using two cores plus a failed task that shouldn't count
+        db_conn.executemany('INSERT INTO accounting (cluster, job_class, job_number, array_index, runtime_seconds, cpu_time_seconds, peak_memory_KB, state, time_recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [('ssh_alias', 'test_class', 1, idx, 50.0 * idx, 100.0 * idx, 1000.0, 'COMPLETED', 0.0) for idx in range(2, 22)] + [('ssh_alias', 'test_class', 1, 22, 100000.0, 100.0, 1000.0, 'TIMEOUT', 0.0)])
+        db_conn.commit()
+        db_conn.close()
+        recommendation_dict = base_connection.BaseCluster.recommendResources(fake_cluster, 'test_class', quantile = 0.95, safety_factor = 1.5, min_samples = 10)
+        # the 95th percentile is 1000 seconds which times 1.5 is 25 minutes
+        self.assertTrue((recommendation_dict == {'walltime': '00:25:00', 'walltime_seconds': 1500, 'no_of_cores': 2, 'memory_KB': 1500, 'no_of_samples': 20}) and (base_connection.BaseCluster.recommendResources(fake_cluster, 'test_class', min_samples = 30) is None))
+
+    def test_chooseQueue(self):
+        pbs_stdout = "QUEUE=short\n    state_count = Transit:0 Queued:5 Held:0 Waiting:0 Running:10 Exiting:0\n    resources_max.walltime = 01:00:00\nPartition  Tasks  Nodes  Duration  StartOffset  StartDate\n---------  -----  -----  --------  -----------  ---------\nALL        8      1      INFINITY  00:00:00     10:33:21_11/20\n"
+        slurm_stdout = "QUEUE=long 10/22/0/32 2-00:00:00 3\nQUEUE=missing\n"
+        pbs_availability = base_connection.BasePbs.parseQueueAvailabilityOutput(pbs_stdout)
+        slurm_availability = base_connection.BaseSlurm.parseQueueAvailabilityOutput(slurm_stdout)
+        self.assertTrue((pbs_availability == {'short': {'backfill_windows': [(8, float('inf'))], 'pending_jobs': 5, 'max_walltime_seconds': 3600.0}}) and (slurm_availability == {'long': {'backfill_windows': [(22, 172800.0)], 'pending_jobs': 3, 'max_walltime_seconds': 172800.0}}))
+        fake_cluster = FakeBaseConnection('ssh_alias', 'user_name', 'forename', 'surname', 'email', None)
+        fake_cluster.getQueueAvailability = lambda list_of_queue_names: {'short': pbs_availability['short'], 'long': slurm_availability['long']}
+        # 20 tasks: on 'short' the 4 hour shape is too long and 4 cores per task means 2 at a time (10 hours), on 'long' 22 free cores run all 20 single core tasks at once (4 hours)
+        choice_dict = base_connection.BaseCluster.chooseQueue(fake_cluster, 20, [{'no_of_cores': 1, 'walltime': '04:00:00'}, {'no_of_cores': 4, 'walltime': '01:00:00'}], {'short': {}, 'long': {'slurm_account_name': 'test_account'}})
+        self.assertTrue(choice_dict == {'queue_name': 'long', 'slurm_account_name': 'test_account', 'no_of_cores': 1, 'walltime': '04:00:00', 'max_concurrent_tasks': 20, 'start_delay_seconds': 0.0, 'time_to_completion_seconds': 14400.0})
+
+    def test_arrayIndexSet(self):
+        all_tasks = base_connection.ArrayIndexSet.fromArraySpec('1-20,25-30:5%50')
+        tasks_left = all_tasks - base_connection.ArrayIndexSet([3, 4, 5, 17, 30])
+        merged_tasks = base_connection.ArrayIndexSet([21, 22]) | base_connection.ArrayIndexSet.fromArraySpec('18-20,23')
+        self.assertTrue((all_tasks.toArraySpec() == '1-20,25,30%50') and (tasks_left.toArraySpec() == '1-2,6-16,18-20,25%50') and (len(tasks_left) == 17) and (17 not in tasks_left) and (18 in tasks_left) and (merged_tasks.toArraySpec() == '18-23') and ((all_tasks & merged_tasks).toArraySpec(include_max_concurrent_tasks = False) == '18-20'))
+
+    def test_submissionGovernor(self):
+        fake_cluster = FakePbsCluster()
+        fake_cluster.max_queued_tasks = 100
+        fake_cluster.tasks_in_queue = 70
+        first_ticket = fake_cluster.governSubmission('qsub first.sh', 20)
+        large_ticket = fake_cluster.governSubmission('qsub large.sh', 40)
+        small_ticket = fake_cluster.governSubmission('qsub small.sh', 5)
+        # only 30 tasks fit so the first submission is released and the small one doesn't overtake the large one
+        first_release = fake_cluster.releaseGovernedSubmissions()
+        fake_cluster.tasks_in_queue = 50
+        second_release = fake_cluster.releaseGovernedSubmissions()
+        self.assertTrue((first_release == [first_ticket]) and (second_release == [large_ticket, small_ticket]) and (fake_cluster.list_of_commands_sent == ['qsub first.sh', 'qsub large.sh', 'qsub small.sh']) and (base_connection.BasePbs.parseMaxQueuedTasksOutput('set server max_user_queuable = 200\nset queue workq max_queued = [u:PBS_GENERIC=150]') == 150))
+        with self.assertRaises(ValueError):
+            fake_cluster.governSubmission('qsub huge.sh', 101)
+
+    def test_submitJobWithToken(self):
+        fake_cluster = FakePbsCluster()
+        # the first submission gets through to the queue but the connection drops before the job ID comes back
+        fake_cluster.list_of_send_outputs = [{'return_code': 255, 'stdout': '', 'stderr': 'Connection reset'}, {'return_code': 0, 'stdout': '456\n', 'stderr': ''}]
+        submit_command = fake_cluster.createSubmitCommand('/runfiles/submission.sh', submission_token = 'ccftoken')
+        submit_job_ouput_dict = fake_cluster.submitJob(submit_command, 'ccftoken')
+        self.assertTrue((submit_command == 'qsub -N ccftoken /runfiles/submission.sh') and (fake_cluster.list_of_commands_sent == [submit_command, fake_cluster.createFindTokenCommand('ccftoken')]) and (submit_job_ouput_dict['stdout'] == '456') and (fake_cluster.getJobIdFromSubStdOut(submit_job_ouput_dict['stdout']) == 456))
+
+    def test_findTokenCommands(self):
+        fake_cluster = FakePbsCluster()
+        bin_dir = os.path.abspath(self.base_dir) + '/find_token_bin'
+        os.makedirs(bin_dir)
+        # TORQUE's qselect doesn't understand -x, the token is longer than the 10 characters PBS Pro shows in 'qstat -u' and job 791 has already left the SLURM queue
+        fake_commands_dict = {'qselect': 'for arg in "$@"; do [ "${arg}" = "-x" ] && exit 2; done\necho "456[].server"', 'squeue': 'printf "789_[1-3]|ccf1a2b3c4d5e6\\n790|other\\n"', 'sacct': 'printf "789_1|ccf1a2b3c4d5e6\\n791|ccf1a2b3c4d5e6\\n"'}
+        for command_name, command_body in fake_commands_dict.items():
+            fake_cluster.createLocalFile(bin_dir + '/' + command_name, ['#!/bin/bash', command_body], '700')
+        list_of_outputs = []
+        for find_cmd in (fake_cluster.createFindTokenCommand('ccf1a2b3c4d5e6'), base_connection.BaseSlurm.createFindTokenCommand(fake_cluster, 'ccf1a2b3c4d5e6')):
+            list_of_outputs.append(subprocess.run(['/bin/bash', '-c', find_cmd], env = dict(os.environ, PATH = bin_dir + ':' + os.environ['PATH']), check = True, stdout = subprocess.PIPE, universal_newlines = True).stdout.split())
+        self.assertTrue(list_of_outputs == [['456'], ['789', '791']])
+
+    def test_pilotWorkQueue(self):
+        queue_dir = os.path.abspath(self.base_dir) + '/pilot_queue'
+        fake_cluster = FakeLocalShellCluster(os.path.abspath(self.base_dir))
+        fake_cluster.enqueuePilotTasks(queue_dir, {'child' + str(idx): ['echo child' + str(idx)] for idx in range(1, 21)})
+        # a task that exits with 124 looks like it ran out of walltime every time it is run
+        fake_cluster.enqueuePilotTasks(queue_dir, {'bad_child': ['exit 3'], 'slow_child': ['exit 124']})
+        # run the worker on the local computer with 4 workers, a minute until the end time and 2 timeouts allowed
+        subprocess.run(['/bin/bash', queue_dir + '/pilot_worker.sh', queue_dir, str(int(time.time()) + 60), '4', '2'], check = True)
+        with open(queue_dir + '/logs/bad_child.exit_code') as exit_code_file:
+            exit_code = exit_code_file.read().strip()
+        with open(queue_dir + '/logs/slow_child.timeouts') as timeouts_file:
+            no_of_timeouts = timeouts_file.read().strip()
+        # pilots with more than one node need a task per node for srun to start a worker on each of them
+        slurm_template_list = base_connection.BaseSlurm.createSubmissionScriptTemplate(fake_cluster, 'pilot', 2, 4, '1-3', '01:00:00', 'testq', '/output/pilot', '/output/pilot')
+        self.assertTrue((sorted(os.listdir(queue_dir + '/done')) == sorted(['child' + str(idx) for idx in range(1, 21)])) and (sorted(os.listdir(queue_dir + '/failed')) == ['bad_child', 'slow_child']) and (os.listdir(queue_dir + '/pending') == []) and (os.listdir(queue_dir + '/running') == []) and (exit_code == '3') and (no_of_timeouts == '2') and (sorted(os.listdir(queue_dir)) == ['done', 'failed', 'logs', 'pending', 'pilot_worker.sh', 'running']) and ('#SBATCH --nodes=2' in slurm_template_list) and ('#SBATCH --ntasks-per-node=1' in slurm_template_list))
+
+    def test_environmentSnapshot(self):
+        snapshot_path = os.path.abspath(self.base_dir) + '/environment_snapshot.sh'
+        activate_venv_list = ['export CCF_TEST_VARIABLE="a value with spaces"', 'unset CCF_TEST_REMOVED', 'ccfTestModule() { echo "module $1"; }', 'export -f ccfTestModule']
+        with open(self.base_dir + '/create_snapshot.sh', mode = 'wt', encoding = 'utf-8') as snapshot_script:
+            snapshot_script.write("\n".join(base_connection.BaseCluster.createEnvironmentSnapshotScriptLines(activate_venv_list, snapshot_path)) + "\n")
+        subprocess.run(['/bin/bash', self.base_dir + '/create_snapshot.sh'], check = True, env = dict(os.environ, CCF_TEST_REMOVED = 'old'))
+        fake_cluster = FakePbsCluster()
+        fake_cluster.activate_venv_list = activate_venv_list
+        fake_cluster.environment_snapshot_path = snapshot_path
+        # a new shell that sources the snapshot should end up with the same environment, including the function (in child shells too as it was exported)
+        task_output = subprocess.run(['/bin/bash', '-c', "\n".join(fake_cluster.getEnvironmentActivationLines() + ['echo "${CCF_TEST_VARIABLE}|${CCF_TEST_REMOVED-unset}"', 'bash -c "ccfTestModule add"'])], check = True, stdout = subprocess.PIPE, universal_newlines = True, env = dict(os.environ, CCF_TEST_REMOVED = 'old')).stdout
+        self.assertTrue(task_output == 'a value with spaces|unset\nmodule add\n')
+
+    def test_packedEnvironmentActivation(self):
+        # the environment's path has characters that mean something to sed
+        environment_prefix = os.path.abspath(self.base_dir) + '/envs/env#1.0'
+        os.makedirs(environment_prefix + '/bin')
+        with open(environment_prefix + '/bin/ccf_tool', mode = 'wt', encoding = 'utf-8') as tool_file:
+            tool_file.write('unpacked tool\n')
+        snapshot_path = os.path.abspath(self.base_dir) + '/environment_snapshot.sh'
+        with open(snapshot_path, mode = 'wt', encoding = 'utf-8') as snapshot_file:
+            snapshot_file.write('export CCF_TOOL_PATH=' + environment_prefix + '/bin/ccf_tool\n')
+        environment_pack_path = os.path.abspath(self.base_dir) + '/environment_snapshot_0123abcd.tar'
+        with tarfile.open(environment_pack_path, mode = 'w') as tar:
+            tar.add(environment_prefix, arcname = 'env#1.0')
+        fake_cluster = FakePbsCluster()
+        fake_cluster.environment_snapshot_path = snapshot_path
+        fake_cluster.environment_pack_path = environment_pack_path
+        fake_cluster.environment_pack_prefix = environment_prefix
+        # use the default scratch directory with a job ID that no other test run uses
+        job_id = 'ccftest' + str(os.getpid())
+        task_output = subprocess.run(['/bin/bash', '-c', "\n".join(fake_cluster.getEnvironmentActivationLines() + ['echo "${CCF_TOOL_PATH}"', 'cat "${CCF_TOOL_PATH}"'])], check = True, stdout = subprocess.PIPE, universal_newlines = True, env = dict(os.environ, PBS_JOBID = job_id + '[1].server', PBS_ARRAYID = '1')).stdout
+        self.assertTrue((task_output == '/tmp/ccf_' + job_id + '/env_environment_snapshot_0123abcd/env#1.0/bin/ccf_tool\nunpacked tool\n') and (not os.path.exists('/tmp/ccf_' + job_id)))
+
+    def test_scratchStaging(self):
+        staging_dir = os.path.abspath(self.base_dir) + '/scratch staging'
+        os.makedirs(staging_dir + '/shared')
+        os.makedirs(staging_dir + '/scratch')
+        with open(staging_dir + '/shared/model input.txt', mode = 'wt', encoding = 'utf-8') as input_file:
+            input_file.write('shared input\n')
+        fake_cluster = FakePbsCluster()
+        list_of_lines = fake_cluster.createScratchStagingLines({'list_of_shared_inputs': [staging_dir + '/shared/model input.txt'], 'output_dir': staging_dir + '/output/${PBS_ARRAYID}', 'scratch_dir': staging_dir + '/scratch'})
+        job_specific_lines = ['cat "${CCF_SHARED_INPUTS_DIR}/model input.txt" > "${CCF_TASK_OUTPUT_DIR}/result.txt"', 'echo "${CCF_SHARED_INPUTS_DIR}" >> "${CCF_TASK_OUTPUT_DIR}/result.txt"']
+        # two tasks of the same job on the same node, the first one is still running when the second one exits
+        release_path = staging_dir + '/release_first_task'
+        first_task = subprocess.Popen(['/bin/bash', '-c', "\n".join(list_of_lines + job_specific_lines + ['while [ ! -e "' + release_path + '" ]; do sleep 0.1; done'])], env = dict(os.environ, PBS_JOBID = '123[1].server', PBS_ARRAYID = '1'))
+        while not os.path.exists(staging_dir + '/scratch/ccf_123/inputs/.staged'):
+            time.sleep(0.1)
+        subprocess.run(['/bin/bash', '-c', "\n".join(list_of_lines + job_specific_lines)], check = True, env = dict(os.environ, PBS_JOBID = '123[2].server', PBS_ARRAYID = '2'))
+        scratch_while_running = os.listdir(staging_dir + '/scratch')
+        open(release_path, 'w').close()
+        first_task.wait()
+        results_are_correct = all([open(staging_dir + '/output/' + array_index + '/result.txt').read() == 'shared input\n' + staging_dir + '/scratch/ccf_123/inputs\n' for array_index in ('1', '2')])
+        self.assertTrue((scratch_while_running == ['ccf_123']) and (first_task.returncode == 0) and results_are_correct and (os.listdir(staging_dir + '/scratch') == []))
+
+    def test_scratchStagingDefaultScratchDir(self):
+        staging_dir = os.path.abspath(self.base_dir) + '/scratch_staging'
+        os.makedirs(staging_dir + '/shared')
+        with open(staging_dir + '/shared/model_input.txt', mode = 'wt', encoding = 'utf-8') as input_file:
+            input_file.write('shared input\n')
+        fake_cluster = FakePbsCluster()
+        list_of_lines = fake_cluster.createScratchStagingLines({'list_of_shared_inputs': [staging_dir + '/shared/model_input.txt'], 'output_dir': staging_dir + '/output/${PBS_ARRAYID}'})
+        # a job ID that no other test run uses and a task that fails
+        job_id = 'ccftest' + str(os.getpid())
+        completed_process = subprocess.run(['/bin/bash', '-c', "\n".join(list_of_lines + ['echo "${CCF_SHARED_INPUTS_DIR}" > "${CCF_TASK_OUTPUT_DIR}/inputs_dir.txt"', 'exit 5'])], env = dict(os.environ, PBS_JOBID = job_id + '[1].server', PBS_ARRAYID = '1'))
+        self.assertTrue((completed_process.returncode == 5) and (open(staging_dir + '/output/1/inputs_dir.txt').read() == '/tmp/ccf_' + job_id + '/inputs\n') and (not os.path.exists('/tmp/ccf_' + job_id)))
+
+    def test_progressReporting(self):
+        progress_dir = os.path.abspath(self.base_dir) + '/progress'
+        fake_cluster = FakePbsCluster()
+        list_of_lines = fake_cluster.createProgressReportingLines(progress_dir)
+        # task 1 reports twice (only the latest record is kept) and task 2 reports from a child shell
+        subprocess.run(['/bin/bash', '-c', "\n".join(list_of_lines + ['reportProgress 0.1 1.0 9.0', 'reportProgress 0.5 2.0 8.0'])], check = True, env = dict(os.environ, PBS_JOBID = '123[1].server', PBS_ARRAYID = '1'))
+        subprocess.run(['/bin/bash', '-c', "\n".join(list_of_lines + ['bash -c "reportProgress 0.25 -1.5 3.5"'])], check = True, env = dict(os.environ, PBS_JOBID = '123[2].server', PBS_ARRAYID = '2'))
+        # run the harvesting command on this computer
+        fake_cluster.harvestProgressRecords(progress_dir, [123, 124])
+        harvest_stdout = subprocess.run(['/bin/bash', '-c', fake_cluster.list_of_commands_sent[-1]], check = True, stdout = subprocess.PIPE, universal_newlines = True).stdout
+        job_number_to_progress_records_dict = base_connection.BaseCluster.parseProgressRecords(harvest_stdout + 'not a record\n')
+        self.assertTrue(job_number_to_progress_records_dict == {123: {1: {'progress_fraction': 0.5, 'partial_score': 2.0, 'optimistic_bound': 8.0}, 2: {'progress_fraction': 0.25, 'partial_score': -1.5, 'optimistic_bound': 3.5}}})
+
     # METHODS THAT ASSIST THE TEST METHODS
     def returnZeroIfFiveIsPassed(self, input_integer):
         output = {}
@@ -234,6 +514,77 @@ class FakeBaseConnection():
         self.user_email = email
         self.affiliation = affiliation
 
+class FakePbsCluster(base_connection.BasePbs):
+    """
+    A BasePbs instance that records the commands it is asked to send rather than connecting to a cluster.
+    """
+    def __init__(self):
+        base_connection.BasePbs.__init__(self, 'user_name', 'ssh_alias', 'forename', 'surname', 'email', '/output', '/runfiles', 'Fake cluster', 500)
+        self.list_of_commands_sent = []
+        self.list_of_send_outputs = []
+        self.tasks_in_queue = 0
+
+    def streamTarToRemote(self, tar_bytes, remote_dir):
+        # the 'remote' computer is this computer
+        with tarfile.open(fileobj = io.BytesIO(tar_bytes)) as tar:
+            tar.extractall(remote_dir)
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def countTasksInQueue(self):
+        return self.tasks_in_queue
+
+    def sendCommand(self, list_of_shell_commands):
+        self.list_of_commands_sent += list_of_shell_commands
+        if len(self.list_of_send_outputs) > 0:
+            return self.list_of_send_outputs.pop(0)
+        return {'return_code': 0, 'stdout': '123.server', 'stderr': ''}
+
+class FakeLocalShellCluster(FakePbsCluster):
+    """
+    A BasePbs instance whose 'remote' computer is this computer, i.e. the commands it sends are run by a local bash shell.
+    """
+    def __init__(self, base_runfiles_path):
+        FakePbsCluster.__init__(self)
+        self.base_runfiles_path = base_runfiles_path
+        self.marker_dir = base_runfiles_path + '/.ccf_markers'
+        self.list_of_transfers = []
+
+    def transferFile(self, source, destination, source_loc = 'local', dest_loc = 'remote', rsync_flags = "-aP"):
+        self.list_of_transfers.append((source, destination))
+        os.makedirs(os.path.dirname(destination), exist_ok = True)
+        shutil.copy2(source, destination)
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def sendCommand(self, list_of_shell_commands):
+        self.list_of_commands_sent += list_of_shell_commands
+        completed_process = subprocess.run(['/bin/bash', '-c', "\n".join(list_of_shell_commands)], stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+        return {'return_code': completed_process.returncode, 'stdout': completed_process.stdout, 'stderr': completed_process.stderr}
+
+    def streamFileListIntoIndex(self, list_of_remote_commands, db_conn, root, scan_id):
+        list_process = subprocess.Popen(['/bin/bash', '-c', "\n".join(list_of_remote_commands)], stdout = subprocess.PIPE, universal_newlines = True)
+        output_dict = self.insertFileListIntoIndex(list_process.stdout, db_conn, root, scan_id)
+        list_process.wait()
+        output_dict['return_code'] = list_process.returncode
+        return output_dict
+
+class FakeLegacyCluster(base_connection.BaseCluster):
+    """
+    A cluster class that only defines the methods that BaseCluster needed before job dependencies, accounting, pilots etc were added.
+    """
+    def __init__(self):
+        base_connection.BaseCluster.__init__(self, 'user_name', 'ssh_alias', 'forename', 'surname', 'email', '/output', '/runfiles', 'Fake cluster', 'qsub', 500)
+
+    def checkQueue(self):
+        pass
+
+    def createSubmissionScriptTemplate(self):
+        pass
+
+    def getJobIdFromSubStdOut(self, stdout):
+        pass
+
+    def sendCommand(self, list_of_shell_commands):
+        return {'return_code': 0, 'stdout': '123.server', 'stderr': ''}
 
 if __name__ == '__main__':
     unittest.main()
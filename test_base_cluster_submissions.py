@@ -0,0 +1,213 @@
+import unittest
+import base_cluster_submissions
+import base_connection
+import os
+import time
+import tarfile
+import io
+
+class LocalBaseJobSubmissionTest(unittest.TestCase):
+    """
+    Tests the parts of base_cluster_submissions that can be checked on the local computer without a cluster.
+    """
+    # TEST METHODS
+    def test_orderStagesOfDag(self):
+        stage_name_to_stage_dict = {'cleanup': {'submission_file_name': 'cleanup.sh', 'depends_on': ['reduce'], 'dependency_type': 'afterany'}, 'reduce': {'submission_file_name': 'reduce.sh', 'depends_on': ['main'], 'dependency_type': 'afterokarray'}, 'main': {'submission_file_name': 'main.sh', 'depends_on': [], 'dependency_type': 'afterok'}}
+        ordered_stages = base_cluster_submissions.BaseJobSubmission.orderStagesOfDag(stage_name_to_stage_dict)
+        self.assertTrue(ordered_stages == ['main', 'reduce', 'cleanup'])
+
+    def test_orderStagesOfDagWithCycle(self):
+        stage_name_to_stage_dict = {'a': {'submission_file_name': 'a.sh', 'depends_on': ['b'], 'dependency_type': 'afterok'}, 'b': {'submission_file_name': 'b.sh', 'depends_on': ['a'], 'dependency_type': 'afterok'}}
+        with self.assertRaises(ValueError):
+            base_cluster_submissions.BaseJobSubmission.orderStagesOfDag(stage_name_to_stage_dict)
+
+    def test_createFileForClusterInMemory(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', None, '/out', '/err', '/out', '/runfiles', 1, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.createFileForCluster('test_script.sh', ['#!/bin/bash', 'echo test'], '/runfiles/test_submission', '700')
+        file_dict = submission.in_memory_file_tree['/runfiles/test_submission/test_script.sh']
+        self.assertTrue((file_dict == {'contents': b'#!/bin/bash\necho test\n', 'permissions': 0o700}) and (not os.path.isdir('base_cluster_submissions_test_directory')))
+
+    def test_prepareForSubmissionInMemory(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 1, 1, '/master', 'base_cluster_submissions_test_directory', 'createFakeFiles', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        list_of_output_dicts = submission.prepareForSubmission()
+        # the files are sent as one tar that is unpacked in the runfiles directory of the submission rather than at the root of the file system
+        remote_dir, tar_bytes = submission.cluster_connection.list_of_streamed_tars[0]
+        with tarfile.open(fileobj = io.BytesIO(tar_bytes)) as tar:
+            list_of_names = tar.getnames()
+        self.assertTrue((len(list_of_output_dicts) == 2) and (submission.cluster_connection.list_of_commands_sent == ['mkdir -p /runfiles/test_submission/scripts']) and (remote_dir == '/runfiles/test_submission') and (list_of_names == ['scripts/run.sh', 'submission.sh']) and (not os.path.isdir('base_cluster_submissions_test_directory')))
+
+    def test_waitForDiskSpaceWithOnlyHardLimit(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        # the quota only has a hard limit and the submission would go over it
+        submission.cluster_connection.disk_usage_dict = {'usage': 95, 'soft_limit': float('inf'), 'hard_limit': 100, 'units': 'KB'}
+        with self.assertRaises(ValueError):
+            submission.waitForDiskSpace({'path': '/out', 'expected_KB_per_task': 1, 'max_fraction_of_limit': 1.0, 'wait_time': 0, 'max_wait_time': 0})
+
+    def test_findStragglers(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', None, '/out', '/err', '/out', '/runfiles', 1, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        now = time.time()
+        # ten tasks that took 100 seconds and two running tasks, one for 50 seconds and one for 500 seconds
+        manager.task_start_times = {idx: now - 1000 for idx in range(1, 11)}
+        manager.task_finish_times = {idx: now - 900 for idx in range(1, 11)}
+        manager.task_start_times[11] = now - 50
+        manager.task_start_times[12] = now - 500
+        list_of_stragglers, threshold = manager.findStragglers({11, 12}, 0.9, 5)
+        self.assertTrue((list_of_stragglers == [12]) and (abs(threshold - 100) < 1))
+
+    def test_updateTaskRuntimesIgnoresCancelledOriginals(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        # tasks 3 and 5 have left the queue but task 5 was the original of a copy that won and so was cancelled
+        manager.task_start_times = {3: 0.0, 5: 0.0}
+        manager.speculative_copies = {5: {'submission': submission, 'job_number': 101, 'status': 'copy_won'}}
+        manager.updateTaskRuntimes()
+        self.assertTrue(list(manager.task_finish_times.keys()) == [3])
+
+    def test_resolveSpeculativeCopies(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        connection = submission.cluster_connection
+        # the copies of tasks 4 and 5 (job 103) have finished but only the copy of task 5 succeeded. The original of task 3 failed whilst its copy (job 104) is still running.
+        manager.set_of_tasks_in_queue = {4, 5}
+        connection.job_number_to_tasks_in_queue[104] = [3]
+        connection.job_number_to_accounting_dict[103] = [{'array_index': 4, 'state': 'FAILED'}, {'array_index': 5, 'state': 'COMPLETED'}]
+        connection.job_number_to_accounting_dict[104] = []
+        manager.speculative_copies = {3: {'submission': submission, 'job_number': 104, 'status': 'running'}, 4: {'submission': submission, 'job_number': 103, 'status': 'running'}, 5: {'submission': submission, 'job_number': 103, 'status': 'running'}}
+        manager.resolveSpeculativeCopies()
+        list_of_statuses = [manager.speculative_copies[array_index]['status'] for array_index in (3, 4, 5)]
+        # only the original of task 5 is cancelled. Once the copy of task 3 finishes it wins.
+        connection.job_number_to_tasks_in_queue[104] = []
+        connection.job_number_to_accounting_dict[104] = [{'array_index': 3, 'state': 'COMPLETED'}]
+        manager.resolveSpeculativeCopies()
+        self.assertTrue((list_of_statuses == ['original_failed', 'copy_failed', 'copy_won']) and (connection.cancelled == [(100, [5])]) and (manager.speculative_copies[3]['status'] == 'copy_won') and (manager.set_of_tasks_in_queue == {4}))
+
+    def test_resubmitFailedArrayIndices(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        submission.submission_file_name = 'submission.sh'
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        # task 3 failed in the original job, task 7 is still running and task 9 failed in the original job but passed when it was rerun
+        manager.resubmissions = [(101, [9])]
+        list_of_resubmitted_array_indices = manager.resubmitFailedArrayIndices()
+        self.assertTrue((list_of_resubmitted_array_indices == [3]) and (submission.cluster_connection.list_of_commands_sent == ['qsub -t 3 -N ccftoken /runfiles/test_submission/submission.sh']) and (manager.resubmissions == [(101, [9]), (102, [3])]))
+
+    def test_findFailedArrayIndicesWithSpeculativeCopies(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        # the copy of task 4 (job 103) won so the original was cancelled and the copy of task 5 (job 104) lost so the copy was cancelled
+        accounting_dict = submission.cluster_connection.job_number_to_accounting_dict
+        accounting_dict[100] = [dict(record, state = 'CANCELLED') if record['array_index'] == 4 else record for record in accounting_dict[100]]
+        accounting_dict[103] = [{'array_index': 4, 'state': 'COMPLETED'}]
+        accounting_dict[104] = [{'array_index': 5, 'state': 'CANCELLED'}]
+        manager.speculative_copies = {4: {'submission': submission, 'job_number': 103, 'status': 'copy_won'}, 5: {'submission': submission, 'job_number': 104, 'status': 'original_won'}}
+        self.assertTrue(manager.findFailedArrayIndices() == [3, 9])
+
+    def test_terminateHopelessTasks(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        # task 7 is running and can't reach the threshold, task 3 can't either but has already finished and task 8 hasn't made enough progress to be judged
+        submission.cluster_connection.progress_stdout = '100 7 0.5 1.0 4.0\n100 3 1.0 2.0 2.0\n100 8 0.05 0.0 1.0\n'
+        list_of_terminated_array_indices = manager.terminateHopelessTasks('/out/progress', 5.0, 'max', min_progress_fraction = 0.1)
+        # a task is only cancelled once
+        manager.terminateHopelessTasks('/out/progress', 5.0, 'max', min_progress_fraction = 0.1)
+        self.assertTrue((list_of_terminated_array_indices == [7]) and (submission.cluster_connection.cancelled == [(100, [7])]) and (manager.terminated_array_indices == {7}))
+
+    def test_terminateHopelessTasksWithRepetitions(self):
+        submission = FakeJobSubmission('test_experiment', 'test description', 'test_submission', FakeClusterConnection(), '/out', '/err', '/out', '/runfiles', 10, 1, '/master', 'base_cluster_submissions_test_directory', 'passFunction', 'passFunction', 'passFunction', 'passFunction', in_memory_staging = True)
+        submission.cluster_job_number = 100
+        submission.cluster_connection.job_number_to_tasks_in_queue = {100: [1, 2, 3, 4, 5, 6]}
+        manager = FakeManageSubmission(submission, 'passFunction', 'passFunction', test_mode = True)
+        # each child has two repetitions. One repetition of child1 is hopeless on its own but the mean of both can still beat the threshold, child2 is hopeless and the second repetition of child3 hasn't reported yet.
+        submission.cluster_connection.progress_stdout = '100 1 0.5 1.0 3.0\n100 2 0.5 1.0 8.0\n100 3 0.5 1.0 4.0\n100 4 0.5 1.0 4.5\n100 5 0.5 1.0 1.0\n'
+        array_index_to_child_name_dict = {1: 'child1', 2: 'child1', 3: 'child2', 4: 'child2', 5: 'child3', 6: 'child3'}
+        list_of_terminated_array_indices = manager.terminateHopelessTasks('/out/progress', 5.0, 'max', 0.1, None, array_index_to_child_name_dict, 'getMeanBound', {})
+        self.assertTrue((list_of_terminated_array_indices == [3, 4]) and (submission.cluster_connection.cancelled == [(100, [3, 4])]) and (manager.terminated_array_indices == {3, 4}))
+
+# ADDITIONAL CLASSES
+class FakeJobSubmission(base_cluster_submissions.BaseJobSubmission):
+    """
+    BaseJobSubmission is an abstract class and so this fills in the abstract methods so that an instance can be created for testing.
+    """
+    def createListOfClusterDirectoriesNeeded(self):
+        pass
+
+    def createFakeFiles(self):
+        self.list_of_directories_to_make_on_cluster = [self.runfiles_path + '/scripts']
+        self.createFileForCluster('submission.sh', ['#!/bin/bash', 'echo test'], self.runfiles_path, '700')
+        self.createFileForCluster('run.sh', ['#!/bin/bash', 'echo run'], self.runfiles_path + '/scripts', '700')
+
+class FakeManageSubmission(base_cluster_submissions.BaseManageSubmission):
+    """
+    BaseManageSubmission is an abstract class and so this fills in the abstract methods so that an instance can be created for testing.
+    """
+    def monitorSubmission(self):
+        pass
+
+    def getMeanBound(self, child_name_to_bounds_dict, overallScore_params_dict):
+        return {child_name: [child_name_to_bounds_dict[child_name][0], (sum(child_name_to_bounds_dict[child_name][0]) / len(child_name_to_bounds_dict[child_name][0]),)] for child_name in child_name_to_bounds_dict.keys()}
+
+class FakeClusterConnection():
+    """
+    Looks enough like a base_connection.BaseCluster instance to resubmit and cancel array tasks without connecting to anything.
+    """
+    def __init__(self):
+        self.list_of_commands_sent = []
+        self.list_of_streamed_tars = []
+        self.cancelled = []
+        self.progress_stdout = ''
+        self.use_submission_governor = False
+        self.job_number_to_tasks_in_queue = {100: [7]}
+        self.job_number_to_accounting_dict = {100: [{'array_index': idx, 'state': 'FAILED' if idx in (3, 9) else 'COMPLETED'} for idx in range(1, 11) if idx != 7], 101: [{'array_index': 9, 'state': 'COMPLETED'}]}
+
+    def checkQueue(self, job_number):
+        return {'return_code': 0, 'stdout': ''.join([str(array_index) + '\n' for array_index in self.job_number_to_tasks_in_queue.get(job_number, [])]), 'stderr': ''}
+
+    def checkPendingArrayTasks(self, job_number):
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def getArrayTaskAccounting(self, job_number):
+        return self.job_number_to_accounting_dict[job_number]
+
+    def getArrayIndicesFromQueueStdOut(self, stdout):
+        return base_connection.BaseCluster.getArrayIndicesFromQueueStdOut(stdout)
+
+    def getCachedDiskUsage(self, path, getDiskUsageFuncName = 'getDiskUsageFromQuota', force_refresh = False):
+        return self.disk_usage_dict
+
+    def harvestProgressRecords(self, progress_dir, list_of_job_numbers = None):
+        return base_connection.BaseCluster.parseProgressRecords(self.progress_stdout)
+
+    def cancelArrayTasks(self, job_number, list_of_array_indices):
+        self.cancelled.append((job_number, list_of_array_indices))
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def createSubmitCommand(self, submission_script_name_and_path, array_indices = None, submission_token = None):
+        return 'qsub -t ' + base_connection.ArrayIndexSet(array_indices).toArraySpec() + ' -N ' + submission_token + ' ' + submission_script_name_and_path
+
+    def createSubmissionToken(self):
+        return 'ccftoken'
+
+    def submitJob(self, submit_command, submission_token = None):
+        return self.sendCommand([submit_command])
+
+    def checkSuccess(self, function, *args):
+        return function(*args)
+
+    def streamTarToRemote(self, tar_bytes, remote_dir):
+        self.list_of_streamed_tars.append((remote_dir, tar_bytes))
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def sendCommand(self, list_of_commands):
+        self.list_of_commands_sent += list_of_commands
+        return {'return_code': 0, 'stdout': '102.server', 'stderr': ''}
+
+    def getJobIdFromSubStdOut(self, stdout):
+        return int(stdout.split('.')[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,349 @@
+import unittest
+import base_mga
+import numpy as np
+
+class LocalMgaTest(unittest.TestCase):
+    """
+    Tests the parts of base_mga that can be checked on the local computer without a cluster.
+    """
+    # TEST METHODS
+    def test_cancelPendingChildren(self):
+        fake_cluster = FakeCluster()
+        mga = FakeGeneticAlgorithm({'fake_cluster': fake_cluster})
+        submission_inst = FakeSubmission(13)
+        mga.submission_key_to_cluster_dict = {'fake_cluster_1': 'fake_cluster'}
+        mga.submission_key_to_child_dict = {'fake_cluster_1': {'child1': [1, 0], 'child2': [0, 1], 'child3': [1, 1]}}
+        # child1 has started so only child2 and child3 can be moved
+        stolen_children = mga.cancelPendingChildren('fake_cluster', [('fake_cluster_1', [2, 3])], {'fake_cluster_1': submission_inst}, 5)
+        self.assertTrue((stolen_children == {'child3': [1, 1], 'child2': [0, 1]}) and (fake_cluster.cancelled == [(13, [2, 3])]) and (submission_inst.stolen_genomes == {(0, 1), (1, 1)}))
+
+    def test_cancelPendingChildrenWithRepetitions(self):
+        fake_cluster = FakeCluster()
+        mga = FakeGeneticAlgorithm({'fake_cluster': fake_cluster})
+        mga.reps_of_unique_sim = 2
+        submission_inst = FakeSubmission(13)
+        mga.submission_key_to_cluster_dict = {'fake_cluster_1': 'fake_cluster'}
+        # child3 has the same genome as child1
+        mga.submission_key_to_child_dict = {'fake_cluster_1': {'child1': [1, 0], 'child2': [0, 1], 'child3': [1, 0]}}
+        # array numbers 1 and 2 are child1, 3 and 4 are child2 and 5 and 6 are child3. Only one repetition of child2 is still waiting so it can't be moved.
+        stolen_children = mga.cancelPendingChildren('fake_cluster', [('fake_cluster_1', [4, 5, 6])], {'fake_cluster_1': submission_inst}, 5)
+        # child1 is still in the submission and so the results of the genome that child3 shares with it are kept
+        self.assertTrue((stolen_children == {'child3': [1, 0]}) and (fake_cluster.cancelled == [(13, [5, 6])]) and (submission_inst.stolen_child_name_to_genome_dict == {'child3': [1, 0]}) and (submission_inst.stolen_genomes == set()))
+
+    def test_cancelPendingChildrenWithKnockoutGenomes(self):
+        fake_cluster = FakeCluster()
+        mga = FakeGeneticAlgorithm({'fake_cluster': fake_cluster})
+        submission_inst = FakeSubmission(13)
+        mga.submission_key_to_cluster_dict = {'fake_cluster_1': 'fake_cluster'}
+        genome1 = base_mga.KnockoutGenome(100000, [5])
+        genome2 = base_mga.KnockoutGenome(100000, [7, 9])
+        mga.submission_key_to_child_dict = {'fake_cluster_1': {'child1': genome1, 'child2': genome2}}
+        stolen_children = mga.cancelPendingChildren('fake_cluster', [('fake_cluster_1', [2])], {'fake_cluster_1': submission_inst}, 5)
+        # the genomes are kept sparse rather than being turned into tuples with 100000 genes
+        stolen_genome = list(submission_inst.stolen_genomes)[0]
+        self.assertTrue((stolen_children == {'child2': genome2}) and (submission_inst.stolen_genomes == {genome2}) and (type(stolen_genome) is base_mga.KnockoutGenome) and (mga.stolen_children_dict['child2']['genome'] is genome2) and (mga.getGenomeKey([1, 0]) == (1, 0)))
+
+    def test_createJobSubmissionInstances(self):
+        mga = FakeIslandGeneticAlgorithm({'fast': FakeCluster(), 'slow': FakeCluster()})
+        genome = [1, 0]
+        dict_of_job_submission_insts = mga.createJobSubmissionInstances({'fast': [{'child1': genome, 'child2': [0, 1]}]}, {'createJobSubmisions_params_dict': {}, 'createJobSubmissionFuncName': 'createFakeSubmission'})
+        # user code changing the submission's dict of children doesn't change the record of which children the submission has
+        del dict_of_job_submission_insts['fast_1'].single_child_name_to_genome_dict['child2']
+        self.assertTrue((list(dict_of_job_submission_insts.keys()) == ['fast_1']) and (mga.submission_key_to_child_dict == {'fast_1': {'child1': [1, 0], 'child2': [0, 1]}}) and (mga.submission_key_to_child_dict['fast_1']['child1'] is genome) and (mga.submission_key_to_cluster_dict == {'fast_1': 'fast'}))
+
+    def test_migrateFromIsland(self):
+        mga = FakeGeneticAlgorithm({'a': FakeCluster(), 'b': FakeCluster(), 'c': FakeCluster()}, max_no_of_fit_individuals = 3)
+        mga.island_to_neighbours_dict = mga.getIslandNeighbours(['a', 'b', 'c'], 'ring')
+        mga.island_fittest_individuals = {'a': {(1, 0): [(9,), (9,)], (1, 1): [(8,), (8,)], (0, 1): [(1,), (1,)], (0, 0): [(0,), (0,)]}, 'b': {(2, 0): [(5,), (5,)], (2, 1): [(4,), (4,)], (2, 2): [(3,), (3,)]}, 'c': {}}
+        migrants = mga.migrateFromIsland('a', 0.5, 'max')
+        self.assertTrue((mga.island_to_neighbours_dict == {'a': ['b'], 'b': ['c'], 'c': ['a']}) and (list(migrants.keys()) == [(1, 0), (1, 1)]) and (set(mga.island_fittest_individuals['b'].keys()) == {(1, 0), (1, 1), (2, 0)}) and (mga.island_fittest_individuals['c'] == {}))
+
+    def test_islandRunSimulations(self):
+        mga = FakeIslandGeneticAlgorithm({'fast': FakeCluster(), 'slow': FakeCluster()})
+        mga.cluster_instances_dict['slow'].list_of_tasks_in_queue = [1]
+        runSims_params_dict = {'createJobSubmisions_params_dict': {}, 'createJobSubmissionFuncName': 'createFakeSubmission', 'postSimulationFunctionFuncName': 'recordFakeResults', 'island_params_dict': {'topology': 'ring', 'migration_interval': 1, 'migration_rate': 0.5, 'max_or_min': 'max', 'poll_interval': 0}}
+        mga.generation_counter = 0
+        mga.islandRunSimulations(runSims_params_dict)
+        mga.generation_counter += 1
+        # only the fast island has finished so only it has bred a second generation and its best genome has migrated to the slow island. The diversity record is of the merged population rather than the last island to update.
+        mga.islandRunSimulations(runSims_params_dict)
+        self.assertTrue((mga.list_of_submitted_generations == [('fast', 0), ('slow', 0), ('fast', 1)]) and (mga.generation_counter == 1) and (mga.island_generation_counter_dict == {'fast': 2, 'slow': 0}) and (list(mga.island_fittest_individuals['slow'].keys()) == [(1, 1), (1, 0)]) and (list(mga.island_to_submissions_dict.keys()) == ['slow']) and (mga.diversity_record['no_of_individuals'] == len(mga.fittest_individuals)) and np.array_equal(mga.diversity_monitor.knockout_counts, np.sum(list(mga.fittest_individuals.keys()), axis = 0)))
+
+    def test_preScreenChildren(self):
+        mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()})
+        runSims_params_dict = {'preScreen_params_dict': {'submit_fraction': 0.3, 'exploration_fraction': 0.1, 'min_training_samples': 20, 'ridge_penalty': 0.01, 'max_or_min': 'max'}}
+        rng = np.random.default_rng(0)
+        # the first four genes of each candidate are the binary digits of its index so that no two candidates have the same fitness
+        list_of_candidates = [[(idx >> bit) & 1 for bit in range(4)] + list(rng.integers(0, 2, size = 4)) for idx in range(10)]
+        child_name_to_genome_dict = {'child' + str(idx + 1): list_of_candidates[idx] for idx in range(10)}
+        # there is nothing to train the surrogate with yet so every child is kept
+        self.assertTrue(mga.preScreenChildren(child_name_to_genome_dict, runSims_params_dict) == child_name_to_genome_dict)
+        # fitness is the first four genes read as a binary number (scores of genomes seen twice are replaced)
+        list_of_training_genomes = [list(genome) for genome in rng.integers(0, 2, size = (50, 8))]
+        mga.surrogate_model.addObservations(list_of_training_genomes, [0 for genome in list_of_training_genomes])
+        mga.surrogate_model.addObservations(list_of_training_genomes, [self.getBinaryFitness(genome) for genome in list_of_training_genomes])
+        kept_children = mga.preScreenChildren(child_name_to_genome_dict, runSims_params_dict)
+        best_children = sorted(child_name_to_genome_dict.keys(), key = lambda child_name: self.getBinaryFitness(child_name_to_genome_dict[child_name]), reverse = True)[:3]
+        self.assertTrue((len(kept_children) == 4) and set(best_children).issubset(kept_children.keys()) and (abs(mga.surrogate_model.predict([[1, 1, 0, 1, 0, 0, 0, 0]])[0] - 11) < 0.1))
+
+    def test_racingRunSimulations(self):
+        mga = FakeRacingGeneticAlgorithm({'fake_cluster': FakeCluster()})
+        runSims_params_dict = {'createJobSubmisions_params_dict': {}, 'createJobSubmissionFuncName': 'createFakeSubmission', 'postSimulationFunctionFuncName': 'recordRacingResults', 'racing_params_dict': {'initial_repetitions': 2, 'repetitions_per_round': 2, 'max_repetitions': 6, 'confidence_z': 2, 'max_or_min': 'max'}}
+        mga.generation_counter = 0
+        mga.racingRunSimulations(runSims_params_dict)
+        # (1, 1) is clearly in and (0, 0) is clearly out after the first round but (1, 0) and (0, 1) are too close to call until they reach the maximum repetitions
+        self.assertTrue((mga.list_of_rounds == [(['child1', 'child2', 'child3', 'child4'], 2), (['child2_round2', 'child3_round2'], 2), (['child2_round3', 'child3_round3'], 2)]) and (list(mga.fittest_individuals.keys()) == [(1, 1), (0, 1)]) and (len(mga.fittest_individuals[(0, 1)][0]) == 6) and (mga.reps_of_unique_sim == 1) and (mga.racing_genome_to_scores_dict is None))
+
+    def test_knockoutGenome(self):
+        mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()})
+        dense_parent1 = [1] * 200
+        dense_parent2 = [1] * 200
+        for idx in (3, 50, 120):
+            dense_parent1[idx] = 0
+        for idx in (10, 50, 199):
+            dense_parent2[idx] = 0
+        parent1 = base_mga.KnockoutGenome.fromDense(dense_parent1)
+        parent2 = base_mga.KnockoutGenome.fromDense(dense_parent2)
+        self.assertTrue((parent1.knockouts == (3, 50, 120)) and (parent1.toDense() == dense_parent1) and (parent1 == base_mga.KnockoutGenome(200, [120, 3, 50])) and (hash(parent1) == hash(base_mga.KnockoutGenome(200, [120, 3, 50]))) and (parent1[50] == 0) and (parent1[51] == 1) and (len(parent1) == 200))
+        # the sparse slice mate and mutations use the random numbers in the same way as the dense versions
+        for seed in range(20):
+            mga.random_generator = np.random.default_rng(seed)
+            dense_child = mga.uniformMutation(mga.sliceMate(dense_parent1.copy(), dense_parent2.copy(), {}), {'mutation_probability': 0.5, 'number_of_mutations': 3})
+            mga.random_generator = np.random.default_rng(seed)
+            sparse_child = mga.sparseUniformMutation(mga.sparseSliceMate(parent1, parent2, {}), {'mutation_probability': 0.5, 'number_of_mutations': 3})
+            self.assertTrue(sparse_child.toDense() == dense_child)
+        # genes knocked out in both parents stay knocked out and the rest come from one of the parents
+        mixed_child = mga.sparseMixMate(parent1, parent2, {})
+        self.assertTrue((50 in mixed_child.knockouts) and set(mixed_child.knockouts).issubset({3, 10, 50, 120, 199}))
+
+    def test_paretoUpdateFittestPopulation(self):
+        mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()}, max_no_of_fit_individuals = 4)
+        # both objectives are maximised. (1, 1) is dominated by (2, 2), (2, 2) and (3, 0) are dominated by nothing and (0, 0) is dominated by everything
+        first_manager = FakeRacingManager({('a',): [(2.0, 2.0), ()], ('b',): [(1.0, 1.0), ()], ('c',): [(3.0, 0.0), ()], ('d',): [(0.0, 0.0), ()], ('e',): [(0.0, 3.0), ()]})
+        mga.paretoUpdateFittestPopulation(FakeSubmission(1), first_manager, 'extractFakeContenders', {}, 'max')
+        first_fittest = mga.fittest_individuals
+        # ('b',) is re-scored and now dominates ('e',) and ('f',) dominates ('a',) so ('a',) and ('e',) compete for the last place
+        second_manager = FakeRacingManager({('b',): [(1.0, 4.0), ()], ('f',): [(2.5, 2.5), ()]})
+        mga.paretoUpdateFittestPopulation(FakeSubmission(2), second_manager, 'extractFakeContenders', {}, 'max')
+        self.assertTrue((list(first_fittest.keys())[:3] == [('c',), ('e',), ('a',)]) and (first_fittest[('a',)][-1][0] == 0) and (first_fittest[('b',)] == [(1.0, 1.0), (1, np.inf)]) and (list(mga.fittest_individuals.keys())[:3] == [('b',), ('c',), ('f',)]) and (mga.fittest_individuals[('f',)][-1] == (0, 2.0)) and (list(mga.fittest_individuals.keys())[3] in {('a',), ('e',)}) and (mga.fittest_individuals[list(mga.fittest_individuals.keys())[3]][-1][0] == 1))
+
+    def test_getFrontRanks(self):
+        objectives = np.random.default_rng(0).integers(0, 4, size = (60, 3)).astype(float)
+        front_ranks = base_mga.ParetoArchive.getFrontRanks(objectives)
+        # an individual is in front k if it is dominated by something in front k - 1 and by nothing in its own or later fronts
+        dominates = lambda row1, row2: np.all(objectives[row1] <= objectives[row2]) and np.any(objectives[row1] < objectives[row2])
+        for row in range(len(objectives)):
+            self.assertFalse(any([dominates(other_row, row) for other_row in range(len(objectives)) if front_ranks[other_row] >= front_ranks[row]]))
+            if front_ranks[row] > 0:
+                self.assertTrue(any([dominates(other_row, row) for other_row in range(len(objectives)) if front_ranks[other_row] == front_ranks[row] - 1]))
+
+    def test_aliasTable(self):
+        probabilities = [0.5, 0.0, 0.2, 0.3]
+        alias_table = base_mga.AliasTable(probabilities)
+        outcomes = alias_table.sample(200000, np.random.default_rng(0))
+        frequencies = np.bincount(outcomes, minlength = 4) / len(outcomes)
+        first_outcomes, second_outcomes = alias_table.samplePairs(1000, np.random.default_rng(1))
+        self.assertTrue(np.allclose(frequencies, probabilities, atol = 0.005) and np.all(first_outcomes != second_outcomes) and not np.any(first_outcomes == 1))
+        with self.assertRaises(ValueError):
+            base_mga.AliasTable([0.0, 1.0]).samplePairs(1)
+
+    def test_selectionProbabilities(self):
+        mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()})
+        # scores in the order of the keys are 3, 1, 4 and 2 so the ranks are 1, 3, 0 and 2
+        mga.fittest_individuals = {('a',): [(3,), (3,)], ('b',): [(1,), (1,)], ('c',): [(4,), (4,)], ('d',): [(2,), (2,)]}
+        rank_probabilities = mga.getRankProbabilities({'selection_pressure': 2, 'max_or_min': 'max'})
+        tournament_probabilities = mga.getTournamentProbabilities({'tournament_size': 2, 'max_or_min': 'max'})
+        truncation_probabilities = mga.getTruncationProbabilities({'truncation_fraction': 0.5, 'max_or_min': 'min'})
+        self.assertTrue(np.allclose(rank_probabilities, [2 / 6, 0, 3 / 6, 1 / 6]) and np.allclose(tournament_probabilities, [5 / 16, 1 / 16, 7 / 16, 3 / 16]) and (truncation_probabilities == (0.0, 0.5, 0.0, 0.5)))
+
+    def test_reproducibleBreeding(self):
+        mateFittest_params_dict = {'getFittestProbabilitiesFuncName': 'getRankProbabilities', 'fittestProbabilities_params_dict': {'selection_pressure': 1.5, 'max_or_min': 'max'}, 'populationSize_params_dict': {-1: 30}, 'getPopulationSizeFuncName': 'getPopulationSizeFromDict', 'mateTwoParentsFuncName': 'mixMate', 'mateTwoParents_params_dict': {}, 'mutateChildFuncName': 'exponentialMutation', 'mutateChild_params_dict': {'mutation_probability': 0.5, 'exponential_parameter': 2}}
+        list_of_generations = []
+        for random_seed, no_of_breeding_processes in ((7, 1), (7, 3), (8, 1)):
+            mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()}, random_seed = random_seed)
+            mga.generation_counter = 3
+            mga.fittest_individuals = {tuple([(idx >> bit) & 1 for bit in range(12)]): [(idx,), (idx,)] for idx in range(1, 11)}
+            list_of_generations.append(mga.mateTheFittest(dict(mateFittest_params_dict, no_of_breeding_processes = no_of_breeding_processes)))
+        # the same seed gives the same children whether or not they are bred in parallel
+        self.assertTrue((list_of_generations[0] == list_of_generations[1]) and (list_of_generations[0] != list_of_generations[2]))
+
+    def test_diversityMonitor(self):
+        rng = np.random.default_rng(0)
+        list_of_genomes = [tuple(genome) for genome in rng.integers(0, 2, size = (40, 16)).tolist()]
+        diversity_monitor = base_mga.DiversityMonitor()
+        # move a sliding window over the genomes so that some individuals leave and others join at every update
+        for start_idx in range(0, 30, 5):
+            population = set(list_of_genomes[start_idx:start_idx + 10])
+            if start_idx == 0:
+                diversity_monitor.update(list_of_genomes[:10])
+            else:
+                diversity_monitor.update(list_of_genomes[start_idx + 5:start_idx + 10], list_of_genomes[start_idx - 5:start_idx])
+            list_of_population = list(population)
+            pairwise_distances = [sum([gene1 != gene2 for gene1, gene2 in zip(list_of_population[idx1], list_of_population[idx2])]) for idx1 in range(len(list_of_population)) for idx2 in range(idx1 + 1, len(list_of_population))]
+            self.assertTrue(abs(diversity_monitor.getMeanPairwiseHammingDistance() - np.mean(pairwise_distances)) < 1e-9)
+            self.assertTrue(np.allclose(diversity_monitor.getAlleleFrequencies(), np.mean(list_of_population, axis = 0)))
+        # KnockoutGenomes give the same counts as the equivalent dense genomes
+        sparse_monitor = base_mga.DiversityMonitor()
+        sparse_monitor.update([base_mga.KnockoutGenome.fromDense(genome) for genome in list_of_genomes[25:35]])
+        self.assertTrue(np.array_equal(sparse_monitor.knockout_counts, diversity_monitor.knockout_counts))
+
+    def test_stopAtLowDiversity(self):
+        mga = FakeGeneticAlgorithm({'fake_cluster': FakeCluster()}, random_seed = 0)
+        lowDiversity_params_dict = {'min_normalised_hamming_distance': 0.2, 'min_no_of_individuals': 3, 'max_no_of_gens_without_improvement': 5}
+        mga.fittest_individuals = {(1, 1, 1, 1, 1, 1, 1, 1, 1, 1): [(1,), (1,)], (1, 1, 1, 1, 1, 1, 1, 1, 1, 0): [(1,), (1,)], (0, 1, 1, 1, 1, 1, 1, 1, 1, 1): [(1,), (1,)]}
+        mga.updateDiversityRecord(list(mga.fittest_individuals.keys()), [])
+        converged = mga.stopAfterNoProgressOrLowDiversity(lowDiversity_params_dict)
+        # the mutation rate goes up when the diversity (4/3 genes out of 10 differ on average) is below the target
+        mutated_child = mga.adaptiveExponentialMutation([1] * 10, {'mutation_probability': 0.5, 'exponential_parameter': 1, 'target_normalised_hamming_distance': 1.0, 'max_mutation_scale': 2.0})
+        mga.fittest_individuals[(0, 0, 0, 0, 0, 1, 1, 1, 1, 1)] = [(1,), (1,)]
+        mga.updateDiversityRecord([(0, 0, 0, 0, 0, 1, 1, 1, 1, 1)], [])
+        self.assertTrue(converged and not mga.stopAtLowDiversity(lowDiversity_params_dict) and (abs(mga.diversity_record['mean_hamming_distance'] - 19 / 6) < 1e-9) and (sum(mutated_child) < 10))
+
+    def test_terminateHopelessChildren(self):
+        fake_cluster = FakeCluster()
+        mga = FakeGeneticAlgorithm({'fake_cluster': fake_cluster}, max_no_of_fit_individuals = 2)
+        # every child has two repetitions
+        mga.reps_of_unique_sim = 2
+        mga.submission_key_to_child_dict = {'fake_cluster_1': {'child1': (0, 1), 'child2': (0, 0)}}
+        submission = FakeSubmission(100)
+        submission.cluster_connection = fake_cluster
+        manager = FakeProgressManager()
+        runSims_params_dict = {'earlyTermination_params_dict': {'progress_dir': 'progress', 'max_or_min': 'max', 'min_progress_fraction': 0.1, 'overallScoreFuncName': 'getMeanScore'}}
+        # nothing is terminated until the fittest population is full
+        mga.fittest_individuals = {(1, 1): [(3.0,), (3.0,)]}
+        before_full = mga.terminateHopelessChildren({'fake_cluster_1': submission}, {'fake_cluster_1': manager}, runSims_params_dict)
+        mga.fittest_individuals[(1, 0)] = [(2.0,), (2.0,)]
+        after_full = mga.terminateHopelessChildren({'fake_cluster_1': submission}, {'fake_cluster_1': manager}, runSims_params_dict)
+        # the repetitions are grouped by child and combined with the overall score method
+        self.assertTrue((before_full == {}) and (after_full == {'fake_cluster_1': [4]}) and (fake_cluster.harvested == [('/output/progress', [100])]) and (manager.list_of_calls == [('/output/progress', 2.0, 'max', 0.1, {100: {}}, {1: 'child1', 2: 'child1', 3: 'child2', 4: 'child2'}, 'getMeanScore', runSims_params_dict['earlyTermination_params_dict'])]))
+
+    # HELPER METHODS
+    @staticmethod
+    def getBinaryFitness(genome):
+        return sum([genome[bit] << bit for bit in range(4)])
+
+# ADDITIONAL CLASSES
+class FakeGeneticAlgorithm(base_mga.GeneticAlgorithmBase):
+    """
+    GeneticAlgorithmBase needs a lot of parameters that aren't needed for local tests so this fills them with dummy values.
+    """
+    def __init__(self, dict_of_cluster_instances, max_no_of_fit_individuals = 10, random_seed = None):
+        base_mga.GeneticAlgorithmBase.__init__(self, dict_of_cluster_instances, 'test_mga', 'test description', 'test/path', 1, 'passFunction', {}, 'passFunction', {}, 'passFunction', {}, 'passFunction', {}, max_no_of_fit_individuals, 'test_tmp', 'passFunction', random_seed)
+
+class FakeIslandGeneticAlgorithm(FakeGeneticAlgorithm):
+    """
+    Breeds, submits and scores children without a cluster so that the island model can be run locally.
+    """
+    def __init__(self, dict_of_cluster_instances):
+        FakeGeneticAlgorithm.__init__(self, dict_of_cluster_instances)
+        self.getNewGenerationFuncName = 'getFakeGeneration'
+        self.submissionManagerFuncName = 'manageFakeSubmissions'
+        self.list_of_submitted_generations = []
+
+    def getFakeGeneration(self, newGen_params_dict):
+        return {'child1': [0, self.generation_counter], 'child2': [1, self.generation_counter]}
+
+    def createFakeSubmission(self, createJobSubmisions_params_dict):
+        submission_inst = FakeSubmission(len(self.list_of_submitted_generations))
+        submission_inst.single_child_name_to_genome_dict = createJobSubmisions_params_dict['single_child_name_to_genome_dict']
+        return submission_inst
+
+    def manageFakeSubmissions(self, submissionManager_params_dict):
+        for submission_key in submissionManager_params_dict['dict_of_job_submission_insts'].keys():
+            self.list_of_submitted_generations.append((self.submission_key_to_cluster_dict[submission_key], self.generation_counter))
+
+        return {submission_key: None for submission_key in submissionManager_params_dict['dict_of_job_submission_insts'].keys()}
+
+    def recordFakeResults(self, job_submission_info, job_manage_info, postSimulationFunc_params_dict):
+        # the fitness of a genome is the sum of its genes
+        new_individuals = {tuple(genome): [(sum(genome),), (sum(genome),)] for genome in job_submission_info.single_child_name_to_genome_dict.values()}
+        old_individuals = self.fittest_individuals
+        self.fittest_individuals = self.mergeFittestIndividuals([self.fittest_individuals, new_individuals], 'max')
+        self.updateDiversityRecord([genome for genome in self.fittest_individuals.keys() if genome not in old_individuals], [genome for genome in old_individuals.keys() if genome not in self.fittest_individuals])
+
+class FakeRacingGeneticAlgorithm(FakeIslandGeneticAlgorithm):
+    """
+    Scores every repetition of a child as its true fitness plus or minus one so that children can be raced locally.
+    """
+    def __init__(self, dict_of_cluster_instances):
+        FakeIslandGeneticAlgorithm.__init__(self, dict_of_cluster_instances)
+        self.max_no_of_fit_individuals = 2
+        self.list_of_rounds = []
+
+    def getFakeGeneration(self, newGen_params_dict):
+        return {'child1': [0, 0], 'child2': [1, 0], 'child3': [0, 1], 'child4': [1, 1]}
+
+    def manageFakeSubmissions(self, submissionManager_params_dict):
+        genome_to_true_fitness_dict = {(0, 0): 0.0, (1, 0): 5.0, (0, 1): 5.2, (1, 1): 10.0}
+        dict_of_job_management_insts = {}
+        for submission_key, submission_inst in submissionManager_params_dict['dict_of_job_submission_insts'].items():
+            self.list_of_rounds.append((list(submission_inst.single_child_name_to_genome_dict.keys()), self.reps_of_unique_sim))
+            dict_of_job_management_insts[submission_key] = FakeRacingManager({tuple(genome): [tuple([genome_to_true_fitness_dict[tuple(genome)] + (-1) ** rep for rep in range(self.reps_of_unique_sim)]), ()] for genome in submission_inst.single_child_name_to_genome_dict.values()})
+
+        return dict_of_job_management_insts
+
+    def recordRacingResults(self, job_submission_info, job_manage_info, postSimulationFunc_params_dict):
+        self.standardUpdateFittestPopulation(job_submission_info, job_manage_info, 'extractFakeContenders', {'overallScoreFuncName': 'getMeanScore'}, 'max')
+
+class FakeRacingManager():
+    """
+    Looks enough like a base_cluster_submissions.BaseManageSubmission instance for standardUpdateFittestPopulation to use it.
+    """
+    def __init__(self, simulation_data_dict):
+        self.simulation_data_dict = simulation_data_dict
+
+    def extractFakeContenders(self, simulation_data_dict, extractContender_params_dict):
+        return simulation_data_dict
+
+    def getMeanScore(self, genome_to_scores_dict, extractContender_params_dict):
+        return {genome: [genome_to_scores_dict[genome][0], (float(np.mean(genome_to_scores_dict[genome][0])),)] for genome in genome_to_scores_dict.keys()}
+
+class FakeCluster():
+    """
+    Looks enough like a base_connection.BaseCluster instance to record cancelled array tasks without connecting to anything.
+    """
+    def __init__(self):
+        self.cancelled = []
+        self.max_array_size = 500
+        self.list_of_tasks_in_queue = []
+        self.base_output_path = '/output'
+        self.harvested = []
+
+    def harvestProgressRecords(self, progress_dir, list_of_job_numbers = None):
+        self.harvested.append((progress_dir, list_of_job_numbers))
+        return {100: {}}
+
+    def checkQueue(self, job_number):
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+    def getArrayIndicesFromQueueStdOut(self, stdout):
+        return self.list_of_tasks_in_queue
+
+    def cancelArrayTasks(self, job_number, list_of_array_indices):
+        self.cancelled.append((job_number, list_of_array_indices))
+        return {'return_code': 0, 'stdout': '', 'stderr': ''}
+
+class FakeProgressManager():
+    """
+    Looks enough like a base_cluster_submissions.BaseManageSubmission instance to record the calls made to terminate hopeless tasks.
+    """
+    def __init__(self):
+        self.resubmissions = []
+        self.list_of_calls = []
+
+    def terminateHopelessTasks(self, progress_dir, admission_threshold, max_or_min, min_progress_fraction = 0.0, job_number_to_progress_records_dict = None, array_index_to_child_name_dict = None, overallScoreFuncName = None, overallScore_params_dict = None):
+        self.list_of_calls.append((progress_dir, admission_threshold, max_or_min, min_progress_fraction, job_number_to_progress_records_dict, array_index_to_child_name_dict, overallScoreFuncName, overallScore_params_dict))
+        return [4]
+
+class FakeSubmission():
+    """
+    Looks enough like a base_cluster_submissions.BaseJobSubmission instance for the MGA to use it.
+    """
+    def __init__(self, cluster_job_number):
+        self.cluster_job_number = cluster_job_number
+        self.array_index_to_child_name_dict = None
+        self.stolen_child_name_to_genome_dict = {}
+        self.stolen_genomes = set()
+
+if __name__ == '__main__':
+    unittest.main()